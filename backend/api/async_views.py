@@ -0,0 +1,291 @@
+"""
+Асинхронные представления для самых нагруженных эндпоинтов чтения.
+
+Используются при запуске под ASGI-сервером (см. foodgram/asgi.py). Данные
+загружаются асинхронным ORM со всеми связями, признаки избранного,
+списка покупок и подписки вычисляются пакетно, поэтому сериализация не
+обращается к базе. Рецепты, как и в синхронном RecipeViewSet, собираются
+RecipeReadSerializer из строк .values() (см. api/read_serializers.py).
+Ответ формируют те же сериализаторы и рендерер, что и у синхронных
+вьюсетов, и JSON совпадает байт в байт.
+
+Всё, что не является обычным GET-запросом за JSON (запись, браузерный
+API, ошибки авторизации, неверная страница, отсутствующий объект),
+передаётся синхронному вьюсету, чтобы ответы об ошибках тоже совпадали.
+"""
+import copy
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api import snapshots, streaming
+from api.authentication import token_cache
+from api.filters import filter_recipes
+from api.paginators import PageLimitNumberPagination
+from api.read_serializers import RecipeReadSerializer
+from api.serializers import (IngredientSerializer, SubscriptionSerializer,
+                             TagSerializer)
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+RECIPE_ROWS = Recipe.objects.values(*RecipeReadSerializer.fields)
+
+
+async def authenticate(request):
+    """
+    Асинхронный аналог CachedTokenAuthentication.
+
+    Возвращает None, если заголовок или токен неверны: такой запрос
+    обрабатывает синхронный вьюсет с его сообщениями об ошибках.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != 'token':
+        return AnonymousUser()
+    if len(header) != 2:
+        return None
+
+    key = header[1]
+    token, version = token_cache.get(key)
+    if token is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        if not token.user.is_active:
+            return None
+        token_cache.set(key, token, version)
+    return copy.copy(token.user)
+
+
+def render(data):
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(
+        renderer.render(data), content_type=renderer.media_type
+    )
+
+
+def render_stream(batches, envelope=None):
+    """Потоковый ответ из пачек сериализованных объектов."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return StreamingHttpResponse(
+        streaming.aencode(renderer, batches, envelope),
+        content_type=renderer.media_type,
+    )
+
+
+async def serialized(queryset, serializer_class):
+    """Пачки сериализованных объектов queryset, см. api/streaming.py."""
+    async for batch in streaming.abatches(
+        queryset, settings.STREAM_BATCH_SIZE
+    ):
+        yield serializer_class(batch, many=True).data
+
+
+async def values_set(queryset):
+    return {value async for value in queryset}
+
+
+async def paginate(request, queryset, lazy=False):
+    """
+    Страница в формате PageLimitNumberPagination.
+
+    Возвращает None для неверного номера страницы. С lazy объекты страницы
+    возвращаются срезом queryset без загрузки.
+    """
+    paginator = PageLimitNumberPagination()
+    page_size = paginator.get_page_size(request)
+    count = await queryset.acount()
+    num_pages = max(1, ceil(count / page_size))
+
+    page_number = request.query_params.get(paginator.page_query_param, 1)
+    if page_number in paginator.last_page_strings:
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= page_number <= num_pages:
+        return None
+
+    offset = (page_number - 1) * page_size
+    objects = queryset[offset:offset + page_size]
+    if not lazy:
+        objects = [obj async for obj in objects]
+
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page_number < num_pages:
+        next_url = replace_query_param(
+            url, paginator.page_query_param, page_number + 1
+        )
+    if page_number > 1:
+        previous_url = (
+            remove_query_param(url, paginator.page_query_param)
+            if page_number == 2
+            else replace_query_param(
+                url, paginator.page_query_param, page_number - 1
+            )
+        )
+    return count, next_url, previous_url, objects
+
+
+def paginated(count, next_url, previous_url, results):
+    return {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': results,
+    }
+
+
+async def recipe_list(request):
+    # Индекс поиска в памяти читает базу синхронно, а ?ids= без пагинации
+    # обрабатывает RecipeViewSet.list_ids().
+    if request.query_params.get('search') or 'ids' in request.query_params:
+        return None
+    queryset = filter_recipes(
+        Recipe.objects.all(), request.query_params, request.user
+    ).values(*RecipeReadSerializer.fields)
+    stream = (
+        PageLimitNumberPagination().get_page_size(request)
+        >= settings.STREAM_MIN_PAGE_SIZE
+    )
+    page = await paginate(request, queryset, lazy=stream)
+    if page is None:
+        return None
+    count, next_url, previous_url, rows = page
+    if stream:
+        return render_stream(
+            recipe_batches(request, rows),
+            paginated(count, next_url, previous_url, []),
+        )
+    serializer = RecipeReadSerializer(
+        rows, many=True, context={'request': request}
+    )
+    await serializer.aload()
+    return render(paginated(count, next_url, previous_url, serializer.data))
+
+
+async def recipe_batches(request, rows):
+    async for batch in streaming.abatches(rows, settings.STREAM_BATCH_SIZE):
+        serializer = RecipeReadSerializer(
+            batch, many=True, context={'request': request}
+        )
+        await serializer.aload()
+        yield serializer.data
+
+
+async def recipe_detail(request, pk):
+    try:
+        row = await RECIPE_ROWS.aget(pk=pk)
+    except Recipe.DoesNotExist:
+        return None
+    serializer = RecipeReadSerializer(row, context={'request': request})
+    await serializer.aload()
+    return render(serializer.data)
+
+
+async def tag_list(request):
+    if not request.query_params:
+        snapshot = snapshots.response(request, 'tags')
+        if snapshot is not None:
+            return snapshot
+    return render_stream(serialized(Tag.objects.all(), TagSerializer))
+
+
+async def tag_detail(request, pk):
+    try:
+        tag = await Tag.objects.aget(pk=pk)
+    except Tag.DoesNotExist:
+        return None
+    return render(TagSerializer(tag).data)
+
+
+async def ingredient_list(request):
+    if not request.query_params:
+        snapshot = snapshots.response(request, 'ingredients')
+        if snapshot is not None:
+            return snapshot
+    queryset = Ingredient.objects.all()
+    search_term = request.query_params.get('name')
+    if search_term:
+        queryset = queryset.filter(name__istartswith=search_term)
+    return render_stream(serialized(queryset, IngredientSerializer))
+
+
+async def ingredient_detail(request, pk):
+    try:
+        ingredient = await Ingredient.objects.aget(pk=pk)
+    except Ingredient.DoesNotExist:
+        return None
+    return render(IngredientSerializer(ingredient).data)
+
+
+async def subscriptions(request):
+    if request.user.is_anonymous:
+        return None
+
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and not recipes_limit.isdecimal():
+        return None
+
+    # Срез recipes_limit сериализатор берёт из уже загруженного списка.
+    queryset = (
+        User.objects.filter(subscribers__user=request.user)
+        .annotate(recipes_count=Count('recipes'))
+        # Meta.ordering не применяется к запросам с GROUP BY.
+        .order_by(*User._meta.ordering)
+        .prefetch_related('recipes')
+    )
+    page = await paginate(request, queryset)
+    if page is None:
+        return None
+    count, next_url, previous_url, authors = page
+    serializer = SubscriptionSerializer(authors, many=True, context={
+        'request': request,
+        'subscribed_ids': {author.pk for author in authors},
+    })
+    return render(paginated(count, next_url, previous_url, serializer.data))
+
+
+def async_read_view(handler, sync_view):
+    """
+    Оборачивает асинхронный обработчик GET-запросов.
+
+    Прочие запросы и случаи, которые обработчик не берёт на себя (он
+    вернул None), передаются синхронному представлению sync_view.
+    """
+    async def delegate(request, *args, **kwargs):
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    async def view(request, *args, **kwargs):
+        if (request.method != 'GET'
+                or 'text/html' in request.headers.get('Accept', '')):
+            return await delegate(request, *args, **kwargs)
+
+        user = await authenticate(request)
+        if user is None:
+            return await delegate(request, *args, **kwargs)
+
+        drf_request = Request(request)
+        drf_request.user = user
+        response = await handler(drf_request, *args, **kwargs)
+        if response is None:
+            return await delegate(request, *args, **kwargs)
+        return response
+
+    # Имя маршрута для метрик совпадает с синхронным вьюсетом.
+    view.cls = sync_view.cls
+    view.actions = {'get': getattr(sync_view, 'actions', {}).get('get')}
+    view.csrf_exempt = True
+    return view
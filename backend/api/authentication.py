@@ -0,0 +1,142 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def cache_key(token_key):
+    """Ключ общего кэша не содержит сам токен."""
+    return 'auth:token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def version_key(token_key):
+    return cache_key(token_key) + ':version'
+
+
+class TokenCache:
+    """
+    Кэш токен -> пользователь: LRU с TTL в памяти процесса и, при наличии,
+    общий кэш Django для всех воркеров.
+
+    С общим кэшем у каждого токена есть версия в общем кэше. Она читается
+    до загрузки токена из базы, хранится вместе с записью и сверяется с
+    текущей при каждом чтении, а инвалидация её меняет. Поэтому отзыв
+    сразу действует во всех процессах, и загрузка, начатая до отзыва, не
+    вернёт в кэш устаревший токен. Без общего кэша другие процессы об
+    отзыве не узнают, поэтому записи живут не дольше local_ttl секунд.
+    """
+
+    def __init__(self, maxsize, ttl, alias=None, local_ttl=2):
+        self.maxsize = maxsize
+        self.alias = alias
+        self.ttl = ttl if alias else min(ttl, local_ttl)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, token_key):
+        """
+        Токен из кэша или None и версия токена, с которой загруженный из
+        базы токен передаётся в set().
+        """
+        version = shared_entry = None
+        if self.shared is not None:
+            values = self.shared.get_many(
+                [version_key(token_key), cache_key(token_key)]
+            )
+            version = values.get(version_key(token_key))
+            if version is None:
+                self.shared.add(version_key(token_key), uuid.uuid4().hex,
+                                None)
+                return None, self.shared.get(version_key(token_key))
+            shared_entry = values.get(cache_key(token_key))
+
+        with self.lock:
+            entry = self.entries.get(token_key)
+            if entry is not None:
+                token, expires_at, entry_version = entry
+                if expires_at > time.monotonic() and entry_version == version:
+                    self.entries.move_to_end(token_key)
+                    return token, version
+                del self.entries[token_key]
+
+        if shared_entry is not None:
+            token, entry_version = shared_entry
+            if entry_version == version:
+                self._store_local(token_key, token, version)
+                return token, version
+        return None, version
+
+    def set(self, token_key, token, version):
+        self._store_local(token_key, token, version)
+        if self.shared is not None:
+            self.shared.set(cache_key(token_key), (token, version), self.ttl)
+
+    def _store_local(self, token_key, token, version):
+        with self.lock:
+            self.entries[token_key] = (
+                token, time.monotonic() + self.ttl, version
+            )
+            self.entries.move_to_end(token_key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *token_keys):
+        with self.lock:
+            for token_key in token_keys:
+                self.entries.pop(token_key, None)
+        if self.shared is not None and token_keys:
+            self.shared.set_many({
+                version_key(token_key): uuid.uuid4().hex
+                for token_key in token_keys
+            }, None)
+            self.shared.delete_many(
+                [cache_key(token_key) for token_key in token_keys]
+            )
+
+    def invalidate_user(self, user_id):
+        self.invalidate(*Token.objects.filter(
+            user_id=user_id
+        ).values_list('key', flat=True))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_MAXSIZE,
+    settings.TOKEN_CACHE_TTL,
+    settings.TOKEN_CACHE_ALIAS,
+    settings.TOKEN_CACHE_LOCAL_TTL,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса Token JOIN User на каждый запрос.
+
+    Токены кэшируются в token_cache и удаляются из него при выходе
+    (token/logout), смене пароля, деактивации и изменении прав
+    пользователя, см. api/signals.py.
+    """
+
+    def authenticate_credentials(self, key):
+        token, version = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token, version)
+        # Копия защищает закэшированный объект от изменений в запросе.
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token.user, token
@@ -0,0 +1,72 @@
+from rest_framework.serializers import ValidationError
+
+from recipes.models import Recipe
+from recipes.search import search_recipes
+
+# Сортировки списка рецептов по ?ordering=, см. recipes/scores.py.
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', *Recipe._meta.ordering),
+    'trending': ('-trending', *Recipe._meta.ordering),
+}
+
+
+def parse_id_list(query_params, name):
+    """
+    Идентификаторы из параметра вида ?name=1,2,3 или ?name=1&name=2.
+
+    Порядок сохраняется, повторы отбрасываются.
+    """
+    ids = {}
+    for value in query_params.getlist(name):
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if not item.isdecimal():
+                raise ValidationError(
+                    {name: f'Некорректный идентификатор: {item}.'}
+                )
+            ids[int(item)] = None
+    return list(ids)
+
+
+def filter_recipes(queryset, query_params, user, ranked=None):
+    """
+    Фильтрация рецептов по автору, тегам, избранному и списку покупок,
+    полнотекстовый поиск с сортировкой по релевантности и сортировки
+    RECIPE_ORDERINGS, которые заменяют сортировку по релевантности.
+    ranked - уже найденные рецепты для поиска без PostgreSQL, см.
+    search_recipes().
+    """
+    author = query_params.get('author')
+    if author:
+        queryset = queryset.filter(author=author)
+
+    tags = query_params.getlist('tags')
+    if tags:
+        queryset = queryset.filter(tags__slug__in=tags).distinct()
+
+    search = query_params.get('search')
+    if search:
+        queryset = search_recipes(queryset, search, ranked)
+
+    ordering = RECIPE_ORDERINGS.get(query_params.get('ordering'))
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+
+    if user.is_anonymous:
+        return queryset
+
+    is_in_shopping_cart = query_params.get('is_in_shopping_cart')
+    if is_in_shopping_cart == '1':
+        queryset = queryset.filter(in_shopping_cart__user=user)
+    elif is_in_shopping_cart == '0':
+        queryset = queryset.exclude(in_shopping_cart__user=user)
+
+    is_favorite = query_params.get('is_favorited')
+    if is_favorite == '1':
+        queryset = queryset.filter(in_favorites__user=user)
+    elif is_favorite == '0':
+        queryset = queryset.exclude(in_favorites__user=user)
+
+    return queryset
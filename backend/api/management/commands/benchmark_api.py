@@ -0,0 +1,343 @@
+import base64
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+BUDGETS_FILE = settings.BASE_DIR / 'benchmarks' / 'budgets.json'
+# Запас при записи бюджетов: задержки и память заметно шумят между
+# прогонами, а число запросов детерминировано.
+BUDGET_HEADROOM = {'p50_ms': 1.5, 'p95_ms': 1.5, 'peak_kb': 1.5}
+
+
+class Scenario:
+    """Сценарий нагрузки: запрос к API и ожидаемый код ответа."""
+
+    def __init__(self, name, method, path, data=None, auth=True,
+                 status=200, writes=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.auth = auth
+        self.status = status
+        self.writes = writes
+
+    def request(self, client, iteration):
+        data = self.data(iteration) if callable(self.data) else self.data
+        path = self.path(iteration) if callable(self.path) else self.path
+        return getattr(client, self.method)(path, data, format='json')
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered) + 0.5) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def image_base64():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), (73, 182, 78)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет сценарии API на сгенерированных данных (seed_foodgram), '
+        'измеряет число SQL-запросов, задержки p50/p95 и пиковую память и '
+        'сравнивает их с бюджетами из benchmarks/budgets.json.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое превышение бюджетов задержки и памяти.',
+        )
+        parser.add_argument(
+            '--strict-latency', action='store_true',
+            help=(
+                'Считать превышение бюджетов задержки и памяти ошибкой, а '
+                'не предупреждением. Эти бюджеты зависят от машины, и '
+                'сравнивать с ними стоит на той, где они записаны.'
+            ),
+        )
+        parser.add_argument('--budgets', default=BUDGETS_FILE)
+        parser.add_argument(
+            '--update-budgets', action='store_true',
+            help='Записать текущие измерения как новые бюджеты.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', default=[],
+            help='Запустить только указанные сценарии.',
+        )
+
+    def handle(self, *args, **options):
+        scenarios = self.build_scenarios()
+        if options['scenario']:
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.name in options['scenario']]
+
+        # Повторы сценария не должны упираться в лимиты частоты, а проверка
+        # корзины остаётся в замере.
+        rates = {scope: '1000000/s'
+                 for scope in settings.REST_FRAMEWORK.get(
+                     'DEFAULT_THROTTLE_RATES', {})}
+        # Без общего кэша токен живёт в кэше процесса секунды, и число
+        # запросов сценария зависело бы от того, истёк ли он к замеру. В
+        # одном процессе отзыв токена и так виден сразу.
+        token_cache.ttl = settings.TOKEN_CACHE_TTL
+        results = {}
+        with override_settings(REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates,
+        }):
+            for scenario in scenarios:
+                results[scenario.name] = self.measure(
+                    scenario, options['iterations'], options['warmup']
+                )
+                self.report(scenario.name, results[scenario.name])
+
+        if options['update_budgets']:
+            self.write_budgets(options['budgets'], results)
+            return
+
+        regressions, slowdowns = self.compare(
+            results, options['budgets'], options['tolerance']
+        )
+        if options['strict_latency']:
+            regressions += slowdowns
+        elif slowdowns:
+            self.stdout.write(self.style.WARNING(
+                'Превышены бюджеты задержки и памяти (ошибка только с '
+                '--strict-latency):\n' + '\n'.join(slowdowns)
+            ))
+        if regressions:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(regressions)
+            )
+        if slowdowns:
+            self.stdout.write(self.style.SUCCESS(
+                'Бюджеты запросов соблюдены.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def build_scenarios(self):
+        """Готовит данные для сценариев на основе сгенерированной базы."""
+        user = (
+            User.objects.annotate(
+                favorites_count=Count('favorites', distinct=True),
+                cart_count=Count('shopping_cart', distinct=True),
+            )
+            .filter(
+                cart_count__gt=0,
+                subscriptions__isnull=False,
+                recipes__isnull=False,
+            )
+            .order_by('-favorites_count', 'pk')
+            .first()
+        )
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для бенчмарка: выполните seed_foodgram.'
+            )
+
+        self.token = Token.objects.get_or_create(user=user)[0].key
+        own_recipe = user.recipes.first()
+        popular_recipe = (
+            Recipe.objects.annotate(favorites_count=Count('in_favorites'))
+            .order_by('-favorites_count', 'pk')
+            .first()
+        )
+        cart_ids = ','.join(map(str, user.shopping_cart.values_list(
+            'recipe_id', flat=True
+        )[:20]))
+        tags = list(Tag.objects.values_list('pk', 'slug')[:2])
+        ingredient_ids = list(
+            Ingredient.objects.values_list('pk', flat=True)[:3]
+        )
+        followed = user.subscriptions.first().author
+        not_followed = (
+            User.objects.exclude(pk=user.pk)
+            .exclude(subscribers__user=user)
+            .order_by('pk')
+            .first()
+        )
+        image = image_base64()
+
+        def recipe_payload(iteration):
+            return {
+                'name': f'Бенчмарк {iteration}',
+                'text': 'Рецепт для бенчмарка.',
+                'cooking_time': 10,
+                'image': image,
+                'tags': [tag_id for tag_id, _ in tags],
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 10}
+                    for ingredient_id in ingredient_ids
+                ],
+            }
+
+        tags_query = '&'.join(f'tags={slug}' for _, slug in tags)
+        return [
+            Scenario('recipes_list_anonymous', 'get', '/api/recipes/',
+                     auth=False),
+            Scenario('recipes_list_user', 'get', '/api/recipes/'),
+            Scenario('recipes_list_tags', 'get',
+                     f'/api/recipes/?{tags_query}'),
+            Scenario('recipes_list_favorited', 'get',
+                     '/api/recipes/?is_favorited=1'),
+            Scenario('recipes_list_shopping_cart', 'get',
+                     '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario('recipes_search', 'get',
+                     '/api/recipes/?search=абрикос'),
+            Scenario('recipes_by_ids', 'get', f'/api/recipes/?ids={cart_ids}'),
+            Scenario('recipe_detail', 'get',
+                     f'/api/recipes/{popular_recipe.pk}/'),
+            Scenario('recipe_create', 'post', '/api/recipes/',
+                     data=recipe_payload, status=201, writes=True),
+            Scenario('recipe_update', 'patch',
+                     f'/api/recipes/{own_recipe.pk}/',
+                     data=recipe_payload, writes=True),
+            Scenario('ingredients_search', 'get',
+                     '/api/ingredients/?name=са', auth=False),
+            Scenario('download_shopping_cart', 'get',
+                     '/api/recipes/download_shopping_cart/'),
+            Scenario('subscriptions', 'get',
+                     '/api/users/subscriptions/?recipes_limit=3'),
+            Scenario('subscribe', 'post',
+                     f'/api/users/{not_followed.pk}/subscribe/',
+                     status=201, writes=True),
+            Scenario('unsubscribe', 'delete',
+                     f'/api/users/{followed.pk}/subscribe/',
+                     status=204, writes=True),
+        ]
+
+    def client(self, scenario):
+        client = APIClient(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        if scenario.auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        return client
+
+    def run_once(self, scenario, client, iteration):
+        """Выполняет запрос; изменения в базе откатываются."""
+        with transaction.atomic():
+            response = scenario.request(client, iteration)
+            if scenario.writes:
+                transaction.set_rollback(True)
+        if response.status_code != scenario.status:
+            raise CommandError(
+                f'{scenario.name}: ожидался код {scenario.status}, '
+                f'получен {response.status_code}: {response.content[:300]!r}'
+            )
+        return response
+
+    def measure(self, scenario, iterations, warmup):
+        client = self.client(scenario)
+        for iteration in range(warmup):
+            self.run_once(scenario, client, iteration)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.run_once(scenario, client, warmup)
+        query_count = len(queries)
+
+        timings = []
+        for iteration in range(iterations):
+            gc.collect()
+            started = time.perf_counter()
+            self.run_once(scenario, client, warmup + 1 + iteration)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        self.run_once(scenario, client, warmup + iterations + 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'queries': query_count,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<28} queries={result["queries"]:<4} '
+            f'p50={result["p50_ms"]:>8.2f}ms p95={result["p95_ms"]:>8.2f}ms '
+            f'peak={result["peak_kb"]:>9.1f}KB'
+        )
+
+    def write_budgets(self, path, results):
+        """Записывает бюджеты измеренных сценариев, остальные сохраняет."""
+        try:
+            with open(path, encoding='utf-8') as budgets_file:
+                budgets = json.load(budgets_file)
+        except FileNotFoundError:
+            budgets = {}
+        budgets.update({
+            name: {
+                metric: (
+                    round(value * BUDGET_HEADROOM[metric], 2)
+                    if metric in BUDGET_HEADROOM else value
+                )
+                for metric, value in result.items()
+            }
+            for name, result in results.items()
+        })
+        with open(path, 'w', encoding='utf-8') as budgets_file:
+            json.dump(budgets, budgets_file, indent=4, sort_keys=True)
+            budgets_file.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Бюджеты записаны в {path}'))
+
+    def compare(self, results, path, tolerance):
+        """
+        Сравнивает измерения с бюджетами. Возвращает превышения числа
+        запросов и отдельно превышения задержки и памяти.
+        """
+        try:
+            with open(path, encoding='utf-8') as budgets_file:
+                budgets = json.load(budgets_file)
+        except FileNotFoundError:
+            raise CommandError(
+                f'Файл бюджетов {path} не найден: запустите с '
+                '--update-budgets.'
+            )
+
+        regressions, slowdowns = [], []
+        for name, result in results.items():
+            budget = budgets.get(name)
+            if budget is None:
+                regressions.append(f'{name}: бюджет не задан')
+                continue
+            if result['queries'] > budget['queries']:
+                regressions.append(
+                    f'{name}: запросов {result["queries"]} > '
+                    f'{budget["queries"]}'
+                )
+            for metric in ('p50_ms', 'p95_ms', 'peak_kb'):
+                limit = budget[metric] * (1 + tolerance)
+                if result[metric] > limit:
+                    slowdowns.append(
+                        f'{name}: {metric} {result[metric]} > {limit:.2f}'
+                    )
+        return regressions, slowdowns
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.filters import filter_recipes
+from api.read_serializers import RecipeReadSerializer
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+# Выборки рецептов: параметры запроса списка.
+QUERIES = (
+    {},
+    {'is_favorited': '1'},
+    {'is_in_shopping_cart': '1'},
+    {'ordering': 'popular'},
+)
+
+
+def differences(expected, actual, path='recipe'):
+    """Пути полей, значения которых различаются."""
+    if type(expected) is not type(actual):
+        return [f'{path}: {expected!r} != {actual!r}']
+    if isinstance(expected, dict):
+        if list(expected) != list(actual):
+            return [f'{path}: поля {list(expected)} != {list(actual)}']
+        return [
+            difference
+            for key in expected
+            for difference in differences(
+                expected[key], actual[key], f'{path}.{key}'
+            )
+        ]
+    if isinstance(expected, list):
+        if len(expected) != len(actual):
+            return [f'{path}: {len(expected)} элементов != {len(actual)}']
+        return [
+            difference
+            for index, (left, right) in enumerate(zip(expected, actual))
+            for difference in differences(left, right, f'{path}[{index}]')
+        ]
+    if expected != actual:
+        return [f'{path}: {expected!r} != {actual!r}']
+    return []
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что RecipeReadSerializer выдаёт тот же JSON, что и '
+        'RecipeSerializer, поле в поле: для анонима, автора и активного '
+        'пользователя, на выборках списка и рецепте без автора и картинки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=50,
+            help='Рецептов в каждой выборке.',
+        )
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        active = (
+            User.objects.annotate(favorites_count=Count('favorites'))
+            .filter(subscriptions__isnull=False)
+            .order_by('-favorites_count', 'pk').first()
+        )
+        author = (
+            User.objects.filter(recipes__isnull=False).order_by('pk').first()
+        )
+        tag = Tag.objects.order_by('pk').first()
+        queries = list(QUERIES)
+        if tag:
+            queries.append({'tags': tag.slug})
+
+        checked = 0
+        errors = []
+        with transaction.atomic():
+            # Рецепт без автора и картинки: ветки to_representation().
+            Recipe.objects.create(
+                author=None, name='Проверка контракта', image='',
+                text='', cooking_time=1,
+            )
+            for user in (None, author, active):
+                for params in queries:
+                    request = Request(factory.get(
+                        '/api/recipes/', params,
+                        HTTP_HOST=settings.ALLOWED_HOSTS[0],
+                    ))
+                    if user is not None:
+                        request.user = user
+                    queryset = filter_recipes(
+                        Recipe.objects.all(), request.query_params,
+                        request.user,
+                    )[:options['limit']]
+                    errors.extend(self.compare(request, queryset))
+                    checked += len(queryset)
+            transaction.set_rollback(True)
+
+        if errors:
+            raise CommandError(
+                'Вывод RecipeReadSerializer отличается:\n'
+                + '\n'.join(errors[:20])
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Контракт RecipeSerializer соблюдён: {checked} рецептов.'
+        ))
+
+    def compare(self, request, queryset):
+        context = {'request': request}
+        expected = RecipeSerializer(
+            queryset.prefetch_related('tags', 'recipeingredient_set'),
+            many=True, context=context,
+        ).data
+        actual = RecipeReadSerializer(
+            queryset.values(*RecipeReadSerializer.fields),
+            many=True, context=context,
+        ).data
+        errors = differences(list(expected), actual)
+        renderer = JSONRenderer()
+        if not errors and renderer.render(expected) != renderer.render(
+            actual
+        ):
+            errors.append('recipe: JSON различается при равных полях')
+        user = request.user if request.user.is_authenticated else 'аноним'
+        return [
+            f'{user}, {dict(request.query_params.items())}: {error}'
+            for error in errors
+        ]
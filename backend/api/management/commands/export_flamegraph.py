@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит сложенные стеки выборочных профилей маршрута '
+        '(PROFILING_SAMPLE_EVERY) для flamegraph.pl или speedscope.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'route', nargs='?',
+            help='Маршрут, например RecipeViewSet.list. Без него - список '
+                 'маршрутов с собранными стеками.',
+        )
+
+    def handle(self, *args, **options):
+        if options['route'] is None:
+            for path in sorted(profiling.directory('routes').glob('*.folded')):
+                self.stdout.write(path.stem)
+            return
+        stacks = profiling.flamegraph(options['route'])
+        if not stacks:
+            raise CommandError(
+                f'Для маршрута {options["route"]} стеков нет.'
+            )
+        for stack, count in sorted(stacks.items()):
+            self.stdout.write(f'{stack} {count}')
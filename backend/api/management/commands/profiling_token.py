@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Выдаёт подписанное значение заголовка X-Profile: запрос с ним '
+        'профилируется без учётной записи сотрудника.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=profiling.MODES, default='cprofile',
+            help='Профилировщик: cprofile или sample.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(profiling.token(options['mode']))
+        self.stderr.write(
+            f'Действует {settings.PROFILING_TOKEN_MAX_AGE} с.'
+        )
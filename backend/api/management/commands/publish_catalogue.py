@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api import snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Публикует снимки каталога тегов и ингредиентов для nginx. '
+        'Нужна после загрузки данных в обход моделей, остальные изменения '
+        'публикуются фоновой задачей.'
+    )
+
+    def handle(self, *args, **options):
+        for name, version in snapshots.publish().items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: версия {version}.'
+            ))
@@ -0,0 +1,272 @@
+"""
+Сбор метрик запросов: SQL, сериализация, рендеринг и размер ответа.
+
+Метрики текущего запроса хранятся в contextvar, гистограммы по маршрутам
+копятся в памяти процесса и периодически сбрасываются в файл каталога
+METRICS_DIR, по одному файлу на процесс. Эндпоинт метрик объединяет файлы
+всех воркеров gunicorn и удаляет файлы завершившихся процессов.
+
+SQL-запросы считает обёртка count_queries(), которая постоянно стоит на
+соединениях каждого потока (install()). Соединения у каждого потока свои,
+а под ASGI синхронные представления и ORM асинхронных работают не в
+потоке цикла событий, где выполняется middleware. contextvar с метриками
+запроса копируется в эти потоки, и обёртка находит по нему метрики.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'),
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+COUNTERS = ('db_seconds', 'serializer_seconds', 'renderer_seconds',
+            'response_bytes')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.route = 'unmatched'
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.renderer_seconds = 0.0
+        self.render_started = None
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper для учёта SQL-запросов."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def server_timing(self, total_seconds, response_bytes):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.db_seconds * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'serializer;dur={self.serializer_seconds * 1000:.1f}',
+            f'render;dur={self.renderer_seconds * 1000:.1f}',
+            f'total;dur={total_seconds * 1000:.1f}',
+            f'size;desc="{response_bytes} bytes"',
+        ))
+
+
+def current():
+    return _current.get()
+
+
+def count_queries(execute, sql, params, many, context):
+    """Обёртка execute_wrapper: учитывает запрос в метриках запроса."""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    return request_metrics(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """
+    Ставит count_queries на соединение, обработчик сигнала
+    connection_created.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def collect(metrics=None):
+    """
+    Включает сбор метрик на время обработки запроса. С metrics сбор
+    продолжается в уже начатые метрики, например при отдаче тела
+    потокового ответа.
+    """
+    metrics = metrics or RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def serializer_timer():
+    """
+    Учитывает время сериализации верхнего уровня.
+
+    Вложенные сериализаторы вызываются внутри родительского, поэтому
+    считается только внешний вызов.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth -= 1
+        if not metrics.depth:
+            metrics.serializer_seconds += time.perf_counter() - started
+
+
+class InstrumentedSerializerMixin:
+    """Добавляет учёт времени to_representation в метрики запроса."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+def _histogram(buckets):
+    return {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+
+
+def _observe(histogram, buckets, value):
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            histogram['buckets'][index] += 1
+            break
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+class MetricsRegistry:
+    """Агрегированные по маршрутам метрики процесса."""
+
+    def __init__(self, directory, flush_interval):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def observe(self, metrics, total_seconds, response_bytes):
+        with self.lock:
+            route = self.routes.get(metrics.route)
+            if route is None:
+                route = self.routes[metrics.route] = {
+                    'duration': _histogram(DURATION_BUCKETS),
+                    'queries': _histogram(QUERY_BUCKETS),
+                    **{counter: 0 for counter in COUNTERS},
+                }
+            _observe(route['duration'], DURATION_BUCKETS, total_seconds)
+            _observe(route['queries'], QUERY_BUCKETS, metrics.db_queries)
+            route['db_seconds'] += metrics.db_seconds
+            route['serializer_seconds'] += metrics.serializer_seconds
+            route['renderer_seconds'] += metrics.renderer_seconds
+            route['response_bytes'] += response_bytes
+        if time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Атомарно записывает метрики процесса в его файл."""
+        with self.lock:
+            payload = json.dumps(self.routes)
+            self.flushed_at = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'metrics-{os.getpid()}.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(payload, encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Объединяет метрики всех процессов."""
+        self.flush()
+        merged = {}
+        for path in self.directory.glob('metrics-*.json'):
+            pid = path.stem.partition('-')[2]
+            if pid.isdecimal() and not _alive(int(pid)):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                routes = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            for name, route in routes.items():
+                target = merged.setdefault(name, {
+                    'duration': _histogram(DURATION_BUCKETS),
+                    'queries': _histogram(QUERY_BUCKETS),
+                    **{counter: 0 for counter in COUNTERS},
+                })
+                for histogram in ('duration', 'queries'):
+                    target[histogram]['buckets'] = [
+                        total + value for total, value in zip(
+                            target[histogram]['buckets'],
+                            route[histogram]['buckets'],
+                        )
+                    ]
+                    target[histogram]['sum'] += route[histogram]['sum']
+                    target[histogram]['count'] += route[histogram]['count']
+                for counter in COUNTERS:
+                    target[counter] += route[counter]
+        return merged
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _render_histogram(lines, name, route, histogram, buckets):
+    cumulative = 0
+    for bound, value in zip(buckets, histogram['buckets']):
+        cumulative += value
+        lines.append(
+            f'{name}_bucket{{route="{route}",le="{_format_bound(bound)}"}} '
+            f'{cumulative}'
+        )
+    lines.append(f'{name}_sum{{route="{route}"}} {histogram["sum"]}')
+    lines.append(f'{name}_count{{route="{route}"}} {histogram["count"]}')
+
+
+def render_prometheus(routes):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = [
+        '# HELP foodgram_request_duration_seconds Время обработки запроса.',
+        '# TYPE foodgram_request_duration_seconds histogram',
+    ]
+    for route, data in sorted(routes.items()):
+        _render_histogram(lines, 'foodgram_request_duration_seconds', route,
+                          data['duration'], DURATION_BUCKETS)
+    lines += [
+        '# HELP foodgram_request_db_queries SQL-запросов на запрос.',
+        '# TYPE foodgram_request_db_queries histogram',
+    ]
+    for route, data in sorted(routes.items()):
+        _render_histogram(lines, 'foodgram_request_db_queries', route,
+                          data['queries'], QUERY_BUCKETS)
+    for counter in COUNTERS:
+        name = f'foodgram_request_{counter}_total'
+        lines.append(f'# TYPE {name} counter')
+        for route, data in sorted(routes.items()):
+            lines.append(f'{name}{{route="{route}"}} {data[counter]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(
+    settings.REQUEST_METRICS_DIR, settings.REQUEST_METRICS_FLUSH_INTERVAL
+)
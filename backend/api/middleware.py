@@ -0,0 +1,386 @@
+import hashlib
+import itertools
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from api import metrics, profiling
+from api.authentication import CachedTokenAuthentication
+from api.query_inspector import QueryInspector, watch_queries
+from foodgram.db_routers import replica_routing, resume_routing, use_replica
+
+
+class HybridMiddleware:
+    """
+    Основа middleware, работающего и под WSGI, и под ASGI.
+
+    Под ASGI синхронный middleware заставил бы Django выполнять
+    асинхронные представления в потоке. Наследники описывают обработку
+    запроса контекстным менеджером wrap() и методом finish().
+
+    Тело потокового ответа (api/streaming.py) создаётся уже после выхода
+    из wrap(). Наследники с resumes_streams = True получают каждый кусок
+    тела внутри resume(state), а после отдачи всего тела - вызов
+    finish_stream(state, response_bytes).
+    """
+    sync_capable = True
+    async_capable = True
+    resumes_streams = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.wrap(request) as state:
+            response = self.get_response(request)
+        return self.resume_stream(state, self.finish(state, response))
+
+    async def __acall__(self, request):
+        with self.wrap(request) as state:
+            response = await self.get_response(request)
+        return self.resume_stream(state, self.finish(state, response))
+
+    def wrap(self, request):
+        raise NotImplementedError
+
+    def finish(self, state, response):
+        return response
+
+    def resume(self, state):
+        return nullcontext()
+
+    def finish_stream(self, state, response_bytes):
+        pass
+
+    def resume_stream(self, state, response):
+        if self.resumes_streams and response.streaming:
+            chunks = (
+                self._aresumed if response.is_async else self._resumed
+            )(state, response.streaming_content)
+            response.streaming_content = chunks
+        return response
+
+    def _resumed(self, state, chunks):
+        chunks = iter(chunks)
+        response_bytes = 0
+        try:
+            while True:
+                with self.resume(state):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.finish_stream(state, response_bytes)
+
+    async def _aresumed(self, state, chunks):
+        chunks = aiter(chunks)
+        response_bytes = 0
+        try:
+            while True:
+                with self.resume(state):
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    break
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.finish_stream(state, response_bytes)
+
+
+def route_name(request, view_func):
+    """Имя маршрута: класс представления и действие вьюсета DRF."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Метрики запроса: SQL, сериализация, рендеринг и размер ответа.
+
+    Результат отдаётся в заголовке Server-Timing и агрегируется по
+    маршрутам для эндпоинта /api/metrics/.
+    """
+    resumes_streams = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        # Соединения других потоков получат обёртку при открытии.
+        connection_created.connect(
+            metrics.install, dispatch_uid='api.metrics.install'
+        )
+        for connection in connections.all(initialized_only=True):
+            metrics.install(connection)
+
+    def wrap(self, request):
+        return self.resume(metrics.RequestMetrics())
+
+    def resume(self, request_metrics):
+        return metrics.collect(request_metrics)
+
+    def finish(self, request_metrics, response):
+        # Заголовки потокового ответа уходят до тела: в Server-Timing
+        # только то, что сделано до начала потока.
+        total_seconds = time.perf_counter() - request_metrics.started
+        response_bytes = (
+            0 if response.streaming else len(response.content)
+        )
+        response['Server-Timing'] = request_metrics.server_timing(
+            total_seconds, response_bytes
+        )
+        if not response.streaming:
+            metrics.registry.observe(
+                request_metrics, total_seconds, response_bytes
+            )
+        return response
+
+    def finish_stream(self, request_metrics, response_bytes):
+        metrics.registry.observe(
+            request_metrics,
+            time.perf_counter() - request_metrics.started,
+            response_bytes,
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.current().route = route_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        request_metrics = metrics.current()
+        request_metrics.render_started = time.perf_counter()
+        response.add_post_render_callback(self._rendered)
+        return response
+
+    @staticmethod
+    def _rendered(response):
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            request_metrics.renderer_seconds += (
+                time.perf_counter() - request_metrics.render_started
+            )
+
+
+class QueryInspectorMiddleware(HybridMiddleware):
+    """
+    Поиск N+1 и медленных SQL-запросов для разработки и стенда.
+
+    Включается настройкой QUERY_INSPECTOR_ENABLED, в строгом режиме
+    (QUERY_INSPECTOR_STRICT) запрос с проблемами завершается исключением.
+    """
+    resumes_streams = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def wrap(self, request):
+        return self.resume(QueryInspector(
+            settings.QUERY_INSPECTOR_REPEAT_THRESHOLD,
+            settings.QUERY_INSPECTOR_SLOW_MS,
+            f'{request.method} {request.path}',
+        ))
+
+    def resume(self, inspector):
+        return watch_queries(inspector)
+
+    def finish(self, inspector, response):
+        if not response.streaming:
+            inspector.report(settings.QUERY_INSPECTOR_STRICT)
+        return response
+
+    def finish_stream(self, inspector, response_bytes):
+        inspector.report(settings.QUERY_INSPECTOR_STRICT)
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Чтение с реплик для безопасных запросов к REPLICA_READ_VIEWS.
+
+    После успешного изменяющего запроса чтение клиента
+    REPLICA_STICKY_SECONDS секунд идёт в основную базу, чтобы пользователь
+    сразу видел свои изменения, несмотря на отставание реплик. Отметка
+    хранится в подписанной cookie с временем выдачи: следующий запрос
+    клиента может попасть в любой воркер. С общим кэшем отметка по
+    заголовку Authorization дублируется в нём для клиентов без cookie.
+    """
+    resumes_streams = True
+    sticky_cookie = 'db_primary'
+    sticky_salt = 'api.replicas'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.views = set(settings.REPLICA_READ_VIEWS)
+        self.cache = (
+            caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+            if settings.REPLICA_STICKY_CACHE_ALIAS else None
+        )
+
+    @staticmethod
+    def sticky_key(request):
+        authorization = request.headers.get('Authorization')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'db:sticky:{digest}'
+
+    @contextmanager
+    def wrap(self, request):
+        with replica_routing() as choice:
+            request.replica_choice = choice
+            yield request
+
+    def resume(self, request):
+        return resume_routing(request.replica_choice)
+
+    def finish(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        response.set_signed_cookie(
+            self.sticky_cookie, '1', salt=self.sticky_salt,
+            max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+            samesite='Lax',
+        )
+        key = self.sticky_key(request)
+        if key and self.cache is not None:
+            self.cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def sticky(self, request):
+        """Читать ли запрос из основной базы после недавней записи."""
+        if request.get_signed_cookie(
+            self.sticky_cookie, default=None, salt=self.sticky_salt,
+            max_age=settings.REPLICA_STICKY_SECONDS,
+        ):
+            return True
+        key = self.sticky_key(request)
+        return bool(key and self.cache is not None and self.cache.get(key))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if (request.method not in SAFE_METHODS or view_class is None
+                or f'{view_class.__module__}.{view_class.__name__}'
+                not in self.views):
+            return
+        if not self.sticky(request):
+            use_replica()
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Профилирование запросов по заголовку X-Profile и выборочное
+    профилирование каждого PROFILING_SAMPLE_EVERY-го запроса маршрута,
+    см. api/profiling.py.
+
+    Профилировщик работает только с потоком, в котором запущен, поэтому
+    process_view запускает его в том потоке, где Django выполнит
+    представление, и не вызывает представление сам: process_view других
+    middleware и обработка ответа идут как обычно. Под ASGI это поток
+    sync_to_async запроса, а не цикл событий с чужими запросами, и
+    профилировщик останавливается в нём же. Профиль охватывает
+    представление и рендеринг ответа. Асинхронные представления
+    выполняются в цикле событий вместе с другими запросами и не
+    профилируются, ответ получает заголовок X-Profile-Skipped.
+
+    Стоит последним, после AuthenticationMiddleware: без подписи режим
+    принимается только от сотрудника, вошедшего в админку или по токену.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.counters = defaultdict(lambda: itertools.count(1))
+
+    def requested(self, request, route):
+        """(режим, выборочный ли профиль) или None."""
+        value = request.headers.get('X-Profile')
+        if value:
+            mode = profiling.signed_mode(value)
+            if mode is None and value in profiling.MODES and self.is_staff(
+                request
+            ):
+                mode = value
+            if mode is not None:
+                return mode, False
+        every = settings.PROFILING_SAMPLE_EVERY
+        if every and next(self.counters[route]) % every == 0:
+            return 'sample', True
+        return None
+
+    @staticmethod
+    def is_staff(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+
+    def wrap(self, request):
+        return nullcontext(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            # Поток представления: ASGIHandler выполняет синхронный код
+            # запроса в одном потоке.
+            await sync_to_async(profile.stop, thread_sensitive=True)()
+        return self.finish(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not (request.headers.get('X-Profile')
+                or settings.PROFILING_SAMPLE_EVERY):
+            return None
+        route = route_name(request, view_func)
+        requested = self.requested(request, route)
+        if requested is None:
+            return None
+        mode, sampled = requested
+        if iscoroutinefunction(view_func):
+            request.profile_skipped = not sampled
+            return None
+        request.profile = profiling.Profile(
+            mode, route, f'{request.method} {request.get_full_path()}',
+            sampled,
+        )
+        return None
+
+    def finish(self, request, response):
+        if getattr(request, 'profile_skipped', False):
+            response['X-Profile-Skipped'] = 'async view'
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.stop()
+            profile_id = profile.save()
+            if profile_id is not None:
+                response['X-Profile-Url'] = reverse(
+                    'api:profile', args=(profile_id,)
+                )
+        return response
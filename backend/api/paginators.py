@@ -1,7 +1,27 @@
 from django.conf import settings
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 
 
 class PageLimitNumberPagination(PageNumberPagination):
     page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
     page_size_query_param = 'limit'
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Как paginate_queryset(), но страница возвращается срезом queryset
+        без загрузки строк, для потоковых ответов (api/streaming.py).
+        """
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        return self.page.object_list
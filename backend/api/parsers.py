@@ -0,0 +1,42 @@
+"""
+Парсер JSON на orjson.
+
+Тело запроса в UTF-8 разбирается orjson. Если orjson не установлен,
+кодировка запроса другая, в теле есть числа из 20 и более цифр (целые
+больше 64 бит orjson превращает в float) или orjson отверг документ (NaN,
+одиночные суррогаты, ошибки синтаксиса), разбор повторяет
+rest_framework.parsers.JSONParser: результат и тексты ошибок остаются
+прежними.
+"""
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+from api.renderers import FastJSONRenderer, orjson
+
+# Цифры переводятся в "0", остальное в пробел: поиск подстроки из 20 нулей
+# по результату на порядок быстрее регулярного выражения.
+DIGITS = bytes(ord('0') if chr(code).isdigit() and code < 128 else ord(' ')
+               for code in range(256))
+LONG_NUMBER = b'0' * 20
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser, который использует orjson, если он установлен."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get(
+            'encoding', settings.DEFAULT_CHARSET
+        )
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_NUMBER not in body.translate(DIGITS):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -14,3 +17,15 @@ class IsAuthorOrAdminOrReadOnly(BasePermission):
             request.method in SAFE_METHODS
             or obj.author == request.user or request.user.is_staff
         )
+
+
+class IsAdminOrMetricsToken(BasePermission):
+    """Доступ для администраторов или по токену METRICS_TOKEN (Bearer)."""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and hmac.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
@@ -0,0 +1,229 @@
+"""
+Профилирование отдельных запросов по требованию, см. ProfilingMiddleware.
+
+Запрос профилируется, если в заголовке X-Profile передан режим,
+подписанный командой profiling_token, или режим без подписи от
+пользователя с is_staff. Режимы:
+
+    cprofile - детерминированный профилировщик cProfile, файл .prof
+               открывается pstats, snakeviz и подобными;
+    sample   - стек потока запроса каждые PROFILING_SAMPLE_INTERVAL
+               секунд, файл .folded - стеки в формате flamegraph.pl.
+
+Профилируются вызов синхронного представления и рендеринг ответа, см.
+ProfilingMiddleware. Профиль и сводка самых затратных функций сохраняются
+в PROFILING_DIR, ссылка на сводку возвращается в заголовке X-Profile-Url
+ответа. Кроме того, с PROFILING_SAMPLE_EVERY=N каждый N-й запрос маршрута
+профилируется режимом sample без заголовка, и его стеки дописываются в
+общий файл маршрута для команды export_flamegraph.
+
+С PROFILING_ENABLED=False middleware не подключается и ничего не стоит.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+MODES = ('cprofile', 'sample')
+SIGNING_SALT = 'api.profiling'
+# Строк в сводке самых затратных функций.
+SUMMARY_LINES = 30
+PROFILE_ID = re.compile(r'[0-9]{14}-[0-9a-f]{8}')
+
+
+def token(mode):
+    """Подписанное значение заголовка X-Profile для режима mode."""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(mode)
+
+
+def signed_mode(value):
+    """Режим из подписанного значения заголовка или None."""
+    try:
+        mode = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return mode if mode in MODES else None
+
+
+def directory(*parts):
+    path = Path(settings.PROFILING_DIR, *parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def route_file(route):
+    """Файл стеков маршрута для flame graph."""
+    name = re.sub(r'[^\w.-]', '_', route)
+    return directory('routes') / f'{name}.folded'
+
+
+def folded(frame, outer=frozenset()):
+    """
+    Стек кадра в формате flamegraph.pl: от корня к листу через ;. Кадры
+    outer и выше них не включаются.
+    """
+    names = []
+    while frame is not None and id(frame) not in outer:
+        code = frame.f_code
+        names.append(f'{code.co_name} '
+                     f'({os.path.basename(code.co_filename)}:'
+                     f'{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """
+    Снимает стек потока запроса из отдельного потока. Кадры, активные при
+    создании сэмплера (сервер, внешние middleware), в стеки не попадают.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.outer = set()
+        frame = sys._getframe()
+        while frame is not None:
+            self.outer.add(id(frame))
+            frame = frame.f_back
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            # Поток запроса уже ждёт остановки сэмплера в disable().
+            if frame is not None and not self.stopped.is_set():
+                self.stacks[folded(frame, self.outer)] += 1
+
+
+class Profile:
+    """Профиль одного запроса."""
+
+    def __init__(self, mode, route, title, sampled=False):
+        self.mode = mode
+        self.route = route
+        self.title = title
+        self.sampled = sampled
+        self.profiler = (
+            cProfile.Profile() if mode == 'cprofile'
+            else Sampler(settings.PROFILING_SAMPLE_INTERVAL)
+        )
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.profiler.enable()
+
+    def stop(self):
+        if self.seconds is None:
+            self.profiler.disable()
+            self.seconds = time.perf_counter() - self.started
+
+    def save(self):
+        """
+        Сохраняет профиль. Возвращает его id или None для выборочного
+        профиля, стеки которого дописаны в файл маршрута.
+        """
+        self.stop()
+        if self.sampled:
+            lines = ''.join(
+                f'{stack} {count}\n'
+                for stack, count in self.profiler.stacks.items()
+            )
+            # Дозапись небольшими порциями из разных процессов.
+            with open(route_file(self.route), 'a') as file:
+                file.write(lines)
+            return None
+
+        profile_id = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        path = directory() / profile_id
+        if self.mode == 'cprofile':
+            self.profiler.dump_stats(f'{path}.prof')
+            summary = self.cprofile_summary()
+        else:
+            with open(f'{path}.folded', 'w') as file:
+                file.writelines(
+                    f'{stack} {count}\n'
+                    for stack, count in self.profiler.stacks.items()
+                )
+            summary = self.sample_summary()
+        header = (f'{self.title}\n'
+                  f'Маршрут: {self.route}, режим: {self.mode}, '
+                  f'время: {self.seconds * 1000:.1f} мс\n\n')
+        Path(f'{path}.txt').write_text(header + summary)
+        expire()
+        return profile_id
+
+    def cprofile_summary(self):
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(
+            'cumulative'
+        ).print_stats(SUMMARY_LINES)
+        return stream.getvalue()
+
+    def sample_summary(self):
+        own, total = Counter(), Counter()
+        for stack, count in self.profiler.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        samples = sum(self.profiler.stacks.values()) or 1
+        lines = [f'Снимков стека: {sum(self.profiler.stacks.values())}, '
+                 f'интервал {settings.PROFILING_SAMPLE_INTERVAL * 1000} мс']
+        for title, counter in (('Собственное время', own),
+                               ('Время с вызовами', total)):
+            lines.append(f'\n{title}:')
+            lines.extend(
+                f'{count / samples:7.1%}  {name}'
+                for name, count in counter.most_common(SUMMARY_LINES)
+            )
+        return '\n'.join(lines) + '\n'
+
+
+def expire():
+    """Оставляет PROFILING_KEEP последних профилей."""
+    summaries = sorted(directory().glob('*.txt'))
+    for summary in summaries[:-settings.PROFILING_KEEP or None]:
+        for path in directory().glob(f'{summary.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def stored(profile_id, suffix):
+    """Путь к файлу сохранённого профиля или None."""
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    path = Path(settings.PROFILING_DIR, f'{profile_id}{suffix}')
+    return path if path.exists() else None
+
+
+def flamegraph(route):
+    """Сложенные стеки выборочных профилей маршрута для flamegraph.pl."""
+    stacks = Counter()
+    path = route_file(route)
+    if path.exists():
+        with open(path) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdecimal():
+                    stacks[stack] += int(count)
+    return stacks
@@ -0,0 +1,161 @@
+"""
+Обнаружение N+1 и медленных SQL-запросов в рамках одного запроса к API.
+
+Запросы группируются по нормализованной форме (без литералов и с
+одинаковыми списками IN). Формы, повторившиеся не меньше порогового числа
+раз, и запросы дольше лимита попадают в лог вместе с местом в коде
+проекта, откуда они были вызваны: методом сериализатора или
+представления. В строгом режиме вместо записи в лог выбрасывается
+исключение, что позволяет ловить регрессии в тестах.
+"""
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+# Обёртки execute_wrapper и учёт метрик не являются источником запросов.
+IGNORED_FILES = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name('metrics.py')),
+    str(Path(__file__).resolve().with_name('middleware.py')),
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:(?:%s|\?)\s*,\s*)+(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryInspectionError(Exception):
+    """Найден N+1 или медленный запрос в строгом режиме."""
+
+
+def normalize(sql):
+    """Форма запроса без литералов и с единообразными списками IN."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def serializer_field(frame):
+    """Поле сериализатора DRF, которое вычисляется в данном кадре."""
+    if frame.f_code.co_name != 'to_representation':
+        return None
+    field = frame.f_locals.get('field')
+    parent = getattr(field, 'parent', None)
+    if parent is None:
+        return None
+    return f'{type(parent).__name__}.{field.field_name}'
+
+
+def origin():
+    """
+    Место в коде проекта, откуда пришёл запрос.
+
+    Ближайший кадр из кода проекта дополняется полем сериализатора, при
+    вычислении которого был выполнен запрос.
+    """
+    frame = sys._getframe(2)
+    place = field = None
+    while frame is not None and not (place and field):
+        filename = frame.f_code.co_filename
+        if field is None:
+            field = serializer_field(frame)
+        if (place is None
+                and filename.startswith(PROJECT_ROOT)
+                and filename not in IGNORED_FILES
+                and 'site-packages' not in filename):
+            place = (f'{Path(filename).relative_to(PROJECT_ROOT)}:'
+                     f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    place = place or 'unknown'
+    return f'{place} [{field}]' if field else place
+
+
+class QueryInspector:
+    """Копит запросы одного HTTP-запроса и формирует отчёт о проблемах."""
+
+    def __init__(self, repeat_threshold, slow_ms, label='queries'):
+        self.label = label
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        self.shapes = defaultdict(list)
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            where = origin()
+            self.shapes[normalize(sql)].append(where)
+            if duration_ms >= self.slow_ms:
+                self.slow.append((duration_ms, sql, where))
+
+    def problems(self):
+        """Описания найденных N+1 и медленных запросов."""
+        problems = []
+        for shape, origins in self.shapes.items():
+            if len(origins) >= self.repeat_threshold:
+                places = ', '.join(sorted(set(origins)))
+                problems.append(
+                    f'N+1: {len(origins)} одинаковых запросов из {places}: '
+                    f'{shape}'
+                )
+        for duration_ms, sql, where in self.slow:
+            problems.append(
+                f'Медленный запрос {duration_ms:.1f} мс из {where}: {sql}'
+            )
+        return problems
+
+    def report(self, strict):
+        problems = self.problems()
+        if not problems:
+            return
+        if strict:
+            raise QueryInspectionError(
+                f'{self.label}:\n' + '\n'.join(problems)
+            )
+        for problem in problems:
+            logger.warning('%s: %s', self.label, problem)
+
+
+@contextmanager
+def watch_queries(inspector):
+    """Передаёт inspector запросы всех соединений внутри блока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(inspector))
+        yield inspector
+
+
+@contextmanager
+def inspect_queries(label='queries', strict=None, repeat_threshold=None,
+                    slow_ms=None):
+    """
+    Проверяет запросы внутри блока.
+
+    Параметры по умолчанию берутся из настроек QUERY_INSPECTOR_*.
+    Пример для тестов: with inspect_queries(strict=True): client.get(url)
+    """
+    inspector = QueryInspector(
+        repeat_threshold or settings.QUERY_INSPECTOR_REPEAT_THRESHOLD,
+        slow_ms or settings.QUERY_INSPECTOR_SLOW_MS,
+        label,
+    )
+    with watch_queries(inspector):
+        yield inspector
+    inspector.report(
+        settings.QUERY_INSPECTOR_STRICT if strict is None else strict
+    )
@@ -0,0 +1,174 @@
+"""
+Сериализация рецептов для чтения без полей DRF.
+
+RecipeSerializer на каждый рецепт создаёт и обходит деревья вложенных
+сериализаторов тегов, автора и ингредиентов, а картинку отдаёт через
+Base64ImageField. Для списка и детальной страницы рецепта тот же JSON
+собирается напрямую из строк .values() и словарей связанных данных,
+загруженных пакетно: по запросу на теги, ингредиенты и авторов страницы и
+ещё по одному на избранное, список покупок и подписки для
+авторизованного пользователя. Совпадение с RecipeSerializer поле в поле
+проверяет команда check_recipe_contract.
+
+Связанные данные загружаются методом load() или, в асинхронных
+представлениях, aload(), а свойство data только собирает словари. С
+personal=False поля пользователя запроса (is_favorited,
+is_in_shopping_cart, author.is_subscribed) не выводятся: так рецепты
+отдаёт синхронизация каталога, общая для всех клиентов.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+
+from api.metrics import serializer_timer
+from recipes.models import Favorites, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# Автор удалённого пользователя, см. RecipeSerializer.to_representation().
+ANONYMOUS_AUTHOR = {
+    'id': 0,
+    'username': 'AnonymousUser',
+    'email': '',
+    'first_name': '',
+    'last_name': '',
+}
+NO_IMAGE = 'Картинка отсутствует.'
+
+
+class RecipeReadSerializer:
+    """
+    Рецепты в формате RecipeSerializer из строк
+    Recipe.objects.values(*RecipeReadSerializer.fields).
+    """
+    fields = ('id', 'name', 'image', 'text', 'cooking_time', 'author_id')
+
+    def __init__(self, rows, many=False, context=None, personal=True):
+        self.many = many
+        self.personal = personal
+        self.rows = list(rows) if many else [rows]
+        self.request = context['request']
+        self.related = None
+
+    def queries(self):
+        """Запросы связанных данных: {имя: queryset}."""
+        recipe_ids = [row['id'] for row in self.rows]
+        author_ids = {row['author_id'] for row in self.rows} - {None}
+        queries = {
+            'tags': Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by('tag__name').values_list(
+                'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+            ),
+            'ingredients': RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).values_list(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount',
+            ),
+            # Как select_related() в RecipeSerializer: автор, удаляемый
+            # в фоне, выводится под временным именем deleted:<id>.
+            'authors': User.all_objects.filter(
+                pk__in=author_ids
+            ).values_list(
+                'id', 'username', 'email', 'first_name', 'last_name'
+            ),
+        }
+        user = self.request.user
+        if self.personal and user.is_authenticated:
+            queries['favorited'] = Favorites.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)
+            queries['in_shopping_cart'] = ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)
+            queries['subscribed'] = Subscription.objects.filter(
+                user=user, author_id__in=author_ids
+            ).values_list('author_id', flat=True)
+        return queries
+
+    def load(self):
+        self.related = {
+            name: list(queryset) for name, queryset in self.queries().items()
+        }
+
+    async def aload(self):
+        related = {}
+        for name, queryset in self.queries().items():
+            related[name] = [row async for row in queryset]
+        self.related = related
+
+    @property
+    def data(self):
+        if self.related is None:
+            self.load()
+        with serializer_timer():
+            data = self.build()
+        return data if self.many else data[0]
+
+    def build(self):
+        related = self.related
+        user = self.request.user
+        favorited = set(related.get('favorited', ()))
+        in_shopping_cart = set(related.get('in_shopping_cart', ()))
+        subscribed = set(related.get('subscribed', ()))
+
+        tags = defaultdict(list)
+        for recipe_id, pk, name, color, slug in related['tags']:
+            tags[recipe_id].append(
+                {'id': pk, 'name': name, 'color': color, 'slug': slug}
+            )
+        ingredients = defaultdict(list)
+        for recipe_id, pk, name, unit, amount in related['ingredients']:
+            ingredients[recipe_id].append({
+                'id': pk, 'name': name, 'measurement_unit': unit,
+                'amount': amount,
+            })
+        authors = {
+            pk: {
+                'id': pk,
+                'username': username,
+                'email': email,
+                'first_name': first_name,
+                'last_name': last_name,
+            }
+            for pk, username, email, first_name, last_name
+            in related['authors']
+        }
+        if self.personal:
+            for pk, author in authors.items():
+                author['is_subscribed'] = (
+                    user.is_authenticated and pk != user.pk
+                    and pk in subscribed
+                )
+
+        storage = Recipe._meta.get_field('image').storage
+        image_urls = {}
+        data = []
+        for row in self.rows:
+            pk = row['id']
+            image = row['image']
+            if image and image not in image_urls:
+                image_urls[image] = self.request.build_absolute_uri(
+                    storage.url(image)
+                )
+            author = authors.get(row['author_id'])
+            recipe = {
+                'id': pk,
+                'tags': tags.get(pk, []),
+                'author': author or ANONYMOUS_AUTHOR,
+                'ingredients': ingredients.get(pk, []),
+                'is_favorited': pk in favorited,
+                'is_in_shopping_cart': pk in in_shopping_cart,
+                'name': row['name'],
+                'image': image_urls[image] if image else NO_IMAGE,
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            }
+            if not self.personal:
+                del recipe['is_favorited'], recipe['is_in_shopping_cart']
+            data.append(recipe)
+        return data
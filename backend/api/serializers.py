@@ -6,13 +6,14 @@ from rest_framework.serializers import (ModelSerializer, ReadOnlyField,
                                         SerializerMethodField, ValidationError)
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.metrics import InstrumentedSerializerMixin
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import Subscription
 
 User = get_user_model()
 
 
-class FoodgramUserSerializer(UserSerializer):
+class FoodgramUserSerializer(InstrumentedSerializerMixin, UserSerializer):
     """Сериализатор для вывода пользователей Foodgram."""
     is_subscribed = SerializerMethodField()
 
@@ -30,10 +31,15 @@ class FoodgramUserSerializer(UserSerializer):
 
         if user.is_anonymous or (user == obj):
             return False
+
+        subscribed_ids = self.context.get('subscribed_ids')
+        if subscribed_ids is not None:
+            return obj.pk in subscribed_ids
         return user.subscriptions.filter(author=obj).exists()
 
 
-class FoodgramUserCreateSerializer(UserCreateSerializer):
+class FoodgramUserCreateSerializer(InstrumentedSerializerMixin,
+                                   UserCreateSerializer):
     """Сериализатор для создания пользователей Foodgram."""
 
     class Meta(FoodgramUserSerializer.Meta):
@@ -72,6 +78,9 @@ class SubscriptionSerializer(FoodgramUserSerializer):
 
     def get_recipes_count(self, obj):
         """Выдача общего количества рецептов у конкретного автора."""
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is not None:
+            return recipes_count
         return obj.recipes.count()
 
 
@@ -100,7 +109,7 @@ class SubscriptionCreateSerializer(ModelSerializer):
         return data
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(InstrumentedSerializerMixin, ModelSerializer):
     """Сериализатор для вывода тэгов."""
 
     class Meta:
@@ -109,7 +118,7 @@ class TagSerializer(ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(InstrumentedSerializerMixin, ModelSerializer):
     """Сериализатор для вывода ингредиентов."""
 
     class Meta:
@@ -118,7 +127,7 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class RecipeIngredientSerializer(ModelSerializer):
+class RecipeIngredientSerializer(InstrumentedSerializerMixin, ModelSerializer):
     """Сериализатор для вывода ингредиентов содержащихся в рецепте."""
     id = ReadOnlyField(source='ingredient.id')
     name = ReadOnlyField(source='ingredient.name')
@@ -132,7 +141,7 @@ class RecipeIngredientSerializer(ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class ShortRecipeSerializer(ModelSerializer):
+class ShortRecipeSerializer(InstrumentedSerializerMixin, ModelSerializer):
     """Сериализатор для вывода рецептов во вложенном поле recipes."""
 
     class Meta:
@@ -141,7 +150,7 @@ class ShortRecipeSerializer(ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class RecipeSerializer(ModelSerializer):
+class RecipeSerializer(InstrumentedSerializerMixin, ModelSerializer):
     """Сериализатор для рецептов."""
     tags = TagSerializer(many=True, read_only=True)
     author = FoodgramUserSerializer(read_only=True)
@@ -173,7 +182,7 @@ class RecipeSerializer(ModelSerializer):
 
     def get_is_favorited(self, recipe):
         """Проверка, находится ли рецепт в избранном у пользователя"""
-        user = self.context.get('view').request.user
+        user = self.context.get('request').user
 
         if user.is_anonymous:
             return False
@@ -182,7 +191,7 @@ class RecipeSerializer(ModelSerializer):
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверка, находится ли рецепт в списке покупок у пользователя"""
-        user = self.context.get('view').request.user
+        user = self.context.get('request').user
 
         if user.is_anonymous:
             return False
@@ -277,7 +286,6 @@ class RecipeSerializer(ModelSerializer):
         recipe.ingredients.clear()
         self.recipe_ingredient_create(recipe, ingredients)
 
-        recipe.save()
         return recipe
 
     @staticmethod
@@ -341,3 +349,25 @@ class RecipeSerializer(ModelSerializer):
             valid_ingredients[ingredient['id']] = ingredient['amount']
 
         return valid_ingredients
+
+
+class CookableRecipeSerializer(RecipeSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя."""
+    coverage = SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage',)
+
+    def get_coverage(self, recipe):
+        return round(self.context['coverage'][recipe.pk], 4)
+
+
+class SimilarRecipeSerializer(ShortRecipeSerializer):
+    """Похожий рецепт с косинусной близостью к исходному."""
+    score = SerializerMethodField()
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('score',)
+
+    def get_score(self, recipe):
+        return round(recipe.score, 4)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.tasks import publish_catalogue
+from jobs import deletion
+from jobs.queue import enqueue_merged
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+# Поля пользователя, при изменении которых его токены отзываются.
+TOKEN_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Выход (token/logout) и удаление пользователя удаляют токен."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(pre_save, sender=User)
+def remember_token_fields(sender, instance, update_fields=None, **kwargs):
+    """Прежние значения полей TOKEN_FIELDS для invalidate_user_tokens."""
+    instance._token_fields = None
+    if instance._state.adding or (
+        update_fields is not None and update_fields.isdisjoint(TOKEN_FIELDS)
+    ):
+        return
+    instance._token_fields = User._base_manager.filter(
+        pk=instance.pk
+    ).values_list(*TOKEN_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """
+    Смена пароля, деактивация и изменение прав отзывают закэшированные
+    токены пользователя. Остальные изменения, например last_login при
+    входе, кэш не затрагивают.
+    """
+    previous = getattr(instance, '_token_fields', None)
+    if previous is not None and previous != tuple(
+        getattr(instance, field) for field in TOKEN_FIELDS
+    ):
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(deletion.scheduled, sender=User)
+def invalidate_hidden_user_tokens(sender, instance, **kwargs):
+    """Пользователь деактивируется при пометке на удаление без post_save."""
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def publish_changed_catalogue(sender, **kwargs):
+    """
+    Одна задача публикации на все изменения за CATALOGUE_SNAPSHOT_DELAY:
+    импорт тысяч ингредиентов не ставит тысячу задач. Ожидающая задача
+    ищется после коммита: если она уже выполняется, её снимок может не
+    включать это изменение, и ставится новая.
+    """
+    transaction.on_commit(lambda: enqueue_merged(
+        publish_catalogue, lambda pending, payload: pending,
+        delay=settings.CATALOGUE_SNAPSHOT_DELAY,
+    ))
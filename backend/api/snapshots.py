@@ -0,0 +1,129 @@
+"""
+Снимки каталога тегов и ингредиентов в статических файлах.
+
+Теги и ингредиенты меняются редко, а /api/tags/ и /api/ingredients/
+запрашиваются при каждой загрузке страницы. publish() записывает ответы
+этих эндпоинтов байт в байт в CATALOGUE_SNAPSHOT_ROOT вместе с копиями,
+сжатыми gzip и brotli (если он установлен):
+
+    tags.<хеш>.json, .json.gz, .json.br - версия, под этим именем
+                                          содержимое не меняется;
+    tags.json, .json.gz, .json.br       - текущая версия.
+
+nginx отдаёт текущую версию на /api/tags/ и /api/ingredients/ без
+параметров сам, не обращаясь к воркерам Django (infra/nginx.conf). Без
+nginx те же файлы отдают представления, см. response(). Снимки
+публикуются фоновой задачей после изменения тегов и ингредиентов (см.
+api/signals.py) и командой publish_catalogue - после загрузки данных в
+обход моделей. Версии старше OLD_VERSIONS_TTL удаляются при публикации.
+"""
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.settings import api_settings
+
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOGUES = {
+    'tags': (Tag, TagSerializer),
+    'ingredients': (Ingredient, IngredientSerializer),
+}
+# Кодировки в порядке предпочтения: (Content-Encoding, суффикс файла).
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'), (None, ''))
+OLD_VERSIONS_TTL = 24 * 3600
+
+
+def root():
+    return Path(settings.CATALOGUE_SNAPSHOT_ROOT)
+
+
+def render(name):
+    """Тело ответа эндпоинта name, как его рендерит DRF."""
+    model, serializer_class = CATALOGUES[name]
+    data = serializer_class(model.objects.all(), many=True).data
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data)
+
+
+def compressed(body):
+    """{суффикс файла: содержимое} для всех доступных кодировок."""
+    files = {'': body, '.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        files['.br'] = brotli.compress(body)
+    return files
+
+
+def write(path, content):
+    """Атомарная запись: читатель видит старый или новый файл целиком."""
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix='.', delete=False
+    ) as file:
+        file.write(content)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def publish():
+    """Публикует снимки всех каталогов, возвращает {каталог: версия}."""
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    versions = {}
+    for name in CATALOGUES:
+        files = compressed(render(name))
+        version = hashlib.sha256(files['']).hexdigest()[:12]
+        for suffix, content in files.items():
+            path = directory / f'{name}.{version}.json{suffix}'
+            if not path.exists():
+                write(path, content)
+        # Несжатый файл последним: по нему nginx решает, есть ли снимок.
+        for suffix in sorted(files, reverse=True):
+            write(directory / f'{name}.json{suffix}', files[suffix])
+        versions[name] = version
+    expire(directory, versions)
+    return versions
+
+
+def expire(directory, versions):
+    """Удаляет старые версии, кроме текущих."""
+    deadline = time.time() - OLD_VERSIONS_TTL
+    for path in directory.glob('*.*.json*'):
+        match = re.fullmatch(r'(\w+)\.([0-9a-f]{12})\.json(\.gz|\.br)?',
+                             path.name)
+        if (match and versions.get(match[1]) != match[2]
+                and path.stat().st_mtime < deadline):
+            path.unlink(missing_ok=True)
+
+
+def response(request, name):
+    """
+    Текущий снимок name в лучшей кодировке из Accept-Encoding запроса или
+    None, если снимок не опубликован.
+    """
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    path = root() / f'{name}.json'
+    for encoding, suffix in ENCODINGS:
+        if encoding and not re.search(rf'\b{encoding}\b', accepted):
+            continue
+        try:
+            body = Path(f'{path}{suffix}').read_bytes()
+        except FileNotFoundError:
+            continue
+        snapshot = HttpResponse(body, content_type='application/json')
+        if encoding:
+            snapshot['Content-Encoding'] = encoding
+        patch_vary_headers(snapshot, ('Accept-Encoding',))
+        return snapshot
+    return None
@@ -0,0 +1,134 @@
+"""
+Потоковые JSON-ответы для больших списков.
+
+Response DRF собирает список целиком: все объекты, затем все словари
+сериализатора, затем весь JSON, и только потом отправляет его. Потоковый
+ответ читает строки курсором (.iterator()), сериализует и кодирует их
+пачками по STREAM_BATCH_SIZE и отдаёт каждую пачку сразу: память не растёт
+с длиной списка, первые байты уходят после первой пачки. JSON совпадает с
+обычным ответом байт в байт.
+
+Потоком отдаются списки без пагинации (теги, ингредиенты) и страницы от
+STREAM_MIN_PAGE_SIZE объектов (?limit=), то есть выгрузки рецептов и
+пользователей, в том числе асинхронными представлениями
+(api/async_views.py). Браузерный API, отступы по запросу клиента и прочие
+форматы получают обычный Response. Ошибка базы посреди ответа обрывает
+его: заголовки и статус к этому моменту уже отправлены.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+# Место списка в теле пагинированного ответа с пустым списком.
+RESULTS_PLACEHOLDER = b'[]'
+
+
+def batches(queryset, size):
+    """
+    Списки по size объектов из queryset, читаемого курсором, или из
+    уже загруженного списка.
+    """
+    rows = (
+        iter(queryset) if isinstance(queryset, list)
+        else queryset.iterator(chunk_size=size)
+    )
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def abatches(queryset, size):
+    """Асинхронный аналог batches()."""
+    batch = []
+    async for row in queryset.aiterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def frame(renderer, envelope):
+    """
+    Байты до и после списка. envelope - пагинированный ответ с пустым
+    списком, в место которого встаёт список, или None.
+    """
+    if envelope is None:
+        return b'[', b']'
+    head, _, tail = renderer.render(envelope).rpartition(RESULTS_PLACEHOLDER)
+    return head + b'[', b']' + tail
+
+
+def encode_batch(renderer, batch, first):
+    # Пачка кодируется одним вызовом рендерера, без скобок списка.
+    chunk = renderer.render(batch)[1:-1]
+    return chunk if first else b',' + chunk
+
+
+def encode(renderer, serialized, envelope=None):
+    """Куски JSON списка из пачек уже сериализованных объектов."""
+    head, tail = frame(renderer, envelope)
+    yield head
+    first = True
+    for batch in serialized:
+        if batch:
+            yield encode_batch(renderer, batch, first)
+            first = False
+    yield tail
+
+
+async def aencode(renderer, serialized, envelope=None):
+    """Асинхронный аналог encode() для асинхронных представлений."""
+    head, tail = frame(renderer, envelope)
+    yield head
+    first = True
+    async for batch in serialized:
+        if batch:
+            yield encode_batch(renderer, batch, first)
+            first = False
+    yield tail
+
+
+class StreamingListMixin:
+    """Потоковый список для вьюсетов DRF, см. stream_list()."""
+
+    def serialize_batch(self, batch):
+        return self.get_serializer(batch, many=True).data
+
+    def can_stream(self):
+        renderer = self.request.accepted_renderer
+        return (
+            renderer.format == 'json'
+            and getattr(renderer, 'compact', False)
+            and renderer.get_indent(
+                self.request.accepted_media_type, self.get_renderer_context()
+            ) is None
+        )
+
+    def stream_list(self, queryset):
+        """
+        Потоковый ответ со списком queryset или, если список отдаётся
+        обычным Response, None. С пагинацией поток включается для страниц
+        от STREAM_MIN_PAGE_SIZE объектов.
+        """
+        if not self.can_stream():
+            return None
+        envelope = None
+        paginator = self.paginator
+        if paginator is not None:
+            page_size = paginator.get_page_size(self.request)
+            if not page_size or page_size < settings.STREAM_MIN_PAGE_SIZE:
+                return None
+            queryset = paginator.page_queryset(queryset, self.request, self)
+            envelope = paginator.get_paginated_response([]).data
+        renderer = self.request.accepted_renderer
+        return StreamingHttpResponse(
+            encode(
+                renderer,
+                map(self.serialize_batch,
+                    batches(queryset, settings.STREAM_BATCH_SIZE)),
+                envelope,
+            ),
+            content_type=renderer.media_type,
+        )
@@ -0,0 +1,8 @@
+from api import snapshots
+from jobs.queue import task
+
+
+@task
+def publish_catalogue():
+    """Публикация снимков каталога, см. api/signals.py."""
+    return snapshots.publish()
@@ -0,0 +1,189 @@
+"""
+Ограничение частоты запросов к изменяющим и тяжёлым действиям API.
+
+Лимиты задаются в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] по области
+действия (атрибут throttle_scope, задаётся в @action): '<область>' - на
+пользователя, '<область>.ip' - на IP-адрес. Действия без области и области
+без лимита не ограничиваются.
+
+Лимит считается маркерной корзиной (token bucket): ёмкость - число
+запросов за период, корзина пополняется равномерно. Корзины всех воркеров
+gunicorn одного сервера хранятся в файле THROTTLE_TABLE_PATH, отображённом
+в память: проверка - это хеш ключа, блокировка файла и чтение с записью
+нескольких слотов, без обращения к базе и сети. Для нескольких серверов
+корзины можно хранить в кэше Django THROTTLE_CACHE_ALIAS (например,
+Redis); чтение и запись там не атомарны, и при одновременных запросах
+одного клиента лимит соблюдается приблизительно.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Слот таблицы: хеш ключа (0 - свободный слот), маркеры, время обновления.
+SLOT = struct.Struct('<Qdd')
+# Слотов, просматриваемых для одного ключа.
+PROBES = 8
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60): ёмкость корзины и период в секундах."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take(tokens, updated, capacity, refill, now):
+    """
+    Пополняет корзину и забирает маркер. Возвращает остаток маркеров и
+    время ожидания в секундах: 0, если запрос разрешён.
+    """
+    tokens = min(capacity, tokens + max(0.0, now - updated) * refill)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / refill
+
+
+class BucketTable:
+    """
+    Корзины в файле, отображённом в память всех процессов: открытая
+    адресация на PROBES слотов. Если все слоты ключа заняты, вытесняется
+    корзина, обновлявшаяся раньше остальных, и ключ начинает с полной.
+    """
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.fd = None
+        self.memory = None
+
+    def open(self):
+        size = self.slots * SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self.memory = mmap.mmap(fd, size)
+        self.fd = fd
+
+    def consume(self, key, capacity, refill, now):
+        key_hash = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little'
+        ) | 1
+        start = key_hash % self.slots
+        with self.lock:
+            if self.memory is None:
+                self.open()
+            # Блокировки fcntl принадлежат процессу и после fork не
+            # разделяются с родителем, в отличие от flock.
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                offset, tokens, updated = self.find(key_hash, start)
+                tokens, wait = take(tokens, updated, capacity, refill, now)
+                SLOT.pack_into(self.memory, offset, key_hash, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        return wait
+
+    def find(self, key_hash, start):
+        """Слот ключа: (смещение, маркеры, время обновления)."""
+        victim = None
+        for probe in range(PROBES):
+            offset = (start + probe) % self.slots * SLOT.size
+            slot_hash, tokens, updated = SLOT.unpack_from(self.memory, offset)
+            if slot_hash == key_hash:
+                return offset, tokens, updated
+            if victim is None or updated < victim[1]:
+                victim = offset, updated
+        return victim[0], float('inf'), 0.0
+
+    def clear(self):
+        with self.lock:
+            if self.memory is None:
+                self.open()
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                self.memory[:] = bytes(len(self.memory))
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+
+class CacheBuckets:
+    """Корзины в кэше Django для воркеров на нескольких серверах."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def consume(self, key, capacity, refill, now):
+        cache = caches[self.alias]
+        tokens, updated = cache.get(key, (float('inf'), 0.0))
+        tokens, wait = take(tokens, updated, capacity, refill, now)
+        # Через capacity / refill секунд корзина снова полна.
+        cache.set(key, (tokens, now), int(capacity / refill) + 1)
+        return wait
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+table = BucketTable(
+    settings.THROTTLE_TABLE_PATH, settings.THROTTLE_TABLE_SLOTS
+)
+
+
+def buckets():
+    if settings.THROTTLE_CACHE_ALIAS:
+        return CacheBuckets(settings.THROTTLE_CACHE_ALIAS)
+    return table
+
+
+class BucketRateThrottle(BaseThrottle):
+    """Лимит области throttle_scope представления, см. модуль."""
+    scope_suffix = ''
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        scope += self.scope_suffix
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self.delay = buckets().consume(
+            f'throttle:{scope}:{self.get_ident_key(request)}',
+            capacity, capacity / period, time.time(),
+        )
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(BucketRateThrottle):
+    """Лимит '<область>' на пользователя, для анонима - на IP-адрес."""
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPBucketThrottle(BucketRateThrottle):
+    """Лимит '<область>.ip' на IP-адрес, общий для всех его пользователей."""
+    scope_suffix = '.ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (FoodgramUserViewSet, IngredientViewSet, RecipeViewSet,
-                       TagViewSet)
+from api import async_views
+from api.views import (FoodgramUserViewSet, IngredientViewSet, MetricsView,
+                       ProfileView, RecipeViewSet, SyncView, TagViewSet)
 
 app_name = 'api'
 
@@ -12,7 +14,32 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_READ_PATH:
+    sync_views = {url.name: url.callback for url in router.urls}
+    urlpatterns += [
+        path(route, async_views.async_read_view(handler, sync_views[name]))
+        for route, handler, name in (
+            ('recipes/', async_views.recipe_list, 'recipes-list'),
+            ('recipes/<int:pk>/', async_views.recipe_detail,
+             'recipes-detail'),
+            ('tags/', async_views.tag_list, 'tags-list'),
+            ('tags/<int:pk>/', async_views.tag_detail, 'tags-detail'),
+            ('ingredients/', async_views.ingredient_list,
+             'ingredients-list'),
+            ('ingredients/<int:pk>/', async_views.ingredient_detail,
+             'ingredients-detail'),
+            ('users/subscriptions/', async_views.subscriptions,
+             'users-subscriptions'),
+        )
+    ]
+
+urlpatterns += [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('profiles/<str:profile_id>/', ProfileView.as_view(),
+         name='profile'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
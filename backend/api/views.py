@@ -1,21 +1,33 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Sum
-from django.http import HttpResponse
+from django.core import signing
+from django.db.models import F, Q, Sum
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
 from djoser.views import UserViewSet
-from rest_framework import status
+from rest_framework import generics, status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api import profiling, snapshots
+from api.filters import RECIPE_ORDERINGS, filter_recipes, parse_id_list
+from api.metrics import registry, render_prometheus
 from api.paginators import PageLimitNumberPagination
-from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeSerializer,
-                             ShortRecipeSerializer,
+from api.permissions import IsAdminOrMetricsToken, IsAuthorOrAdminOrReadOnly
+from api.read_serializers import RecipeReadSerializer
+from api.serializers import (CookableRecipeSerializer, IngredientSerializer,
+                             RecipeSerializer, ShortRecipeSerializer,
+                             SimilarRecipeSerializer,
                              SubscriptionCreateSerializer,
                              SubscriptionSerializer, TagSerializer)
+from api.streaming import StreamingListMixin
+from jobs import deletion
+from recipes import cookable, search, sync
 from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Subscription
@@ -23,15 +35,29 @@ from users.models import Subscription
 User = get_user_model()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(StreamingListMixin, ReadOnlyModelViewSet):
     """Представление для тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Опубликованный снимок каталога, см. api/snapshots.py, или поток
+        из базы, см. api/streaming.py.
+        """
+        if request.accepted_renderer.format == 'json':
+            snapshot = snapshots.response(request, 'tags')
+            if snapshot is not None:
+                return snapshot
+        streamed = self.stream_list(self.filter_queryset(self.get_queryset()))
+        if streamed is not None:
+            return streamed
+        return super().list(request, *args, **kwargs)
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+
+class IngredientViewSet(StreamingListMixin, ReadOnlyModelViewSet):
     """Представление для ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -50,8 +76,20 @@ class IngredientViewSet(ReadOnlyModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """Без поиска - опубликованный снимок каталога, иначе поток."""
+        if (request.accepted_renderer.format == 'json'
+                and not request.query_params):
+            snapshot = snapshots.response(request, 'ingredients')
+            if snapshot is not None:
+                return snapshot
+        streamed = self.stream_list(self.filter_queryset(self.get_queryset()))
+        if streamed is not None:
+            return streamed
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(StreamingListMixin, ModelViewSet):
     """Представление для рецептов."""
     queryset = (
         Recipe.objects.all().prefetch_related('tags').select_related('author')
@@ -59,44 +97,98 @@ class RecipeViewSet(ModelViewSet):
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     pagination_class = PageLimitNumberPagination
+    # Задаётся в @action, см. api/throttling.py.
+    throttle_scope = None
 
     def get_queryset(self):
         """Фильтрация по избранному, автору, списку покупок и тегам."""
-        queryset = super().get_queryset()
-
-        author = self.request.query_params.get('author')
-        if author:
-            queryset = queryset.filter(author=author)
+        return filter_recipes(
+            super().get_queryset(), self.request.query_params,
+            self.request.user, self.search_ranking,
+        )
 
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+    @cached_property
+    def search_ranking(self):
+        """Рецепты ?search= по релевантности без PostgreSQL, см. search."""
+        return search.ranking(self.request.query_params.get('search', ''))
 
-        if self.request.user.is_anonymous:
-            return queryset
+    def get_read_queryset(self):
+        """Строки рецептов для RecipeReadSerializer."""
+        return self.get_queryset().prefetch_related(None).values(
+            *RecipeReadSerializer.fields
+        )
 
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart'
+    def list(self, request, *args, **kwargs):
+        """Список рецептов без сериализаторов DRF, см. read_serializers."""
+        if 'ids' in request.query_params:
+            return self.list_ids(request)
+        rows = self.get_read_queryset()
+        ordering = request.query_params.get('ordering')
+        if self.search_ranking and ordering not in RECIPE_ORDERINGS:
+            rows = search.Ranked(rows, self.search_ranking)
+        streamed = self.stream_list(rows)
+        if streamed is not None:
+            return streamed
+        page = self.paginate_queryset(rows)
+        serializer = RecipeReadSerializer(
+            rows if page is None else page, many=True,
+            context=self.get_serializer_context(),
         )
-        if is_in_shopping_cart == '1':
-            queryset = queryset.filter(
-                in_shopping_cart__user=self.request.user
-            )
-        elif is_in_shopping_cart == '0':
-            queryset = queryset.exclude(
-                in_shopping_cart__user=self.request.user
-            )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
-        is_favorite = self.request.query_params.get('is_favorited')
-        if is_favorite == '1':
-            queryset = queryset.filter(in_favorites__user=self.request.user)
-        elif is_favorite == '0':
-            queryset = queryset.exclude(in_favorites__user=self.request.user)
+    def serialize_batch(self, batch):
+        return RecipeReadSerializer(
+            batch, many=True, context=self.get_serializer_context()
+        ).data
 
-        return queryset
+    def list_ids(self, request):
+        """
+        Рецепты ?ids=1,2,3 одним набором запросов, в порядке запроса и без
+        пагинации. Идентификаторы, которых нет или которые не прошли
+        остальные фильтры, перечисляются в missing.
+        """
+        ids = parse_id_list(request.query_params, 'ids')
+        if not ids:
+            raise ValidationError({'ids': 'Укажите идентификаторы рецептов.'})
+        if len(ids) > settings.RECIPE_IDS_MAX:
+            raise ValidationError(
+                {'ids': f'Не больше {settings.RECIPE_IDS_MAX} рецептов.'}
+            )
+        rows = {
+            row['id']: row
+            for row in self.get_read_queryset().filter(pk__in=ids)
+        }
+        serializer = RecipeReadSerializer(
+            [rows[pk] for pk in ids if pk in rows], many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response({
+            'count': len(rows),
+            'next': None,
+            'previous': None,
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in rows],
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = generics.get_object_or_404(
+            self.get_read_queryset(),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, row)
+        return Response(RecipeReadSerializer(
+            row, context=self.get_serializer_context()
+        ).data)
+
+    def perform_destroy(self, instance):
+        deletion.schedule(instance)
 
     @action(detail=True, methods=['post', 'delete'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            throttle_scope='favorite')
     def favorite(self, request, **kwargs):
         """Добавление, удаление рецепта для раздела избранного"""
 
@@ -109,7 +201,8 @@ class RecipeViewSet(ModelViewSet):
         )
 
     @action(detail=True, methods=['post', 'delete'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            throttle_scope='shopping_cart')
     def shopping_cart(self, request, **kwargs):
         """Добавление, удаление рецепта для раздела списка покупок"""
 
@@ -122,7 +215,8 @@ class RecipeViewSet(ModelViewSet):
         )
 
     @action(detail=False, methods=['get'],
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            throttle_scope='download_shopping_cart')
     def download_shopping_cart(self, request):
         """Скачивание файл со списком покупок."""
 
@@ -162,6 +256,70 @@ class RecipeViewSet(ModelViewSet):
         )
         return response
 
+    @action(detail=False, methods=['get'])
+    def cookable(self, request):
+        """
+        Рецепты по доле ингредиентов, которые есть у пользователя:
+        ?ingredients=1,2,3&min_coverage=0.5.
+        """
+        ingredient_ids = parse_id_list(request.query_params, 'ingredients')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите имеющиеся ингредиенты.'}
+            )
+        if len(ingredient_ids) > settings.COOKABLE_MAX_INGREDIENTS:
+            raise ValidationError({'ingredients': (
+                'Не больше '
+                f'{settings.COOKABLE_MAX_INGREDIENTS} ингредиентов.'
+            )})
+        try:
+            min_coverage = float(
+                request.query_params.get('min_coverage', 0)
+            )
+        except ValueError:
+            min_coverage = -1
+        if not 0 <= min_coverage <= 1:
+            raise ValidationError(
+                {'min_coverage': 'Укажите число от 0 до 1.'}
+            )
+
+        page = self.paginate_queryset(
+            cookable.index.rank(ingredient_ids, min_coverage)
+        )
+        coverage = dict(page)
+        # Без фильтров списка: они вырезали бы рецепты из готовой страницы.
+        recipes = super().get_queryset().prefetch_related(
+            'recipeingredient_set__ingredient'
+        ).in_bulk(coverage)
+        serializer = CookableRecipeSerializer(
+            [recipes[pk] for pk in coverage if pk in recipes],
+            many=True,
+            context={**self.get_serializer_context(), 'coverage': coverage},
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты из таблицы SimilarRecipe, см. recipes/similar.py:
+        один запрос по индексу (recipe, -score).
+        """
+        if not str(pk).isdecimal():
+            raise Http404
+        recipes = list(
+            Recipe.objects.filter(
+                similar_to__recipe_id=pk, similar_to__recipe__deleting=False
+            )
+            .annotate(score=F('similar_to__score'))
+            .order_by('-score')
+            .only(*ShortRecipeSerializer.Meta.fields)
+        )
+        if not recipes:
+            get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        return Response(SimilarRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data)
+
     @staticmethod
     def _create_object(list_name, model, recipe_id, user):
         """
@@ -204,20 +362,32 @@ class RecipeViewSet(ModelViewSet):
         )
 
 
-class FoodgramUserViewSet(UserViewSet):
+class FoodgramUserViewSet(StreamingListMixin, UserViewSet):
     """Представление для пользователей Foodgram."""
 
     pagination_class = PageLimitNumberPagination
+    throttle_scope = None
 
     def get_permissions(self):
         if self.action == 'me':
             return [IsAuthenticated()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        """Выгрузка от STREAM_MIN_PAGE_SIZE пользователей - потоком."""
+        streamed = self.stream_list(self.filter_queryset(self.get_queryset()))
+        if streamed is not None:
+            return streamed
+        return super().list(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        deletion.schedule(instance)
+
     @action(
         detail=True,
         permission_classes=(IsAuthenticated,),
         methods=('POST', 'DELETE'),
+        throttle_scope='subscribe',
     )
     def subscribe(self, request, **kwargs):
         """Добавление, удаление подписки пользователя."""
@@ -265,3 +435,96 @@ class FoodgramUserViewSet(UserViewSet):
             context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Метрики запросов всех воркеров в текстовом формате Prometheus."""
+    permission_classes = (IsAdminOrMetricsToken,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(registry.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+class ProfileView(APIView):
+    """
+    Сводка профиля запроса из заголовка X-Profile-Url, см.
+    api/profiling.py. С ?raw=1 - сам профиль: .prof для pstats или
+    .folded для flamegraph.pl.
+    """
+    permission_classes = (IsAdminOrMetricsToken,)
+
+    def get(self, request, profile_id):
+        if request.query_params.get('raw'):
+            for suffix in ('.prof', '.folded'):
+                path = profiling.stored(profile_id, suffix)
+                if path is not None:
+                    return FileResponse(
+                        open(path, 'rb'), as_attachment=True,
+                        filename=path.name,
+                    )
+            raise Http404
+        path = profiling.stored(profile_id, '.txt')
+        if path is None:
+            raise Http404
+        return HttpResponse(
+            path.read_bytes(), content_type='text/plain; charset=utf-8'
+        )
+
+
+class SyncView(APIView):
+    """
+    Изменения каталога после курсора ?cursor=, см. recipes/sync.py. Без
+    курсора - весь каталог. Клиент повторяет запрос с курсором из ответа,
+    пока has_more истинно, и сохраняет последний курсор.
+    """
+    permission_classes = (AllowAny,)
+    cursor_salt = 'api.sync'
+
+    def get(self, request):
+        cursor = request.query_params.get('cursor')
+        try:
+            after = (
+                signing.loads(cursor, salt=self.cursor_salt) if cursor else 0
+            )
+        except signing.BadSignature:
+            raise ValidationError({'cursor': 'Некорректный курсор.'})
+        objects, last, has_more = sync.changes(after, settings.SYNC_PAGE_SIZE)
+
+        changed = {
+            name: [pk for pk, deleted in changes.items() if not deleted]
+            for name, changes in objects.items()
+        }
+        recipes = {
+            row['id']: row for row in Recipe.objects.filter(
+                pk__in=changed['recipe']
+            ).values(*RecipeReadSerializer.fields)
+        }
+        tags = Tag.objects.in_bulk(changed['tag'])
+        ingredients = Ingredient.objects.in_bulk(changed['ingredient'])
+        context = {'request': request}
+        return Response({
+            'cursor': signing.dumps(last, salt=self.cursor_salt),
+            'has_more': has_more,
+            # Объект, удалённый после этой страницы, придёт надгробием.
+            # Журнал не знает об избранном и подписках: их клиент получает
+            # фильтрами списка рецептов.
+            'recipes': RecipeReadSerializer(
+                [recipes[pk] for pk in changed['recipe'] if pk in recipes],
+                many=True, context=context, personal=False,
+            ).data,
+            'tags': TagSerializer(
+                [tags[pk] for pk in changed['tag'] if pk in tags], many=True
+            ).data,
+            'ingredients': IngredientSerializer(
+                [ingredients[pk] for pk in changed['ingredient']
+                 if pk in ingredients],
+                many=True,
+            ).data,
+            'deleted': {
+                f'{name}s': [pk for pk, deleted in changes.items() if deleted]
+                for name, changes in objects.items()
+            },
+        })
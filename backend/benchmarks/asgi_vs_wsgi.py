@@ -0,0 +1,193 @@
+"""
+Сравнение пропускной способности и хвостовых задержек WSGI и ASGI.
+
+Скрипт по очереди запускает gunicorn с синхронными воркерами
+(foodgram.wsgi, как в Dockerfile) и gunicorn с воркерами uvicorn
+(foodgram.asgi с асинхронными эндпоинтами чтения) на одной и той же базе
+и нагружает их множеством медленных клиентов: запрос отправляется
+частями, а ответ читается небольшими порциями с паузами. Так ведут себя
+мобильные клиенты, когда перед приложением нет буферизующего nginx.
+
+Запуск из каталога backend:
+    python benchmarks/asgi_vs_wsgi.py --concurrency 200 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?tags=seed42-tag-1',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/ingredients/?name=са',
+)
+# Добавляется к путям по умолчанию, если передан токен.
+AUTH_PATHS = ('/api/users/subscriptions/?recipes_limit=3',)
+
+SERVERS = {
+    'wsgi': ['foodgram.wsgi'],
+    'asgi': ['--worker-class', 'uvicorn.workers.UvicornWorker',
+             'foodgram.asgi:application'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, workers):
+    env = {**os.environ, 'ASYNC_READ_PATH': str(kind == 'asgi')}
+    env.setdefault('ALLOWED_HOSTS', '127.0.0.1, localhost')
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--log-level', 'warning',
+        *SERVERS[kind],
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер на порту {port} не запустился.')
+
+
+async def slow_request(port, path, token, chunk_size, delay):
+    """Один запрос медленного клиента, возвращает статус ответа."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        headers = [
+            f'GET {quote(path, safe="/?=&")} HTTP/1.1',
+            'Host: 127.0.0.1',
+            'Accept: application/json',
+            'Connection: close',
+        ]
+        if token:
+            headers.append(f'Authorization: Token {token}')
+        payload = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+        for start in range(0, len(payload), chunk_size):
+            writer.write(payload[start:start + chunk_size])
+            await writer.drain()
+            await asyncio.sleep(delay)
+
+        status_line = await reader.readline()
+        while await reader.read(chunk_size):
+            await asyncio.sleep(delay)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(port, paths, token, options, deadline, latencies, errors):
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(
+                slow_request(port, path, token,
+                             options.chunk_size, options.delay),
+                options.timeout,
+            )
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+
+
+async def load(port, options):
+    latencies, errors = [], []
+    deadline = time.monotonic() + options.duration
+    await asyncio.gather(*(
+        client(port, options.paths, options.token, options, deadline,
+               latencies, errors)
+        for _ in range(options.concurrency)
+    ))
+    return latencies, errors
+
+
+def percentile(values, share):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run(kind, options):
+    port = free_port()
+    server = start_server(kind, port, options.workers)
+    try:
+        wait_for_port(port)
+        asyncio.run(load(port, options.__class__(**{
+            **vars(options), 'duration': options.warmup,
+            'concurrency': min(options.concurrency, 10),
+        })))
+        latencies, errors = asyncio.run(load(port, options))
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        'rps': len(latencies) / options.duration,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS),
+                        choices=list(SERVERS))
+    parser.add_argument('--paths', nargs='+')
+    parser.add_argument('--token', default=os.getenv('BENCHMARK_TOKEN'),
+                        help='Токен пользователя для авторизованных '
+                             'запросов (по умолчанию анонимно).')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--chunk-size', type=int, default=1024,
+                        help='Размер порции отправки и чтения, байт.')
+    parser.add_argument('--delay', type=float, default=0.01,
+                        help='Пауза медленного клиента между порциями, с.')
+    options = parser.parse_args()
+    if not options.paths:
+        options.paths = list(DEFAULT_PATHS)
+        if options.token:
+            options.paths += AUTH_PATHS
+
+    print(f'{"сервер":<8}{"RPS":>10}{"p50, мс":>10}{"p95, мс":>10}'
+          f'{"p99, мс":>10}{"ошибки":>10}')
+    for kind in options.servers:
+        result = run(kind, options)
+        print(f'{kind:<8}{result["rps"]:>10.1f}'
+              f'{result["p50"] * 1000:>10.1f}{result["p95"] * 1000:>10.1f}'
+              f'{result["p99"] * 1000:>10.1f}{result["errors"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
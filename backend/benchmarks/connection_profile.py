@@ -0,0 +1,141 @@
+"""
+Запросов в секунду с профилем постоянных соединений и без него.
+
+Скрипт по очереди запускает gunicorn с настройками foodgram.settings (новое
+соединение с базой на каждый запрос), foodgram.settings_production
+(постоянные соединения) и foodgram.settings_production с DB_POOL=True
+(пул внутри процесса, воркеры с потоками) и нагружает небольшими
+запросами, в которых доля установки соединения наиболее заметна. Для
+PostgreSQL после нагрузки выводится число соединений приложения с базой.
+
+Имеет смысл только для PostgreSQL, запуск из каталога backend:
+    python benchmarks/connection_profile.py --concurrency 32 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from asgi_vs_wsgi import (BACKEND_DIR, free_port, percentile, slow_request,
+                          wait_for_port)
+
+PROFILES = {
+    'default': ('foodgram.settings', {}, []),
+    'persistent': ('foodgram.settings_production', {}, []),
+    'pool': (
+        'foodgram.settings_production',
+        {'DB_POOL': 'True'},
+        ['--worker-class', 'gthread', '--threads', '8'],
+    ),
+}
+
+DEFAULT_PATHS = ('/api/tags/', '/api/tags/1/', '/api/ingredients/5/')
+
+
+def start_server(profile, port, workers):
+    settings_module, env, arguments = PROFILES[profile]
+    env = {**os.environ, **env, 'DJANGO_SETTINGS_MODULE': settings_module}
+    env.setdefault('ALLOWED_HOSTS', '127.0.0.1, localhost')
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--log-level', 'warning',
+        *arguments,
+        'foodgram.wsgi',
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+
+def database_connections():
+    """Число соединений с базой, кроме текущего, или None для SQLite."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import django
+    django.setup()
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT count(*) FROM pg_stat_activity '
+            'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+        )
+        return cursor.fetchone()[0]
+
+
+async def client(port, paths, deadline, latencies, errors):
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            status = await slow_request(port, path, None, 65536, 0)
+        except (OSError, IndexError, ValueError):
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+
+
+async def load(port, paths, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        client(port, paths, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors
+
+
+def run(profile, options):
+    port = free_port()
+    server = start_server(profile, port, options.workers)
+    try:
+        wait_for_port(port)
+        asyncio.run(load(port, options.paths, options.concurrency,
+                         options.warmup))
+        latencies, errors = asyncio.run(load(
+            port, options.paths, options.concurrency, options.duration
+        ))
+        connections = database_connections()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        'rps': len(latencies) / options.duration,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p99': percentile(latencies, 0.99),
+        'errors': len(errors),
+        'connections': '-' if connections is None else connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES),
+                        choices=list(PROFILES))
+    parser.add_argument('--paths', nargs='+', default=list(DEFAULT_PATHS))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    options = parser.parse_args()
+
+    print(f'{"профиль":<12}{"RPS":>10}{"p50, мс":>10}{"p99, мс":>10}'
+          f'{"ошибки":>10}{"соединения":>12}')
+    for profile in options.profiles:
+        result = run(profile, options)
+        print(f'{profile:<12}{result["rps"]:>10.1f}'
+              f'{result["p50"] * 1000:>10.1f}{result["p99"] * 1000:>10.1f}'
+              f'{result["errors"]:>10}{result["connections"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
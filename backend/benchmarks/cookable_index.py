@@ -0,0 +1,94 @@
+"""
+Время ранжирования «что приготовить» на синтетическом индексе.
+
+Индекс заполняется без базы данных: рецепты получают от 3 до 12
+ингредиентов, популярность ингредиентов распределена по степенному закону,
+как в seed_foodgram. Для наборов ингредиентов разного размера выводятся
+задержки p50/p95/max ранжирования с первой страницей выдачи и размер
+индекса.
+
+Запуск из каталога backend:
+    python benchmarks/cookable_index.py --recipes 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from recipes.cookable import CookableIndex  # noqa: E402
+
+
+def synthetic_postings(rng, recipes, ingredients, exponent):
+    cum_weights = list(accumulate(
+        1 / rank ** exponent for rank in range(1, ingredients + 1)
+    ))
+    population = list(range(1, ingredients + 1))
+    postings = defaultdict(list)
+    for recipe_id in range(1, recipes + 1):
+        chosen = set(rng.choices(population, cum_weights=cum_weights,
+                                 k=rng.randint(3, 12)))
+        for ingredient_id in chosen:
+            postings[ingredient_id].append(recipe_id)
+    return postings, population, cum_weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--exponent', type=float, default=1.1)
+    parser.add_argument('--pantry-sizes', type=int, nargs='+',
+                        default=[5, 10, 20, 40])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+    rng = random.Random(options.seed)
+
+    started = time.perf_counter()
+    postings, population, cum_weights = synthetic_postings(
+        rng, options.recipes, options.ingredients, options.exponent
+    )
+    index = CookableIndex()
+    index.build(postings)
+    size_mb = (
+        sum(postings.nbytes for postings in index.postings.values())
+        + index.totals.nbytes
+    ) / 2 ** 20
+    print(f'Индекс: {options.recipes} рецептов, {size_mb:.1f} МБ, '
+          f'построен за {time.perf_counter() - started:.1f} с')
+
+    print(f'{"ингредиентов":<14}{"кандидатов":>12}{"p50, мс":>10}'
+          f'{"p95, мс":>10}{"max, мс":>10}')
+    for size in options.pantry_sizes:
+        timings, candidates = [], []
+        for _ in range(options.queries):
+            pantry = rng.choices(population, cum_weights=cum_weights,
+                                 k=size)
+            started = time.perf_counter()
+            ranked = index.score(pantry)
+            ranked[:settings.REST_FRAMEWORK['PAGE_SIZE']]
+            timings.append((time.perf_counter() - started) * 1000)
+            candidates.append(len(ranked))
+        timings.sort()
+        print(f'{size:<14}{int(statistics.median(candidates)):>12}'
+              f'{statistics.median(timings):>10.1f}'
+              f'{timings[int(0.95 * (len(timings) - 1))]:>10.1f}'
+              f'{timings[-1]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
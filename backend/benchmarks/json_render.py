@@ -0,0 +1,116 @@
+"""
+Рендеринг и разбор JSON: DRF против orjson (api/renderers.py, api/parsers.py).
+
+Данные - вывод RecipeSerializer для страниц списка рецептов разного
+размера из базы seed_foodgram, как в ответе API. Перед замером скрипт
+проверяет, что оба рендерера выдают одинаковые байты, а оба парсера -
+одинаковые данные, и завершается с ошибкой при расхождении.
+
+Запуск из каталога backend:
+    python benchmarks/json_render.py --sizes 6 50 500 --repeat 200
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+from asgi_vs_wsgi import BACKEND_DIR
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import django
+    django.setup()
+
+
+def recipe_pages(sizes):
+    """Ответы списка рецептов: {size: data} для анонимного пользователя."""
+    from django.conf import settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api.serializers import RecipeSerializer
+    from api.views import RecipeViewSet
+
+    request = Request(APIRequestFactory().get(
+        '/api/recipes/', HTTP_HOST=settings.ALLOWED_HOSTS[0]
+    ))
+    queryset = RecipeViewSet.queryset.prefetch_related(
+        'recipeingredient_set__ingredient'
+    )
+    pages = {}
+    for size in sizes:
+        results = RecipeSerializer(
+            queryset[:size], many=True, context={'request': request}
+        ).data
+        pages[size] = {
+            'count': size, 'next': None, 'previous': None,
+            'results': results,
+        }
+    return pages
+
+
+def measure(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[6, 50, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    options = parser.parse_args()
+
+    setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from api.parsers import FastJSONParser
+    from api.renderers import FastJSONRenderer, orjson
+
+    if orjson is None:
+        sys.exit('orjson не установлен: быстрые классы равны стандартным.')
+    renderers = {'drf': JSONRenderer(), 'orjson': FastJSONRenderer()}
+    parsers = {'drf': JSONParser(), 'orjson': FastJSONParser()}
+
+    print(f'{"рецептов":<10}{"КБ":>8}'
+          f'{"render drf":>13}{"orjson":>9}{"x":>6}'
+          f'{"parse drf":>12}{"orjson":>9}{"x":>6}   (мкс)')
+    for size, data in recipe_pages(options.sizes).items():
+        body = renderers['drf'].render(data)
+        if renderers['orjson'].render(data) != body:
+            sys.exit(f'{size}: вывод рендереров различается.')
+        parsed = {
+            name: parser.parse(io.BytesIO(body))
+            for name, parser in parsers.items()
+        }
+        if parsed['drf'] != parsed['orjson']:
+            sys.exit(f'{size}: результат парсеров различается.')
+
+        render = {
+            name: measure(renderer.render, data, options.repeat)
+            for name, renderer in renderers.items()
+        }
+        parse = {
+            name: measure(
+                lambda raw, parser=parser: parser.parse(io.BytesIO(raw)),
+                body, options.repeat,
+            )
+            for name, parser in parsers.items()
+        }
+        print(f'{size:<10}{len(body) / 1024:>8.1f}'
+              f'{render["drf"] * 1e6:>13.0f}{render["orjson"] * 1e6:>9.0f}'
+              f'{render["drf"] / render["orjson"]:>6.1f}'
+              f'{parse["drf"] * 1e6:>12.0f}{parse["orjson"] * 1e6:>9.0f}'
+              f'{parse["drf"] / parse["orjson"]:>6.1f}')
+
+
+if __name__ == '__main__':
+    main()
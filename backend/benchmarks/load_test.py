@@ -0,0 +1,397 @@
+"""
+Нагрузочный тест по сценариям пользователей из коллекции Postman.
+
+Запросы берутся из postman-collection/diploma.postman_collection.json:
+метод, URL, тело, авторизация и статус-код, которого ждут тесты коллекции.
+Виртуальные пользователи - потоки со своим соединением keep-alive и
+токеном пользователя из базы - в цикле выполняют сценарии, выбранные по
+весам: просмотр, фильтры, избранное, список покупок, скачивание списка и
+подписки. Переменные коллекции (id рецептов, тегов, ингредиентов,
+пользователей) для каждого прохода сценария выбираются из базы случайно,
+кроме рецептов, которые уже в избранном или списке покупок пользователя,
+и авторов, на которых он подписан: сценарии с записью возвращают данные в
+исходное состояние.
+
+Отчёт по каждому запросу коллекции: запросов в секунду, перцентили
+задержки и доля ошибок - ответов со статусом, отличным от ожидаемого.
+
+Запуск из каталога backend на базе после seed_foodgram:
+    USE_SQLITE=True python benchmarks/load_test.py --concurrency 32
+
+Без --url скрипт сам запускает gunicorn на той же базе с лимитами
+частоты выше нагрузки. С --url нагружается уже запущенный сервер с той
+же базой, его ответы 429 считаются ошибками.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import quote, urlsplit
+
+from asgi_vs_wsgi import (BACKEND_DIR, free_port, percentile, start_server,
+                          wait_for_port)
+
+COLLECTION = (
+    BACKEND_DIR.parent / 'postman-collection'
+    / 'diploma.postman_collection.json'
+)
+EXPECTED_STATUS = re.compile(r'Статус-код ответа должен быть (\d{3})')
+VARIABLE = re.compile(r'{{(\w+)}}')
+
+# Сценарий: вес и шаги - имя запроса коллекции или (имя, {переменная
+# запроса: переменная прохода}).
+SCENARIOS = {
+    'browsing': (40, (
+        'get_tag_list // User',
+        'get_recipes_list // User',
+        'get_recipe_detail // User',
+        ('get_recipe_detail // User', {'firstRecipeId': 'secondRecipeId'}),
+        ('get_profile // User', {'userId': 'secondUserId'}),
+    )),
+    'filtering': (25, (
+        'get_recipes_list_with_two_tags_param // User',
+        ('get_recipes_list_with_author_param // User',
+         {'userId': 'secondUserId'}),
+        'get_ingredients_list_with_name_filter // User',
+        'get_recipes_list_with_limit_param // User',
+    )),
+    'favoriting': (10, (
+        'get_recipe_detail // User',
+        'add_to_favorite // User',
+        'get_recipes_list_with_is_favorited_param // User',
+        'remove_from_favorite // User',
+    )),
+    'cart_building': (10, (
+        'add_to_shopping_cart // User',
+        ('add_to_shopping_cart // User', {'firstRecipeId': 'secondRecipeId'}),
+        ('add_to_shopping_cart // User', {'firstRecipeId': 'thirdRecipeId'}),
+        'get_recipes_list_with_is_in_shopping_cart_param // User',
+        'remove_from_shopping_cart // User',
+        ('remove_from_shopping_cart // User',
+         {'firstRecipeId': 'secondRecipeId'}),
+        ('remove_from_shopping_cart // User',
+         {'firstRecipeId': 'thirdRecipeId'}),
+    )),
+    'downloading': (5, (
+        'add_to_shopping_cart // User',
+        'download_shopping_cart // User',
+        'remove_from_shopping_cart // User',
+    )),
+    'following': (10, (
+        ('get_profile // User', {'userId': 'thirdUserId'}),
+        'create_subscription // User',
+        'get_subscription_list_with_recipes_limit_param // User',
+        'delete_first_subscription // User',
+    )),
+}
+# Лимиты частоты запущенного скриптом сервера, см. api/throttling.py.
+THROTTLE_ENV = (
+    'THROTTLE_FAVORITE', 'THROTTLE_FAVORITE_IP', 'THROTTLE_SHOPPING_CART',
+    'THROTTLE_SHOPPING_CART_IP', 'THROTTLE_SUBSCRIBE', 'THROTTLE_SUBSCRIBE_IP',
+    'THROTTLE_DOWNLOAD_SHOPPING_CART', 'THROTTLE_DOWNLOAD_SHOPPING_CART_IP',
+)
+
+
+def load_requests():
+    """{имя: запрос} из коллекции, без папок с проверками ошибок."""
+    with open(COLLECTION, encoding='utf-8') as file:
+        collection = json.load(file)
+    requests = {}
+
+    def walk(items, folders):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'], folders + (item['name'],))
+                continue
+            if any('bad_request' in folder for folder in folders):
+                continue
+            request = item['request']
+            scripts = '\n'.join(
+                line for event in item.get('event', ())
+                for line in event['script']['exec']
+            )
+            expected = EXPECTED_STATUS.search(scripts)
+            requests.setdefault(item['name'], {
+                'endpoint': item['name'].split(' //')[0],
+                'method': request['method'],
+                'url': request['url']['raw'],
+                'body': (request.get('body') or {}).get('raw') or None,
+                'auth': request.get('auth', {}).get('type') == 'apikey',
+                'expected': int(expected[1]) if expected else 200,
+            })
+
+    walk(collection['item'], ())
+    return requests
+
+
+def load_fixtures(users):
+    """Пользователи с токенами и id объектов каталога из базы."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    import django
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.db import connections
+    from rest_framework.authtoken.models import Token
+
+    from recipes.models import Favorites, Ingredient, Recipe, ShoppingCart, Tag
+    from users.models import Subscription
+
+    accounts = [
+        (user.pk, Token.objects.get_or_create(user=user)[0].key)
+        for user in get_user_model().objects.filter(
+            is_active=True
+        ).order_by('pk')[:users]
+    ]
+    account_ids = [user_id for user_id, _ in accounts]
+    taken = defaultdict(set)
+    for model in (Favorites, ShoppingCart):
+        for user_id, recipe_id in model.objects.filter(
+            user_id__in=account_ids
+        ).values_list('user_id', 'recipe_id'):
+            taken[user_id].add(recipe_id)
+    followed = defaultdict(set)
+    for user_id, author_id in Subscription.objects.filter(
+        user_id__in=account_ids
+    ).values_list('user_id', 'author_id'):
+        followed[user_id].add(author_id)
+    fixtures = {
+        'accounts': accounts,
+        'taken': taken,
+        'followed': followed,
+        'user_ids': list(get_user_model().objects.values_list(
+            'pk', flat=True
+        )),
+        'recipe_ids': list(Recipe.objects.values_list('pk', flat=True)),
+        'tags': list(Tag.objects.values_list('pk', 'slug')),
+        'ingredients': list(Ingredient.objects.values_list('pk', 'name')),
+    }
+    connections.close_all()
+    if len(accounts) < users or len(fixtures['recipe_ids']) < 3:
+        raise SystemExit(
+            'Мало данных в базе, заполните её: python manage.py '
+            'seed_foodgram.'
+        )
+    return fixtures
+
+
+def sample(rng, population, count, excluded):
+    """count разных значений из population, кроме excluded."""
+    chosen = set()
+    while len(chosen) < count:
+        value = rng.choice(population)
+        if value not in excluded:
+            chosen.add(value)
+    return list(chosen)
+
+
+def pass_variables(fixtures, account, base_url, rng):
+    """Переменные коллекции для одного прохода сценария."""
+    user_id, token = account
+    recipes = sample(rng, fixtures['recipe_ids'], 3,
+                     fixtures['taken'][user_id])
+    tags = rng.sample(fixtures['tags'], min(3, len(fixtures['tags'])))
+    ingredient_id, ingredient_name = rng.choice(fixtures['ingredients'])
+    others = sample(rng, fixtures['user_ids'], 2,
+                    fixtures['followed'][user_id] | {user_id})
+    return {
+        'baseUrl': base_url,
+        'userToken': token,
+        'userId': user_id,
+        'secondUserId': others[0],
+        'thirdUserId': others[1],
+        'firstRecipeId': recipes[0],
+        'secondRecipeId': recipes[1],
+        'thirdRecipeId': recipes[2],
+        'firstTagId': tags[0][0],
+        'secondTagSlug': tags[1 % len(tags)][1],
+        'thirdTagSlug': tags[2 % len(tags)][1],
+        'firstIndredientId': ingredient_id,
+        'ingredientNameFirstLatter': ingredient_name[:1],
+    }
+
+
+def substitute(template, variables):
+    return VARIABLE.sub(lambda match: str(variables[match[1]]), template)
+
+
+class VirtualUser(threading.Thread):
+    """Поток, который выполняет сценарии до конца теста."""
+
+    def __init__(self, number, options, requests, fixtures, scenarios):
+        super().__init__(daemon=True)
+        self.options = options
+        self.requests = requests
+        self.fixtures = fixtures
+        self.scenarios = scenarios
+        self.account = fixtures['accounts'][number]
+        self.rng = random.Random(number)
+        self.url = urlsplit(options.url)
+        self.connection = None
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.passes = Counter()
+
+    def send(self, method, path, body, headers):
+        """Запрос по keep-alive соединению, статус или None при сбое."""
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.url.hostname, self.url.port,
+                    timeout=self.options.timeout,
+                )
+            try:
+                self.connection.request(method, path, body, headers)
+                response = self.connection.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                self.connection = None
+        return None
+
+    def step(self, name, mapping, variables, record):
+        request = self.requests[name]
+        variables = {
+            **variables,
+            **{key: variables[value] for key, value in mapping.items()},
+        }
+        url = urlsplit(substitute(request['url'], variables))
+        path = quote(url.path) + (f'?{quote(url.query, safe="=&")}'
+                                  if url.query else '')
+        headers = {'Accept': 'application/json'}
+        body = request['body'] and substitute(request['body'], variables)
+        if body:
+            headers['Content-Type'] = 'application/json'
+        if request['auth']:
+            headers['Authorization'] = f'Token {variables["userToken"]}'
+        started = time.perf_counter()
+        status = self.send(request['method'], path, body and body.encode(),
+                           headers)
+        elapsed = time.perf_counter() - started
+        if record:
+            endpoint = request['endpoint']
+            self.latencies[endpoint].append(elapsed)
+            if status != request['expected']:
+                self.errors[endpoint][status] += 1
+
+    def run(self):
+        names = list(self.scenarios)
+        weights = [self.scenarios[name][0] for name in names]
+        while time.monotonic() < self.options.deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            variables = pass_variables(
+                self.fixtures, self.account, self.options.url, self.rng
+            )
+            record = time.monotonic() >= self.options.measure_from
+            for step in self.scenarios[scenario][1]:
+                name, mapping = step if isinstance(step, tuple) else (step, {})
+                self.step(name, mapping, variables, record)
+                if self.options.think:
+                    time.sleep(self.rng.uniform(0, 2 * self.options.think))
+            if record:
+                self.passes[scenario] += 1
+
+
+def report(users, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)
+    passes = Counter()
+    for user in users:
+        for endpoint, values in user.latencies.items():
+            latencies[endpoint].extend(values)
+        for endpoint, statuses in user.errors.items():
+            errors[endpoint].update(statuses)
+        passes.update(user.passes)
+
+    print(f'{"запрос":<52}{"число":>8}{"в сек":>8}{"p50, мс":>9}'
+          f'{"p95, мс":>9}{"p99, мс":>9}{"ошибки":>9}  статусы ошибок')
+    rows = sorted(latencies.items(), key=lambda item: -len(item[1]))
+    rows.append(('всего', [value for _, values in rows for value in values]))
+    errors['всего'] = sum(errors.values(), Counter())
+    for endpoint, values in rows:
+        failed = sum(errors[endpoint].values())
+        statuses = ', '.join(
+            f'{status or "сбой"}: {count}'
+            for status, count in errors[endpoint].most_common()
+        )
+        print(f'{endpoint:<52}{len(values):>8}{len(values) / duration:>8.1f}'
+              f'{statistics.median(values) * 1000:>9.1f}'
+              f'{percentile(values, 0.95) * 1000:>9.1f}'
+              f'{percentile(values, 0.99) * 1000:>9.1f}'
+              f'{failed / len(values):>9.1%}  {statuses}')
+    print('Сценариев выполнено: ' + ', '.join(
+        f'{name} {count}' for name, count in passes.most_common()
+    ))
+
+
+def parse_weights(values):
+    scenarios = dict(SCENARIOS)
+    for value in values or ():
+        name, _, weight = value.partition('=')
+        if name not in scenarios or not weight.isdecimal():
+            raise SystemExit(f'Неверный вес сценария: {value}')
+        scenarios[name] = (int(weight), scenarios[name][1])
+    return {name: scenario for name, scenario in scenarios.items()
+            if scenario[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', help='Адрес запущенного сервера, '
+                                      'например http://127.0.0.1:8000.')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='Сервер, который запускает скрипт без --url.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Виртуальных пользователей.')
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--warmup', type=float, default=5.0,
+                        help='Секунд в начале теста, которые не считаются.')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='Средняя пауза пользователя между шагами, с.')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--weight', action='append', metavar='СЦЕНАРИЙ=ВЕС',
+                        help='Вес сценария, например --weight browsing=60; '
+                             f'сценарии: {", ".join(SCENARIOS)}.')
+    options = parser.parse_args()
+
+    scenarios = parse_weights(options.weight)
+    requests = load_requests()
+    fixtures = load_fixtures(options.concurrency)
+
+    server = None
+    if options.url is None:
+        port = free_port()
+        options.url = f'http://127.0.0.1:{port}'
+        os.environ.update(dict.fromkeys(THROTTLE_ENV, '1000000/s'))
+        server = start_server(options.server, port, options.workers)
+    try:
+        wait_for_port(urlsplit(options.url).port or 80)
+        started = time.monotonic()
+        options.measure_from = started + options.warmup
+        options.deadline = options.measure_from + options.duration
+        users = [
+            VirtualUser(number, options, requests, fixtures, scenarios)
+            for number in range(options.concurrency)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report(users, options.duration)
+
+
+if __name__ == '__main__':
+    main()
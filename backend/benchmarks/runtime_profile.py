@@ -0,0 +1,129 @@
+"""
+Старт воркера, память и накладные расходы middleware: полный профиль
+настроек против профиля только для API (foodgram.settings_api).
+
+Для каждого профиля скрипт запускает отдельный процесс, который, как
+воркер gunicorn, загружает foodgram.wsgi и обрабатывает первый запрос,
+затем замеряет запросы к лёгкому эндпоинту через WSGI-обработчик целиком
+и тот же запрос напрямую в представление. Разница медиан - время
+middleware на запрос.
+
+Запуск из каталога backend:
+    python benchmarks/runtime_profile.py --requests 2000
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from asgi_vs_wsgi import BACKEND_DIR
+
+PROFILES = {
+    'full': 'foodgram.settings_production',
+    'api': 'foodgram.settings_api',
+}
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() / 2 ** 20
+
+
+def worker(path, requests):
+    """Замеры внутри процесса воркера, результат - JSON в stdout."""
+    started = time.perf_counter()
+    sys.path.insert(0, str(BACKEND_DIR))
+    from foodgram.wsgi import application
+    loaded = time.perf_counter()
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIRequest
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    environ = RequestFactory().get(
+        path, HTTP_HOST=settings.ALLOWED_HOSTS[0]
+    ).environ
+
+    def start_response(status, headers):
+        if not status.startswith('200'):
+            raise RuntimeError(f'{path}: {status}')
+
+    def through_wsgi():
+        b''.join(application(dict(environ), start_response))
+
+    view = resolve(path).func
+
+    def view_only():
+        view(WSGIRequest(dict(environ))).render()
+
+    through_wsgi()
+    first_request = time.perf_counter()
+    timings = {}
+    for name, call in (('wsgi', through_wsgi), ('view', view_only)):
+        samples = []
+        for _ in range(requests):
+            call_started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - call_started)
+        timings[name] = statistics.median(samples)
+
+    json.dump({
+        'modules': len(sys.modules),
+        'load_ms': (loaded - started) * 1000,
+        'first_request_ms': (first_request - loaded) * 1000,
+        'rss_mb': rss_mb(),
+        'request_us': timings['wsgi'] * 1e6,
+        'middleware_us': (timings['wsgi'] - timings['view']) * 1e6,
+    }, sys.stdout)
+
+
+def measure(profile, path, requests):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': PROFILES[profile]}
+    output = subprocess.run(
+        [sys.executable, __file__, '--worker', '--path', path,
+         '--requests', str(requests)],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--path', default='/api/tags/')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Запусков процесса на профиль, берётся медиана.')
+    parser.add_argument('--worker', action='store_true',
+                        help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.worker:
+        worker(options.path, options.requests)
+        return
+
+    print(f'{"профиль":<10}{"модулей":>9}{"загрузка":>11}{"1-й запрос":>12}'
+          f'{"RSS":>9}{"запрос":>10}{"middleware":>12}')
+    for profile in PROFILES:
+        runs = [measure(profile, options.path, options.requests)
+                for _ in range(options.repeat)]
+        result = {
+            key: statistics.median(run[key] for run in runs)
+            for key in runs[0]
+        }
+        print(f'{profile:<10}{result["modules"]:>9.0f}'
+              f'{result["load_ms"]:>9.0f}мс'
+              f'{result["first_request_ms"]:>10.0f}мс'
+              f'{result["rss_mb"]:>7.1f}МБ'
+              f'{result["request_us"]:>8.0f}мкс'
+              f'{result["middleware_us"]:>10.0f}мкс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Стоимость проверки лимита частоты (api/throttling.py) и его соблюдение
+несколькими процессами.
+
+Скрипт замеряет время consume() для таблицы корзин в файле и для кэша
+Django, затем запускает несколько процессов, которые одновременно
+расходуют одну корзину, и проверяет, что разрешено ровно столько
+запросов, сколько в ней было маркеров.
+
+Запуск из каталога backend:
+    python benchmarks/throttle_check.py --checks 100000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from asgi_vs_wsgi import BACKEND_DIR
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import django
+    django.setup()
+
+
+def measure(store, checks):
+    """Среднее время проверки в микросекундах, ключи 1000 клиентов."""
+    keys = [f'throttle:benchmark:user:{number}' for number in range(1000)]
+    started = time.perf_counter()
+    for number in range(checks):
+        store.consume(keys[number % len(keys)], 60, 1.0, time.time())
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def drain(path, slots, attempts, results):
+    from api.throttling import BucketTable
+
+    table = BucketTable(path, slots)
+    allowed = sum(
+        not table.consume('throttle:benchmark:shared', 100, 1e-9, time.time())
+        for _ in range(attempts)
+    )
+    results.put(allowed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--checks', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=4)
+    options = parser.parse_args()
+
+    setup()
+    from api.throttling import BucketTable, CacheBuckets
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'throttle')
+        table = BucketTable(path, 65536)
+        print(f'таблица в файле: {measure(table, options.checks):.2f} мкс')
+        print(f'кэш locmem:      '
+              f'{measure(CacheBuckets("default"), options.checks):.2f} мкс')
+
+        table.clear()
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=drain, args=(path, 65536, 1000, results)
+            )
+            for _ in range(options.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        allowed = sum(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+    print(f'{options.workers} процессов по 1000 запросов, корзина на 100: '
+          f'разрешено {allowed}')
+    if allowed != 100:
+        sys.exit('Лимит не соблюдён.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Маршрутизация чтения на реплики базы данных.
+
+По умолчанию все запросы идут в основную базу default. Реплика
+используется только внутри блока read_from_replica(), который открывает
+ReplicaRoutingMiddleware для безопасных запросов к выбранным вьюсетам.
+Миграции применяются только к основной базе, реплики получают схему
+вместе с данными через репликацию.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_replica = ContextVar('db_replica', default=None)
+
+
+class ReplicaChoice:
+    """Реплика, выбранная для текущего запроса, или None."""
+
+    def __init__(self):
+        self.alias = None
+
+
+def current_replica():
+    choice = _replica.get()
+    return choice.alias if choice is not None else None
+
+
+@contextmanager
+def replica_routing():
+    """
+    Область запроса, в которой можно выбрать реплику.
+
+    Выбор хранится в изменяемом объекте, поэтому он виден и в потоках
+    sync_to_async, куда контекст копируется при вызове.
+    """
+    with resume_routing(ReplicaChoice()) as choice:
+        yield choice
+
+
+@contextmanager
+def resume_routing(choice):
+    """
+    Возвращает выбор реплики запроса внутри блока, например при отдаче
+    тела потокового ответа после выхода из replica_routing().
+    """
+    token = _replica.set(choice)
+    try:
+        yield choice
+    finally:
+        _replica.reset(token)
+
+
+def use_replica():
+    """Направляет дальнейшее чтение текущего запроса на случайную реплику."""
+    choice = _replica.get()
+    if choice is not None:
+        choice.alias = random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def read_from_replica():
+    """Направляет чтение внутри блока на случайную реплику."""
+    with replica_routing() as choice:
+        use_replica()
+        yield choice.alias
+
+
+class ReplicaRouter:
+    """
+    Чтение на реплику внутри read_from_replica(), всё остальное в default.
+
+    Токены всегда читаются из основной базы: токен, выданный при входе,
+    может ещё не дойти до реплики к следующему запросу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'authtoken':
+            return PRIMARY
+        return current_replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
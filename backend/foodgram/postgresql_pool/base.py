@@ -0,0 +1,140 @@
+"""
+Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Подключается как ENGINE 'foodgram.postgresql_pool' вместе с CONN_MAX_AGE=0:
+в конце запроса Django закрывает соединение, а бэкенд возвращает его в
+пул, откуда его берёт следующий запрос любого потока воркера. Число
+соединений процесса с базой ограничено POOL['MAX_SIZE']; если все заняты,
+запрос ждёт POOL['TIMEOUT'] секунд и завершается OperationalError.
+Соединение, пролежавшее в пуле дольше POOL['HEALTH_CHECK_IDLE'] секунд,
+перед выдачей проверяется запросом SELECT 1.
+"""
+import threading
+import time
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+DEFAULT_POOL = {
+    'MAX_SIZE': 4,
+    'TIMEOUT': 10,
+    'HEALTH_CHECK_IDLE': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except base.Database.Error:
+        pass
+
+
+def _is_alive(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if (connection.info.transaction_status
+                != extensions.TRANSACTION_STATUS_IDLE):
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений одного алиаса базы данных."""
+
+    def __init__(self, max_size, timeout, health_check_idle):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self, connect):
+        """Свободное соединение из пула или новое через connect()."""
+        if not self.slots.acquire(timeout=self.timeout):
+            raise base.Database.OperationalError(
+                f'Все {self.max_size} соединений пула заняты дольше '
+                f'{self.timeout} с.'
+            )
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection, returned_at = self.idle.pop()
+                idle_seconds = time.monotonic() - returned_at
+                if (idle_seconds < self.health_check_idle
+                        or _is_alive(connection)):
+                    return connection
+                _close_quietly(connection)
+            return connect()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection, discard=False):
+        """Возвращает соединение в пул или закрывает неисправное."""
+        try:
+            if not discard and not connection.closed:
+                status = connection.info.transaction_status
+                if status in (extensions.TRANSACTION_STATUS_INTRANS,
+                              extensions.TRANSACTION_STATUS_INERROR):
+                    connection.rollback()
+                    status = connection.info.transaction_status
+                discard = status != extensions.TRANSACTION_STATUS_IDLE
+            if discard or connection.closed:
+                _close_quietly(connection)
+            else:
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+        except base.Database.Error:
+            _close_quietly(connection)
+        finally:
+            self.slots.release()
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = {**DEFAULT_POOL, **settings_dict.get('POOL', {})}
+            pool = _pools[alias] = ConnectionPool(
+                options['MAX_SIZE'],
+                options['TIMEOUT'],
+                options['HEALTH_CHECK_IDLE'],
+            )
+        return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire(
+            partial(super().get_new_connection, conn_params)
+        )
+        # Для соединения из пула уровень изоляции задаётся так же, как в
+        # родительском get_new_connection.
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', base.IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(
+                    self.connection, discard=self.errors_occurred
+                )
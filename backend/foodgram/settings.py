@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -25,12 +26,16 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'import_export',
+    'jobs.apps.JobsConfig',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.QueryInspectorMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,6 +43,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -79,6 +85,26 @@ else:
         }
     }
 
+# Реплики только для чтения: файлы SQLite относительно BASE_DIR или хосты
+# PostgreSQL через запятую. Схему и данные они получают репликацией.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    replica_field, replicas = 'NAME', [
+        BASE_DIR / name
+        for name in os.getenv('SQLITE_REPLICAS', '').split(', ') if name
+    ]
+else:
+    replica_field, replicas = 'HOST', [
+        host for host in os.getenv('DB_REPLICA_HOSTS', '').split(', ') if host
+    ]
+for number, value in enumerate(replicas, start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        replica_field: value,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram.db_routers.ReplicaRouter']
+
 AUTH_USER_MODEL = 'users.FoodgramUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -112,21 +138,210 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Снимки каталога тегов и ингредиентов, которые отдаёт nginx, см.
+# api/snapshots.py. В docker-compose - каталог в общем томе static.
+CATALOGUE_SNAPSHOT_ROOT = os.getenv(
+    'CATALOGUE_SNAPSHOT_ROOT', BASE_DIR / 'catalogue'
+)
+# Изменения за это время публикуются одним снимком, секунд.
+CATALOGUE_SNAPSHOT_DELAY = int(os.getenv('CATALOGUE_SNAPSHOT_DELAY', 5))
+
+# Картинки с именами по хешу содержимого, см. recipes/storage.py.
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if os.getenv('SHARED_CACHE_LOCATION'):
+    CACHES['shared'] = {
+        'BACKEND': os.getenv(
+            'SHARED_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION'),
+    }
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    # orjson, если он установлен, с тем же JSON на выходе, см. api/renderers.py.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+
+    # Маркерные корзины, общие для воркеров, см. api/throttling.py.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserBucketThrottle',
+        'api.throttling.IPBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'favorite': os.getenv('THROTTLE_FAVORITE', '60/min'),
+        'favorite.ip': os.getenv('THROTTLE_FAVORITE_IP', '600/min'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '60/min'),
+        'shopping_cart.ip': os.getenv('THROTTLE_SHOPPING_CART_IP', '600/min'),
+        'subscribe': os.getenv('THROTTLE_SUBSCRIBE', '30/min'),
+        'subscribe.ip': os.getenv('THROTTLE_SUBSCRIBE_IP', '300/min'),
+        'download_shopping_cart': os.getenv(
+            'THROTTLE_DOWNLOAD_SHOPPING_CART', '10/min'
+        ),
+        'download_shopping_cart.ip': os.getenv(
+            'THROTTLE_DOWNLOAD_SHOPPING_CART_IP', '100/min'
+        ),
+    },
+    # Адрес клиента из X-Forwarded-For, добавленного nginx.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+THROTTLE_TABLE_PATH = os.getenv(
+    'THROTTLE_TABLE_PATH',
+    os.path.join(tempfile.gettempdir(), 'foodgram-throttle'),
+)
+THROTTLE_TABLE_SLOTS = int(os.getenv('THROTTLE_TABLE_SLOTS', 65536))
+# Кэш корзин для воркеров на нескольких серверах вместо файла.
+THROTTLE_CACHE_ALIAS = os.getenv('THROTTLE_CACHE_ALIAS')
+
+# Асинхронные представления чтения, включаются в foodgram/asgi.py.
+ASYNC_READ_PATH = os.getenv('ASYNC_READ_PATH', 'False').lower() == 'true'
+
+REPLICA_READ_VIEWS = [
+    'api.views.RecipeViewSet',
+    'api.views.TagViewSet',
+    'api.views.IngredientViewSet',
+    'api.views.FoodgramUserViewSet',
+]
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+# Отметка о записи хранится в cookie клиента и, если есть, в общем кэше:
+# кэш процесса не виден другим воркерам.
+REPLICA_STICKY_CACHE_ALIAS = 'shared' if 'shared' in CACHES else None
+
+# Поиск без PostgreSQL: лучшие совпадения индекса в памяти процесса.
+SEARCH_FALLBACK_LIMIT = int(os.getenv('SEARCH_FALLBACK_LIMIT', 1000))
+
+COOKABLE_MAX_INGREDIENTS = 100
+
+# Рецептов в одном запросе /api/recipes/?ids=1,2,3.
+RECIPE_IDS_MAX = int(os.getenv('RECIPE_IDS_MAX', 100))
+
+# Инкрементальная синхронизация каталога /api/sync/, см. recipes/sync.py:
+# изменений на странице и возраст изменения, после которого оно отдаётся.
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 500))
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', 2))
+
+# Потоковые JSON-списки, см. api/streaming.py: объектов в пачке и размер
+# страницы (?limit=), с которого список отдаётся потоком.
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+STREAM_MIN_PAGE_SIZE = int(os.getenv('STREAM_MIN_PAGE_SIZE', 500))
+
+# Похожие рецепты, см. recipes/similar.py.
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 10))
+SIMILAR_TAG_WEIGHT = float(os.getenv('SIMILAR_TAG_WEIGHT', 0.5))
+# Близостей в одном блоке пересчёта: 4 байта каждая.
+SIMILAR_CHUNK_CELLS = int(os.getenv('SIMILAR_CHUNK_CELLS', 2 ** 24))
+# Кандидатов в соседи изменённого рецепта при частичном пересчёте.
+SIMILAR_UPDATE_CANDIDATES = int(os.getenv('SIMILAR_UPDATE_CANDIDATES', 1000))
+# Изменения рецептов за столько секунд пересчитываются одной задачей.
+SIMILAR_UPDATE_DELAY = int(os.getenv('SIMILAR_UPDATE_DELAY', 5))
+# Как часто похожие рецепты пересчитываются целиком, секунд.
+SIMILAR_REBUILD_INTERVAL = int(os.getenv('SIMILAR_REBUILD_INTERVAL', 86400))
+
+# Период полураспада веса событий для сортировки ?ordering=trending.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+# Как часто оценки рецептов пересчитываются целиком, секунд.
+RECIPE_SCORES_INTERVAL = int(os.getenv('RECIPE_SCORES_INTERVAL', 3600))
+
+# Фоновые задачи, см. jobs/queue.py.
+JOBS_RUN_INLINE = os.getenv('JOBS_RUN_INLINE', 'False').lower() == 'true'
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', 600))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+# Задержка перед повтором удваивается с каждой попыткой.
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_RETRY_MAX_DELAY = int(os.getenv('JOBS_RETRY_MAX_DELAY', 3600))
+JOBS_KEEP_DAYS = int(os.getenv('JOBS_KEEP_DAYS', 7))
+# Задачи, которые run_workers ставит в очередь раз в интервал, секунд.
+JOBS_PERIODIC = {
+    'recipes.tasks.update_scores': RECIPE_SCORES_INTERVAL,
+    'recipes.tasks.rebuild_similar': SIMILAR_REBUILD_INTERVAL,
+}
+
+# Удаление пользователей и рецептов по частям, см. jobs/deletion.py.
+DELETE_IN_BACKGROUND = (
+    os.getenv('DELETE_IN_BACKGROUND', 'True').lower() == 'true'
+)
+DELETE_BATCH_SIZE = int(os.getenv('DELETE_BATCH_SIZE', 1000))
+
+# Картинки без ссылок моложе этого срока не удаляются.
+IMAGE_COLLECT_GRACE_HOURS = float(os.getenv('IMAGE_COLLECT_GRACE_HOURS', 24))
+
+TOKEN_CACHE_MAXSIZE = int(os.getenv('TOKEN_CACHE_MAXSIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_ALIAS = 'shared' if 'shared' in CACHES else None
+# Без общего кэша другие воркеры не узнают об отзыве токена: записи живут
+# не дольше этого срока, секунд.
+TOKEN_CACHE_LOCAL_TTL = float(os.getenv('TOKEN_CACHE_LOCAL_TTL', 2))
+
+REQUEST_METRICS_ENABLED = (
+    os.getenv('REQUEST_METRICS_ENABLED', 'True').lower() == 'true'
+)
+REQUEST_METRICS_DIR = os.getenv(
+    'REQUEST_METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics'),
+)
+REQUEST_METRICS_FLUSH_INTERVAL = float(
+    os.getenv('REQUEST_METRICS_FLUSH_INTERVAL', 1)
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+QUERY_INSPECTOR_ENABLED = (
+    os.getenv('QUERY_INSPECTOR_ENABLED', str(DEBUG)).lower() == 'true'
+)
+QUERY_INSPECTOR_STRICT = (
+    os.getenv('QUERY_INSPECTOR_STRICT', 'False').lower() == 'true'
+)
+QUERY_INSPECTOR_REPEAT_THRESHOLD = int(
+    os.getenv('QUERY_INSPECTOR_REPEAT_THRESHOLD', 5)
+)
+QUERY_INSPECTOR_SLOW_MS = float(os.getenv('QUERY_INSPECTOR_SLOW_MS', 100))
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-profiles')
+)
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 3600))
+PROFILING_SAMPLE_EVERY = int(os.getenv('PROFILING_SAMPLE_EVERY', 0))
+PROFILING_SAMPLE_INTERVAL = float(
+    os.getenv('PROFILING_SAMPLE_INTERVAL', 0.005)
+)
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 200))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'PERMISSIONS': {
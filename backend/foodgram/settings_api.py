@@ -0,0 +1,59 @@
+"""
+Профиль настроек для пула воркеров, обслуживающего только /api/.
+
+Включается переменной DJANGO_SETTINGS_MODULE=foodgram.settings_api поверх
+настроек продакшена. API аутентифицирует запросы только токеном, поэтому
+сессии, CSRF, сообщения и защита от встраивания во фреймы ему не нужны: в
+профиле нет этих приложений и middleware, нет админки, а с ней и
+django-import-export, который при старте загружает openpyxl, xlwt и
+другие форматы. Браузерный API отключён, ответы только в JSON.
+
+Профиль необязательный, и развёртывание его пока не использует: в
+docker-compose.production.yml один сервис backend с полным профилем
+foodgram.settings_production, и infra/nginx.conf направляет в него и
+/api/, и /admin/. Для отдельного пула нужны второй сервис с этим профилем
+и location /api/ в nginx, который ведёт в него. Админка, статика и
+команды вроде collectstatic остаются на полном профиле. Сравнение
+профилей: benchmarks/runtime_profile.py.
+"""
+from foodgram.settings_production import *  # noqa: F401, F403
+from foodgram.settings_production import (INSTALLED_APPS, MIDDLEWARE,
+                                          REST_FRAMEWORK, TEMPLATES)
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        'import_export',
+    )
+]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+ROOT_URLCONF = 'foodgram.urls_api'
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.request',
+        ],
+    },
+}]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'][:1],
+}
@@ -0,0 +1,40 @@
+"""
+Профиль настроек для продакшена: постоянные соединения с базой.
+
+Включается переменной DJANGO_SETTINGS_MODULE=foodgram.settings_production.
+По умолчанию соединение с PostgreSQL живёт DB_CONN_MAX_AGE секунд и
+переиспользуется следующими запросами потока, а перед первым запросом
+проверяется (CONN_HEALTH_CHECKS). Каждый поток воркера держит не больше
+одного соединения на базу, поэтому у синхронного воркера gunicorn их не
+больше числа баз в DATABASES.
+
+С DB_POOL=True вместо этого используется пул внутри процесса
+(foodgram/postgresql_pool): соединения после запроса возвращаются в пул и
+достаются любому потоку, а всего их у процесса не больше DB_POOL_MAX_SIZE
+на базу. Это нужно для воркеров с потоками и ASGI, где потоков больше,
+чем допустимо соединений.
+"""
+import os
+
+from foodgram.settings import *  # noqa: F401, F403
+from foodgram.settings import DATABASES
+
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 600))
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', 30))
+
+for database in DATABASES.values():
+    database['CONN_HEALTH_CHECKS'] = True
+    if DB_POOL and database['ENGINE'] == 'django.db.backends.postgresql':
+        database['ENGINE'] = 'foodgram.postgresql_pool'
+        # Соединение возвращается в пул в конце каждого запроса.
+        database['CONN_MAX_AGE'] = 0
+        database['POOL'] = {
+            'MAX_SIZE': DB_POOL_MAX_SIZE,
+            'TIMEOUT': DB_POOL_TIMEOUT,
+            'HEALTH_CHECK_IDLE': DB_POOL_HEALTH_CHECK_IDLE,
+        }
+    else:
+        database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
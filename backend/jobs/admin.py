@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib import admin
+
+from jobs import deletion
+from jobs.models import Job
+
+
+class BackgroundDeleteMixin:
+    """
+    Удаление из админки через jobs.deletion.schedule(): объект скрывается
+    сразу, а зависимые строки удаляет фоновая задача.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        # Страница подтверждения не собирает все каскадные строки.
+        if not settings.DELETE_IN_BACKGROUND:
+            return super().get_deleted_objects(objs, request)
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        deletion.schedule(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            deletion.schedule(obj)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админка для фоновых задач."""
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_at', 'created', 'finished'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'idempotency_key')
+    readonly_fields = (
+        'name', 'payload', 'idempotency_key', 'attempts', 'locked_until',
+        'result', 'error', 'created', 'finished',
+    )
@@ -0,0 +1,76 @@
+"""
+Удаление объектов с большим числом зависимых строк по частям.
+
+Model.delete() собирает все каскадные строки в память и удаляет их одной
+транзакцией, которая держит блокировки всё это время. schedule() только
+помечает объект полем deleting (менеджер objects таких не возвращает,
+поэтому API и админка скрывают объект сразу) и ставит фоновую задачу.
+Задача удаляет и обнуляет зависимые строки пачками по DELETE_BATCH_SIZE,
+каждую пачку - своей короткой транзакцией, пишет счётчики в Job.result и
+в конце удаляет сам объект, у которого почти не осталось зависимых строк.
+Прерванная задача при повторе продолжает с того же места.
+
+Модели с таким удалением объявляют поле deleting и менеджер objects без
+помеченных объектов. С DELETE_IN_BACKGROUND=False объект удаляется сразу.
+"""
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CASCADE, SET_NULL
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.dispatch import Signal
+
+from jobs.queue import enqueue, progress, task
+
+# Объект помечен на удаление, в той же транзакции: sender, instance.
+scheduled = Signal()
+# Внешний ключ строк ids обнулён без сигналов модели: sender, ids.
+nulled = Signal()
+
+
+def schedule(instance):
+    """Скрывает объект и ставит задачу его удаления."""
+    if not settings.DELETE_IN_BACKGROUND:
+        instance.delete()
+        return
+    model = type(instance)
+    label = model._meta.label
+    with transaction.atomic():
+        model._base_manager.filter(pk=instance.pk).update(deleting=True)
+        instance.deleting = True
+        scheduled.send(sender=model, instance=instance)
+        enqueue(
+            delete_object, key=f'delete:{label}:{instance.pk}',
+            model=label, pk=instance.pk,
+        )
+
+
+@task
+def delete_object(model, pk):
+    """Удаляет зависимые строки пачками, затем сам объект."""
+    model = apps.get_model(model)
+    counts = Counter()
+    for relation in get_candidate_relations_to_delete(model._meta):
+        on_delete = relation.field.remote_field.on_delete
+        if on_delete not in (CASCADE, SET_NULL):
+            continue
+        related = relation.related_model._base_manager
+        name = relation.field.name
+        while ids := list(related.filter(**{name: pk}).values_list(
+            'pk', flat=True
+        )[:settings.DELETE_BATCH_SIZE]):
+            with transaction.atomic():
+                if on_delete is CASCADE:
+                    related.filter(pk__in=ids).delete()
+                else:
+                    related.filter(pk__in=ids).update(**{name: None})
+                    nulled.send(sender=relation.related_model, ids=ids)
+            counts[relation.related_model._meta.label] += len(ids)
+            progress(dict(counts))
+    instance = model._base_manager.filter(pk=pk).first()
+    if instance is not None:
+        instance.delete()
+        counts[model._meta.label] += 1
+    return dict(counts)
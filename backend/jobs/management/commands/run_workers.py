@@ -0,0 +1,90 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs import queue
+
+# Как часто главный процесс удаляет старые выполненные задачи, секунд.
+PURGE_INTERVAL = 3600
+# Как часто главный процесс ставит периодические задачи, секунд.
+SCHEDULE_INTERVAL = 60
+
+
+def work(stop, once):
+    """Цикл обработчика: забирает и выполняет задачи до сигнала stop."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while not stop.is_set():
+        close_old_connections()
+        job = queue.claim()
+        if job is None:
+            if once:
+                return
+            stop.wait(settings.JOBS_POLL_INTERVAL)
+            continue
+        queue.execute(job)
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает обработчики фоновых задач, по процессу на обработчик. '
+        'SIGTERM и Ctrl+C дают обработчикам завершить текущие задачи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOBS_WORKERS,
+            help='Число процессов-обработчиков.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        def start():
+            # Соединения с базой не должны достаться дочерним процессам.
+            connections.close_all()
+            process = context.Process(
+                target=work, args=(stop, options['once'])
+            )
+            process.start()
+            return process
+
+        processes = [start() for _ in range(options['processes'])]
+        self.stdout.write(f'Запущено обработчиков: {len(processes)}.')
+
+        purged_at = time.monotonic()
+        scheduled_at = None
+        while any(process.is_alive() for process in processes):
+            if not options['once'] and (
+                scheduled_at is None
+                or time.monotonic() - scheduled_at > SCHEDULE_INTERVAL
+            ):
+                close_old_connections()
+                queue.enqueue_periodic()
+                scheduled_at = time.monotonic()
+            for number, process in enumerate(processes):
+                process.join(timeout=1)
+                # Упавший обработчик заменяется новым.
+                if (process.exitcode and not stop.is_set()
+                        and not options['once']):
+                    processes[number] = start()
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                close_old_connections()
+                queue.purge()
+                purged_at = time.monotonic()
+        self.stdout.write(self.style.SUCCESS('Обработчики остановлены.'))
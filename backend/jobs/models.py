@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача, см. jobs/queue.py."""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.JSONField('Аргументы', default=dict)
+    status = models.CharField(
+        'Статус', max_length=10, choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    idempotency_key = models.CharField(
+        'Ключ идемпотентности', max_length=200, unique=True, null=True,
+        blank=True,
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток')
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    # Выполняемая задача, не завершённая к этому времени, считается
+    # брошенной упавшим обработчиком и снова выдаётся.
+    locked_until = models.DateTimeField(
+        'Занята до', null=True, blank=True
+    )
+    result = models.JSONField('Результат', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-created',)
+        indexes = (
+            models.Index(fields=('status', 'run_at'), name='job_ready_idx'),
+            models.Index(
+                fields=('status', 'finished'), name='job_finished_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,220 @@
+"""
+Очередь фоновых задач в таблице базы данных, без внешнего брокера.
+
+Задача - функция, зарегистрированная декоратором @task в модуле tasks.py
+приложения, её именованные аргументы хранятся в JSON. enqueue() вставляет
+строку Job в текущей транзакции: задача видна обработчикам только после
+коммита и пропадает вместе с откатом. Ключ идемпотентности уникален:
+повторная постановка с тем же ключом возвращает существующую задачу.
+enqueue_merged() вместо новой задачи дописывает аргументы в ожидающую
+первого запуска.
+Задачи JOBS_PERIODIC ставит enqueue_periodic() с ключом по номеру
+интервала: несколько запущенных run_workers ставят каждую один раз.
+
+Обработчики (команда run_workers) забирают готовые задачи запросом
+SELECT ... FOR UPDATE SKIP LOCKED, поэтому не ждут друг друга на одной
+строке. В SQLite блокировок строк нет, и задачу забирает тот обработчик,
+чьё условное UPDATE изменило её строку. Задача, упавшая с исключением,
+повторяется с экспоненциальной задержкой, после max_attempts попыток
+остаётся со статусом failed. Задача может выполниться повторно, если
+обработчик упал, не завершив её за JOBS_LEASE_SECONDS, поэтому функции
+задач должны быть идемпотентными. Долгая задача сообщает ход выполнения
+через progress(): он виден в поле result, а аренда продлевается.
+
+С JOBS_RUN_INLINE=True задачи выполняются сразу после коммита в том же
+процессе, как до появления очереди, - для разработки без обработчиков.
+"""
+import logging
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+# Задача, которую выполняет текущий поток, для progress().
+current_job = ContextVar('current_job', default=None)
+# Задач, которые обработчик SQLite пробует забрать за один запрос.
+CLAIM_CANDIDATES = 10
+
+
+def task(function):
+    """Регистрирует функцию как задачу с именем <модуль>.<функция>."""
+    function.task_name = f'{function.__module__}.{function.__qualname__}'
+    TASKS[function.task_name] = function
+    return function
+
+
+def enqueue(function, *, key=None, delay=0, max_attempts=None, **payload):
+    """
+    Ставит задачу function(**payload) в очередь через delay секунд.
+    Возвращает Job, для известного ключа key - уже существующую.
+    """
+    fields = {
+        'name': function.task_name,
+        'payload': payload,
+        'idempotency_key': key,
+        'max_attempts': max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        job = Job.objects.create(**fields)
+    else:
+        job = Job.objects.filter(idempotency_key=key).first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(**fields)
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=key)
+    if settings.JOBS_RUN_INLINE:
+        transaction.on_commit(lambda: run(job.pk))
+    return job
+
+
+def enqueue_merged(function, merge, *, delay=0, **payload):
+    """
+    Дописывает payload в ещё не запускавшуюся задачу function, которая
+    выполнится не позже чем через delay секунд: её payload заменяется на
+    merge(payload задачи, payload). Если такой задачи нет, ставит новую
+    через delay секунд. Серия изменений за delay даёт одну задачу, а
+    задача, которая ждёт повтора после ошибки, не задерживает новые
+    изменения и не получает их в неудачный payload.
+    """
+    pending = Job.objects.filter(
+        name=function.task_name, status=Job.Status.QUEUED, attempts=0,
+        run_at__lte=timezone.now() + timedelta(seconds=delay),
+    )
+    job = pending.order_by('pk').first()
+    if job is not None and pending.filter(pk=job.pk).update(
+        payload=merge(job.payload, payload)
+    ):
+        return job
+    return enqueue(function, delay=delay, **payload)
+
+
+def enqueue_periodic(now=None):
+    """Ставит задачи JOBS_PERIODIC, каждую раз в её интервал."""
+    timestamp = (now or timezone.now()).timestamp()
+    for name, interval in settings.JOBS_PERIODIC.items():
+        enqueue(TASKS[name], key=f'{name}:{int(timestamp // interval)}')
+
+
+def ready(now):
+    """Готовые задачи и задачи, брошенные упавшими обработчиками."""
+    return Job.objects.filter(
+        Q(status=Job.Status.QUEUED, run_at__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_until__lt=now)
+    ).order_by('run_at', 'pk')
+
+
+def claim(now=None, queryset=None):
+    """Забирает одну готовую задачу или возвращает None."""
+    now = now or timezone.now()
+    queryset = ready(now) if queryset is None else queryset
+    locked_until = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = queryset.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.Status.RUNNING
+            job.attempts += 1
+            job.locked_until = locked_until
+            job.save(update_fields=('status', 'attempts', 'locked_until'))
+            return job
+
+    for job in queryset[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(
+            pk=job.pk, status=job.status, attempts=job.attempts
+        ).update(
+            status=Job.Status.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=locked_until,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def retry_delay(attempts):
+    """Задержка перед попыткой attempts + 1: растёт вдвое с каждой."""
+    return min(
+        settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_DELAY,
+    )
+
+
+def execute(job):
+    """Выполняет забранную задачу и записывает итог."""
+    function = TASKS.get(job.name)
+    token = current_job.set(job.pk)
+    try:
+        if function is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована.')
+        result = function(**job.payload)
+    except Exception:
+        logger.exception('Задача %s #%s завершилась ошибкой', job.name,
+                         job.pk)
+        now = timezone.now()
+        changes = {'error': traceback.format_exc(), 'locked_until': None}
+        if job.attempts >= job.max_attempts:
+            changes.update(status=Job.Status.FAILED, finished=now)
+        else:
+            changes.update(
+                status=Job.Status.QUEUED,
+                run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+            )
+    else:
+        changes = {
+            'status': Job.Status.DONE, 'result': result, 'error': '',
+            'locked_until': None, 'finished': timezone.now(),
+        }
+    finally:
+        current_job.reset(token)
+    Job.objects.filter(pk=job.pk).update(**changes)
+    for field, value in changes.items():
+        setattr(job, field, value)
+    return job
+
+
+def progress(result):
+    """
+    Записывает промежуточный итог выполняемой задачи в Job.result и
+    продлевает её аренду: долгую задачу не заберёт другой обработчик.
+    """
+    pk = current_job.get()
+    if pk is not None:
+        Job.objects.filter(pk=pk).update(
+            result=result,
+            locked_until=timezone.now() + timedelta(
+                seconds=settings.JOBS_LEASE_SECONDS
+            ),
+        )
+
+
+def run(pk):
+    """Забирает и выполняет задачу pk, если её не забрал обработчик."""
+    job = claim(queryset=Job.objects.filter(
+        pk=pk, status=Job.Status.QUEUED
+    ))
+    if job is not None:
+        execute(job)
+
+
+def purge(now=None):
+    """Удаляет выполненные задачи старше JOBS_KEEP_DAYS."""
+    since = (now or timezone.now()) - timedelta(days=settings.JOBS_KEEP_DAYS)
+    deleted, _ = Job.objects.filter(
+        status=Job.Status.DONE, finished__lt=since
+    ).delete()
+    return deleted
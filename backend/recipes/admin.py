@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from import_export.admin import ImportExportModelAdmin
 
+from jobs.admin import BackgroundDeleteMixin
 from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from recipes.resources.ingredient_resource import IngredientResource
@@ -40,7 +41,7 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
     """Админка для рецептов."""
     inlines = (RecipeIngredientInline,)
     list_display = ('id', 'name', 'author', 'count_favorites', 'image_display')
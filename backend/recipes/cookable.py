@@ -0,0 +1,203 @@
+"""
+Поиск рецептов, которые можно приготовить из имеющихся ингредиентов.
+
+Индекс в памяти процесса хранит для каждого ингредиента отсортированный
+массив идентификаторов рецептов (numpy uint32), а для рецептов - число их
+ингредиентов. Запрос подсчитывает совпадения одним bincount по массивам
+ингредиентов пользователя и ранжирует рецепты по покрытию: доле
+ингредиентов рецепта, которые есть у пользователя. Упорядочивается только
+запрошенная страница, поэтому время ответа почти не зависит от числа
+кандидатов.
+
+Индекс строится при первом запросе, скрытые рецепты в него не входят.
+Версия индекса - позиция в журнале изменений каталога (recipes/sync.py),
+общем для всех процессов и обработчиков задач: перед запросом процесс
+дочитывает журнал и обновляет только изменённые рецепты. Если изменений
+больше REBUILD_CHANGES, индекс строится заново.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from recipes import sync
+from recipes.models import Recipe, RecipeIngredient
+
+# Изменений журнала, после которых индекс дешевле построить заново.
+REBUILD_CHANGES = 10000
+
+# Ключ сортировки в int64: покрытие с точностью 1e-4, число совпадений и
+# идентификатор рецепта, по убыванию каждого.
+COVERAGE_SCALE = 10000
+HITS_SHIFT = 32
+COVERAGE_SHIFT = 48
+ID_MASK = (1 << HITS_SHIFT) - 1
+
+
+class Ranking:
+    """
+    Рецепты по убыванию покрытия как последовательность для Paginator.
+
+    Элементы - пары (recipe_id, coverage). Срез сортирует только
+    элементы до своей правой границы.
+    """
+
+    def __init__(self, keys, totals):
+        self.keys = keys
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(len(self.keys))
+        if start >= stop:
+            return []
+        keys = self.keys
+        if stop < len(keys):
+            keys = np.partition(keys, len(keys) - stop)[-stop:]
+        keys = np.sort(keys)[::-1][start:stop]
+        recipe_ids = keys & ID_MASK
+        hits = (keys >> HITS_SHIFT) & 0xFFFF
+        coverage = hits / self.totals[recipe_ids]
+        return list(zip(recipe_ids.tolist(), coverage.tolist()))
+
+
+class CookableIndex:
+    """Инвертированный индекс ингредиент -> рецепты."""
+
+    def __init__(self):
+        self.postings = {}
+        self.totals = np.zeros(0, dtype=np.uint16)
+        # Версия индекса, см. sync.snapshot().
+        self.position = None
+        self.applied = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(recipe_ids=None):
+        """Ингредиенты видимых рецептов: {ingredient_id: [recipe_id, ...]}."""
+        rows = RecipeIngredient.objects.filter(
+            recipe__deleting=False
+        ).values_list('ingredient_id', 'recipe_id').order_by()
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        postings = defaultdict(list)
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+            postings[ingredient_id].append(recipe_id)
+        return postings
+
+    def _grow(self, max_recipe_id):
+        if max_recipe_id >= len(self.totals):
+            self.totals = np.concatenate((
+                self.totals,
+                np.zeros(max_recipe_id + 1 - len(self.totals),
+                         dtype=np.uint16),
+            ))
+
+    def _remove(self, recipe_ids):
+        recipe_ids = np.asarray(recipe_ids, dtype=np.uint32)
+        for ingredient_id, postings in self.postings.items():
+            if not len(postings):
+                continue
+            positions = np.searchsorted(postings, recipe_ids)
+            inside = positions < len(postings)
+            found = positions[inside][
+                postings[positions[inside]] == recipe_ids[inside]
+            ]
+            if len(found):
+                self.postings[ingredient_id] = np.delete(postings, found)
+        self.totals[recipe_ids[recipe_ids < len(self.totals)]] = 0
+
+    def _add(self, postings):
+        for ingredient_id, recipe_ids in postings.items():
+            recipe_ids = np.sort(np.asarray(recipe_ids, dtype=np.uint32))
+            self._grow(int(recipe_ids[-1]))
+            self.totals[recipe_ids] += 1
+            target = self.postings.get(ingredient_id)
+            if target is None:
+                self.postings[ingredient_id] = recipe_ids
+            else:
+                self.postings[ingredient_id] = np.insert(
+                    target, np.searchsorted(target, recipe_ids), recipe_ids
+                )
+
+    def build(self, postings):
+        """Заполняет индекс целиком из {ingredient_id: [recipe_id, ...]}."""
+        self.postings = {}
+        self.totals = np.zeros(0, dtype=np.uint16)
+        if postings:
+            self._grow(max(max(ids) for ids in postings.values()))
+        self._add(postings)
+
+    def rebuild(self):
+        position, applied = sync.snapshot()
+        postings = self.load()
+        with self.lock:
+            self.build(postings)
+            self.position = position
+            self.applied = applied
+
+    def catch_up(self):
+        """Применяет новые записи журнала или перестраивает индекс."""
+        if self.position is None:
+            self.rebuild()
+            return
+        recipe_ids, position, applied = sync.follow(
+            Recipe, self.position, self.applied, REBUILD_CHANGES
+        )
+        if recipe_ids is None:
+            self.rebuild()
+            return
+        if recipe_ids:
+            postings = self.load(recipe_ids)
+        with self.lock:
+            if recipe_ids:
+                self._remove(recipe_ids)
+                self._add(postings)
+            self.position = position
+            self.applied = applied
+
+    def rank(self, ingredient_ids, min_coverage=0):
+        """
+        Рецепты по убыванию покрытия, см. Ranking.
+
+        Полностью доступные рецепты идут первыми, при равном покрытии
+        выше рецепты с большим числом совпавших ингредиентов, затем более
+        новые.
+        """
+        self.catch_up()
+        return self.score(ingredient_ids, min_coverage)
+
+    def score(self, ingredient_ids, min_coverage=0):
+        """Ранжирование по текущему состоянию индекса, см. rank()."""
+        with self.lock:
+            totals = self.totals
+            arrays = [
+                self.postings[ingredient_id]
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in self.postings
+            ]
+        if not arrays:
+            return Ranking(np.zeros(0, dtype=np.int64), totals)
+
+        hits = np.bincount(np.concatenate(arrays), minlength=len(totals))
+        recipe_ids = np.flatnonzero(hits)
+        hits = hits[recipe_ids]
+        recipe_totals = totals[recipe_ids].astype(np.int64)
+        if min_coverage:
+            selected = hits >= min_coverage * recipe_totals
+            recipe_ids = recipe_ids[selected]
+            hits = hits[selected]
+            recipe_totals = recipe_totals[selected]
+        keys = (
+            (hits * COVERAGE_SCALE // recipe_totals << COVERAGE_SHIFT)
+            | (hits << HITS_SHIFT)
+            | recipe_ids
+        )
+        return Ranking(keys, totals)
+
+
+index = CookableIndex()
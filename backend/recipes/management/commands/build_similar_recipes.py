@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import similar
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты для всего каталога, например после '
+        'загрузки данных в обход моделей.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = similar.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {count} рецептов за '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes import storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок, на которые не ссылается ни один рецепт. '
+        'Запускается периодически, например раз в сутки.'
+    )
+
+    def handle(self, *args, **options):
+        count = storage.collect()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок без ссылок: {count}.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes import sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает журнал изменений каталога для /api/sync/ и дописывает '
+        'изменения, сохранённые в обход сигналов. Запускается периодически '
+        'и после загрузки данных напрямую в таблицы.'
+    )
+
+    def handle(self, *args, **options):
+        deleted, added = sync.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено заменённых записей: {deleted}, добавлено: {added}.'
+        ))
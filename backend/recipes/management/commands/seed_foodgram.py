@@ -0,0 +1,367 @@
+import csv
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes import scores, search, similar, sync
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+SEED_PASSWORD = 'foodgram-seed'
+SEED_IMAGE_NAME = 'images/seed.png'
+INGREDIENTS_CSV = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+TAG_COLORS = (
+    '#E26C2D', '#49B64E', '#8775D2', '#F5C242', '#3D9BE9', '#D9534F',
+    '#5BC0DE', '#2E8B57', '#FF69B4', '#8B4513', '#708090', '#FFD700',
+)
+TEXT_WORDS = (
+    'нарежьте', 'смешайте', 'обжарьте', 'запеките', 'добавьте', 'посолите',
+    'перемешайте', 'остудите', 'подавайте', 'варите', 'взбейте', 'натрите',
+    'минут', 'на', 'среднем', 'огне', 'до', 'готовности', 'с', 'зеленью',
+)
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса степенного распределения для random.choices."""
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, size + 1)))
+
+
+def power_law_quotas(rng, size, total, exponent, cap):
+    """
+    Распределяет total событий между size участниками по степенному закону.
+
+    Ранги участников перемешиваются, чтобы самые активные не совпадали с
+    первыми созданными записями.
+    """
+    weights = [1 / (rank ** exponent) for rank in range(1, size + 1)]
+    rng.shuffle(weights)
+    weights_sum = sum(weights)
+    return [
+        min(cap, int(total * weight / weights_sum + rng.random()))
+        for weight in weights
+    ]
+
+
+def weighted_unique_sample(rng, population, cum_weights, count,
+                           exclude=None):
+    """Выборка count различных элементов с учётом весов."""
+    count = min(count, len(population) - (1 if exclude is not None else 0))
+    result = set()
+    while len(result) < count:
+        for item in rng.choices(
+            population, cum_weights=cum_weights, k=count - len(result)
+        ):
+            if item != exclude:
+                result.add(item)
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные Foodgram для нагрузочного '
+        'тестирования: пользователей, рецепты, избранное, списки покупок и '
+        'подписки со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+        )
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--shopping-cart', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Глубина в днях для дат публикации рецептов.',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного распределения популярности.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--ingredients-csv', default=INGREDIENTS_CSV,
+            help='CSV с ингредиентами, если таблица ингредиентов пуста.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        # Отдельный генератор для дат, чтобы не менять остальные данные.
+        self.clock = random.Random(f'{options["seed"]}:created')
+        self.batch_size = options['batch_size']
+        self.exponent = options['exponent']
+        self.prefix = f'seed{options["seed"]}'
+
+        if User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).exists():
+            raise CommandError(
+                f'Данные с зерном {options["seed"]} уже сгенерированы.'
+            )
+
+        ingredient_ids = self.ensure_ingredients(options['ingredients_csv'])
+        tag_ids = self.ensure_tags(options['tags'])
+        image_name = self.ensure_image()
+
+        user_ids = self.create_users(options['users'])
+        recipe_ids = self.create_recipes(
+            user_ids, options['recipes'], image_name, options['days']
+        )
+        self.create_recipe_tags(recipe_ids, tag_ids)
+        self.create_recipe_ingredients(
+            recipe_ids, ingredient_ids, *options['ingredients_per_recipe']
+        )
+
+        recipe_population = recipe_ids[:]
+        self.rng.shuffle(recipe_population)
+        recipe_cum_weights = zipf_cum_weights(
+            len(recipe_population), self.exponent
+        )
+        self.create_user_recipe_links(
+            Favorites, user_ids, recipe_population, recipe_cum_weights,
+            options['favorites'], options['days'],
+        )
+        self.create_user_recipe_links(
+            ShoppingCart, user_ids, recipe_population, recipe_cum_weights,
+            options['shopping_cart'], options['days'],
+        )
+        self.create_subscriptions(user_ids, options['subscriptions'])
+        self.reset_sequences()
+        # Строки вставлены без сигналов модели.
+        search.reindex()
+        similar.rebuild()
+        scores.rebuild()
+        sync.compact()
+
+    def log(self, message):
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def next_id(self, model):
+        return (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+
+    def bulk_insert(self, model, objs_iterable):
+        """Пакетная вставка с ограниченным расходом памяти."""
+        created = 0
+        batch = []
+        with transaction.atomic():
+            for obj in objs_iterable:
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    model.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {created}')
+        return created
+
+    def bulk_insert_rows(self, model, field_names, rows):
+        """
+        Вставка кортежей значений через executemany в обход ORM.
+
+        Используется для самых объёмных таблиц: построение экземпляров
+        моделей и компиляция bulk_create занимают большую часть времени.
+        """
+        fields = [model._meta.get_field(name) for name in field_names]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column)
+                      for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        created = 0
+        batch = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                created += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {created}')
+        return created
+
+    def ensure_ingredients(self, csv_path):
+        if not Ingredient.objects.exists():
+            with open(csv_path, encoding='utf-8') as csv_file:
+                self.bulk_insert(Ingredient, (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in csv.reader(csv_file)
+                ))
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def ensure_tags(self, count):
+        existing = Tag.objects.count()
+        if existing < count:
+            used_colors = set(Tag.objects.values_list('color', flat=True))
+            colors = [color for color in TAG_COLORS
+                      if color not in used_colors]
+            self.bulk_insert(Tag, (
+                Tag(
+                    name=f'{self.prefix} тег {number}',
+                    color=colors[number],
+                    slug=f'{self.prefix}-tag-{number}',
+                )
+                for number in range(min(count - existing, len(colors)))
+            ))
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def ensure_image(self):
+        """
+        Одна общая картинка для всех сгенерированных рецептов. Хранилище
+        адресует файлы по содержимому и не пишет её повторно.
+        """
+        buffer = BytesIO()
+        Image.new('RGB', (1, 1), (226, 108, 45)).save(buffer, 'PNG')
+        return Recipe._meta.get_field('image').storage.save(
+            SEED_IMAGE_NAME, ContentFile(buffer.getvalue())
+        )
+
+    def create_users(self, count):
+        first_id = self.next_id(User)
+        password = make_password(SEED_PASSWORD)
+        self.bulk_insert(User, (
+            User(
+                pk=first_id + number,
+                username=f'{self.prefix}_{number}',
+                email=f'{self.prefix}_{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(count)
+        ))
+        return list(range(first_id, first_id + count))
+
+    def create_recipes(self, user_ids, count, image_name, days):
+        first_id = self.next_id(Recipe)
+        authors = user_ids[:]
+        self.rng.shuffle(authors)
+        author_ids = self.rng.choices(
+            authors, cum_weights=zipf_cum_weights(len(authors),
+                                                  self.exponent),
+            k=count,
+        )
+        now = timezone.now()
+        span = days * 24 * 60 * 60
+        pub_date_field = Recipe._meta.get_field('pub_date')
+        self.bulk_insert_rows(
+            Recipe,
+            ('id', 'author', 'name', 'image', 'text', 'cooking_time',
+             'pub_date'),
+            (
+                (
+                    first_id + number,
+                    author_id,
+                    f'Рецепт {self.prefix} №{number}',
+                    image_name,
+                    ' '.join(self.rng.choices(TEXT_WORDS, k=30)),
+                    self.rng.randint(5, 180),
+                    pub_date_field.get_db_prep_save(
+                        now - timedelta(seconds=self.rng.randint(0, span)),
+                        connection,
+                    ),
+                )
+                for number, author_id in enumerate(author_ids)
+            ),
+        )
+        return list(range(first_id, first_id + count))
+
+    def create_recipe_tags(self, recipe_ids, tag_ids):
+        self.bulk_insert_rows(Recipe.tags.through, ('recipe', 'tag'), (
+            (recipe_id, tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids,
+                                  min_count, max_count):
+        population = ingredient_ids[:]
+        self.rng.shuffle(population)
+        cum_weights = zipf_cum_weights(len(population), self.exponent)
+        self.bulk_insert_rows(
+            RecipeIngredient, ('recipe', 'ingredient', 'amount'), (
+                (recipe_id, ingredient_id, self.rng.randint(1, 500))
+                for recipe_id in recipe_ids
+                for ingredient_id in sorted(weighted_unique_sample(
+                    self.rng, population, cum_weights,
+                    self.rng.randint(min_count, max_count),
+                ))
+            ),
+        )
+
+    def create_user_recipe_links(self, model, user_ids, recipe_population,
+                                 recipe_cum_weights, total, days):
+        """Избранное и списки покупок: активные пользователи и хиты."""
+        quotas = power_law_quotas(
+            self.rng, len(user_ids), total, self.exponent,
+            cap=max(1, len(recipe_population) // 2),
+        )
+        now = timezone.now()
+        span = days * 24 * 60 * 60
+        created_field = model._meta.get_field('created')
+        self.bulk_insert_rows(model, ('user', 'recipe', 'created'), (
+            (user_id, recipe_id, created_field.get_db_prep_save(
+                now - timedelta(seconds=self.clock.randint(0, span)),
+                connection,
+            ))
+            for user_id, quota in zip(user_ids, quotas)
+            for recipe_id in sorted(weighted_unique_sample(
+                self.rng, recipe_population, recipe_cum_weights, quota,
+            ))
+        ))
+
+    def create_subscriptions(self, user_ids, total):
+        """Граф подписок со степенным распределением числа подписчиков."""
+        authors = user_ids[:]
+        self.rng.shuffle(authors)
+        cum_weights = zipf_cum_weights(len(authors), self.exponent)
+        quotas = power_law_quotas(
+            self.rng, len(user_ids), total, self.exponent,
+            cap=max(1, len(user_ids) // 2),
+        )
+        self.bulk_insert_rows(Subscription, ('user', 'author'), (
+            (user_id, author_id)
+            for user_id, quota in zip(user_ids, quotas)
+            for author_id in sorted(weighted_unique_sample(
+                self.rng, authors, cum_weights, quota, exclude=user_id,
+            ))
+        ))
+
+    def reset_sequences(self):
+        """Синхронизирует последовательности после вставки явных id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность и тренд рецептов по избранному и '
+        'спискам покупок. Запускается периодически, например раз в час.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = scores.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Оценки пересчитаны для {count} рецептов за '
+            f'{time.perf_counter() - started:.1f} с.'
+        ))
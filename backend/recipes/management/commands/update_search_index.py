@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает поисковый индекс всех рецептов, например после '
+        'загрузки данных в обход моделей.'
+    )
+
+    def handle(self, *args, **options):
+        search.reindex()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс обновлён.'))
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:06
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+def record_existing(apps, schema_editor):
+    """Первая синхронизация получает весь каталог из журнала."""
+    Change = apps.get_model('recipes', 'Change')
+    for model in ('tag', 'ingredient', 'recipe'):
+        ids = apps.get_model('recipes', model).objects.order_by(
+            'pk'
+        ).values_list('pk', flat=True)
+        Change.objects.bulk_create(
+            (Change(model=model, object_id=pk) for pk in ids),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), verbose_name='Дата изменения'),
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Объект')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалён')),
+                ('created', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'изменение каталога',
+                'verbose_name_plural': 'Изменения каталога',
+                'ordering': ('pk',),
+                'indexes': [models.Index(fields=['model', 'object_id'], name='change_object_idx')],
+            },
+        ),
+        migrations.RunPython(record_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='deleting',
+            field=models.BooleanField(db_default=False, default=False, editable=False, verbose_name='Удаляется'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_deleting'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='recipe',
+            name='unique_name_author',
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleting', False)), fields=('name', 'author'), name='unique_name_author'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+# Копия правил recipes/scores.py на момент миграции: код приложения может
+# измениться, а миграция должна считать так же.
+WEIGHTS = {'Favorites': 2, 'ShoppingCart': 1}
+PUBLICATION_WEIGHT = 1
+TRENDING_WINDOW_HALF_LIVES = 10
+BATCH_SIZE = 1000
+
+
+def backfill_scores(apps, schema_editor):
+    """Столбцы из 0005 заполнены нулями: считаем оценки по избранному."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    tau = settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+    since = timezone.now() - timedelta(hours=(
+        settings.TRENDING_HALF_LIFE_HOURS * TRENDING_WINDOW_HALF_LIVES
+    ))
+
+    def decay_time(moment, weight):
+        return moment.timestamp() / tau + math.log(weight)
+
+    last = 0
+    while True:
+        recipes = list(
+            Recipe.objects.filter(pk__gt=last).order_by('pk')
+            .values_list('pk', 'pub_date')[:BATCH_SIZE]
+        )
+        if not recipes:
+            break
+        first, last = recipes[0][0], recipes[-1][0]
+        popularity = defaultdict(int)
+        events = defaultdict(list)
+        for pk, pub_date in recipes:
+            if pub_date >= since:
+                events[pk].append(decay_time(pub_date, PUBLICATION_WEIGHT))
+        for name, weight in WEIGHTS.items():
+            rows = apps.get_model('recipes', name).objects.filter(
+                recipe_id__gte=first, recipe_id__lte=last
+            ).order_by()
+            for pk, count in rows.values_list('recipe_id').annotate(
+                count=Count('pk')
+            ):
+                popularity[pk] += weight * count
+            for pk, created in rows.filter(
+                created__gte=since
+            ).values_list('recipe_id', 'created'):
+                events[pk].append(decay_time(created, weight))
+
+        updated = []
+        for pk, _ in recipes:
+            values = events.get(pk)
+            trending = 0.0
+            if values:
+                peak = max(values)
+                trending = peak + math.log(
+                    sum(math.exp(value - peak) for value in values)
+                )
+            updated.append(Recipe(
+                pk=pk, popularity=popularity[pk], trending=trending
+            ))
+        Recipe.objects.bulk_update(updated, ['popularity', 'trending'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_unique_name_author_visible'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
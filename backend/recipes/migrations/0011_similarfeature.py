@@ -0,0 +1,30 @@
+# Generated by Django 5.0.4 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_scores_backfill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ingredient', 'Ингредиент'), ('tag', 'Тег'), ('catalogue', 'Каталог')], max_length=10, verbose_name='Вид')),
+                ('feature_id', models.PositiveBigIntegerField(verbose_name='Признак')),
+                ('recipes', models.PositiveIntegerField(verbose_name='Рецептов')),
+            ],
+            options={
+                'verbose_name': 'признак похожих рецептов',
+                'verbose_name_plural': 'Признаки похожих рецептов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarfeature',
+            constraint=models.UniqueConstraint(fields=('kind', 'feature_id'), name='unique_similar_feature'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models.functions import Now
 
 from foodgram.constants import (INGREDIENT_NAME_LENGTH, INGREDIENT_UNIT_LENGTH,
                                 RECIPE_NAME_LENGTH, TAG_COLOR_LENGTH,
@@ -26,6 +28,10 @@ class Tag(models.Model):
         unique=True,
     )
     slug = models.SlugField('Slug', unique=True)
+    # Время последнего сохранения, см. recipes/sync.py.
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_default=Now()
+    )
 
     class Meta:
         verbose_name = 'тег'
@@ -44,6 +50,10 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(
         'Единицы измерения', max_length=INGREDIENT_UNIT_LENGTH
     )
+    # Время последнего сохранения, см. recipes/sync.py.
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_default=Now()
+    )
 
     class Meta:
         verbose_name = 'ингредиент'
@@ -54,6 +64,13 @@ class Ingredient(models.Model):
         return f'{self.name} - {self.measurement_unit}'
 
 
+class VisibleManager(models.Manager):
+    """Объекты без помеченных на удаление, см. jobs/deletion.py."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting=False)
+
+
 class Recipe(models.Model):
     """Рецепты."""
     author = models.ForeignKey(
@@ -84,21 +101,65 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True, editable=False
     )
+    # Время последнего сохранения, см. recipes/sync.py.
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_default=Now()
+    )
+    # Заполняется в PostgreSQL, см. recipes/search.py.
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False
+    )
+    # Обновляются при добавлении в избранное и список покупок, см.
+    # recipes/scores.py.
+    popularity = models.PositiveIntegerField(
+        'Популярность', default=0, db_default=0, editable=False
+    )
+    trending = models.FloatField(
+        'Тренд', default=0, db_default=0, editable=False
+    )
+    # Рецепт скрыт и удаляется фоновой задачей, см. jobs/deletion.py.
+    deleting = models.BooleanField(
+        'Удаляется', default=False, db_default=False, editable=False
+    )
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', 'name', 'author')
         constraints = (
+            # Удаляемый рецепт не мешает создать новый с тем же названием.
             models.UniqueConstraint(
                 fields=('name', 'author'),
+                condition=models.Q(deleting=False),
                 name='unique_name_author',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('-popularity', '-pub_date'),
+                name='recipe_popularity_idx',
+            ),
+            models.Index(
+                fields=('-trending', '-pub_date'),
+                name='recipe_trending_idx',
+            ),
+            # Подсчёт ссылок на файл картинки, см. recipes/storage.py.
+            models.Index(fields=('image',), name='recipe_image_idx'),
+        )
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Картинка до изменения: после сохранения её файл освобождается.
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
 
 class RecipeIngredient(models.Model):
     """
@@ -131,6 +192,75 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.measurement_unit}')
 
 
+class SimilarRecipe(models.Model):
+    """
+    Похожие рецепты по косинусной близости ингредиентов и тегов, см.
+    recipes/similar.py.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        related_name='similar_to',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_recipe_similar',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class SimilarFeature(models.Model):
+    """
+    Число рецептов с ингредиентом или тегом для IDF похожих рецептов, см.
+    recipes/similar.py. Строка вида catalogue хранит число рецептов.
+    """
+
+    class Kind(models.TextChoices):
+        INGREDIENT = 'ingredient', 'Ингредиент'
+        TAG = 'tag', 'Тег'
+        CATALOGUE = 'catalogue', 'Каталог'
+
+    kind = models.CharField('Вид', max_length=10, choices=Kind.choices)
+    feature_id = models.PositiveBigIntegerField('Признак')
+    recipes = models.PositiveIntegerField('Рецептов')
+
+    class Meta:
+        verbose_name = 'признак похожих рецептов'
+        verbose_name_plural = 'Признаки похожих рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('kind', 'feature_id'),
+                name='unique_similar_feature',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.kind} {self.feature_id}: {self.recipes}'
+
+
 class Favorites(models.Model):
     """Избранные рецепты пользователя."""
     user = models.ForeignKey(
@@ -145,6 +275,10 @@ class Favorites(models.Model):
         on_delete=models.CASCADE,
         verbose_name='В избранном',
     )
+    created = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_default=Now(),
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'избранный'
@@ -175,6 +309,10 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='В списку покупок',
     )
+    created = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_default=Now(),
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'список покупок'
@@ -186,3 +324,28 @@ class ShoppingCart(models.Model):
                 name='unique_user_recipe_in_shop_list',
             ),
         )
+
+
+class Change(models.Model):
+    """
+    Журнал изменений каталога для /api/sync/: номер записи - монотонная
+    последовательность изменений, см. recipes/sync.py.
+    """
+    model = models.CharField('Модель', max_length=20)
+    object_id = models.PositiveBigIntegerField('Объект')
+    deleted = models.BooleanField('Удалён', default=False)
+    created = models.DateTimeField('Время', db_default=Now())
+
+    class Meta:
+        verbose_name = 'изменение каталога'
+        verbose_name_plural = 'Изменения каталога'
+        ordering = ('pk',)
+        indexes = (
+            models.Index(
+                fields=('model', 'object_id'), name='change_object_idx'
+            ),
+        )
+
+    def __str__(self):
+        action = 'удалён' if self.deleted else 'изменён'
+        return f'#{self.pk}: {self.model} {self.object_id} {action}'
@@ -0,0 +1,171 @@
+"""
+Популярность и тренд рецептов для сортировок ?ordering=popular и
+?ordering=trending.
+
+popularity - взвешенное число добавлений рецепта в избранное и списки
+покупок. trending - те же события и публикация рецепта с экспоненциальным
+затуханием: период полураспада веса TRENDING_HALF_LIFE_HOURS. Тренд
+хранится в логарифмической шкале: событие в момент t с весом w вносит
+w * exp(t / tau), в столбце - логарифм суммы. Текущий тренд равен
+exp(trending - now / tau), поэтому порядок по столбцу совпадает с порядком
+по тренду на любой момент и остывающие рецепты не нужно обновлять, а
+логарифм, в отличие от самих весов, не переполняется.
+
+Оба столбца обновляются одним UPDATE по первичному ключу на событие (см.
+recipes/signals.py), без подсчёта по таблицам избранного при запросе.
+Удаление из избранного или списка покупок сразу уменьшает popularity и
+вычитает вклад события из trending. rebuild() заново считает popularity по
+таблицам, а trending - по событиям последних TRENDING_WINDOW_HALF_LIVES
+периодов полураспада, и исправляет расхождения после загрузки данных в
+обход моделей. Он считает всё в SQL отдельными UPDATE по диапазонам
+первичных ключей, поэтому не держит события в памяти и не блокирует
+рецепты одной длинной транзакцией. Пересчёт выполняют периодическая задача
+update_scores раз в RECIPE_SCORES_INTERVAL секунд (см. JOBS_PERIODIC) и
+команда update_recipe_scores.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import (Case, Count, F, FloatField, Func, Max, Min,
+                              OuterRef, Subquery, Sum, Value, When)
+from django.db.models.functions import (Abs, Coalesce, Exp, Greatest, Least,
+                                        Ln, NullIf)
+from django.utils import timezone
+
+from recipes.models import Favorites, Recipe, ShoppingCart
+
+WEIGHTS = {Favorites: 2, ShoppingCart: 1}
+PUBLICATION_WEIGHT = 1
+# Вес события старше этого окна меньше 0.1% веса свежего.
+TRENDING_WINDOW_HALF_LIVES = 10
+# Рецептов в одном UPDATE пересчёта.
+BATCH_SIZE = 1000
+# Наименьшая доля тренда, которая остаётся после удаления события: вклад
+# последнего события из-за округления может оказаться больше суммы.
+MIN_REMAINDER = 1e-9
+
+
+class Epoch(Func):
+    """Секунды от начала эпохи для даты и времени, в SQL."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)::double precision'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='(julianday(%(expressions)s) - 2440587.5) * 86400.0',
+            **extra_context,
+        )
+
+
+def tau():
+    """Постоянная времени затухания, секунды."""
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def decay_time(moment, weight=1):
+    """Логарифм вклада события: t / tau + ln(w)."""
+    return moment.timestamp() / tau() + math.log(weight)
+
+
+def log_add_exp(expression, value):
+    """ln(exp(expression) + exp(value)) без переполнения, в SQL."""
+    value = Value(value)
+    return Greatest(expression, value) + Ln(
+        1 + Exp(-Abs(expression - value))
+    )
+
+
+def log_sub_exp(expression, value):
+    """
+    ln(exp(expression) - exp(value)) без переполнения, в SQL. Если
+    value не меньше expression, остаётся доля MIN_REMAINDER.
+    """
+    return expression + Ln(Greatest(
+        1 - Exp(Least(Value(value) - expression, Value(0.0))),
+        Value(MIN_REMAINDER),
+    ))
+
+
+def published(recipe):
+    """Тренд нового рецепта, задаётся до вставки вместе с остальными полями."""
+    recipe.trending = decay_time(
+        recipe.pub_date or timezone.now(), PUBLICATION_WEIGHT
+    )
+
+
+def added(model, recipe_id, moment):
+    weight = WEIGHTS[model]
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=F('popularity') + weight,
+        trending=log_add_exp(F('trending'), decay_time(moment, weight)),
+    )
+
+
+def removed(model, recipe_id, moment):
+    weight = WEIGHTS[model]
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=Greatest(F('popularity') - weight, Value(0)),
+        trending=log_sub_exp(F('trending'), decay_time(moment, weight)),
+    )
+
+
+def _decayed(field, reference):
+    """exp((t - reference) / tau) события с моментом field, в SQL."""
+    return Exp(
+        (Epoch(F(field)) - Value(reference)) / Value(tau())
+    )
+
+
+def _per_recipe(queryset, aggregate):
+    """Агрегат строк queryset рецепта из внешнего запроса."""
+    return Subquery(
+        queryset.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(value=aggregate).values('value')
+    )
+
+
+def rebuild(now=None):
+    """
+    Пересчитывает popularity и trending всех рецептов, возвращает число
+    рецептов. Каждый диапазон - отдельный UPDATE: событие, добавленное во
+    время пересчёта, либо уже попало в его подзапросы, либо прибавится к
+    новому значению.
+    """
+    now = now or timezone.now()
+    since = now - timedelta(hours=(
+        settings.TRENDING_HALF_LIFE_HOURS * TRENDING_WINDOW_HALF_LIVES
+    ))
+    # Вклады считаются относительно now: события в окне не старше
+    # TRENDING_WINDOW_HALF_LIVES периодов, и экспонента не переполняется.
+    reference = now.timestamp()
+    popularity = Value(0)
+    total = Case(
+        When(pub_date__gte=since, then=(
+            _decayed('pub_date', reference) * PUBLICATION_WEIGHT
+        )),
+        default=Value(0.0),
+    )
+    for model, weight in WEIGHTS.items():
+        popularity += Coalesce(
+            _per_recipe(model.objects.all(), Count('pk')), 0
+        ) * weight
+        total += Coalesce(_per_recipe(
+            model.objects.filter(created__gte=since),
+            Sum(_decayed('created', reference)),
+        ), 0.0) * weight
+    trending = Coalesce(
+        Value(reference / tau()) + Ln(NullIf(total, Value(0.0))),
+        Value(0.0),
+    )
+
+    bounds = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    count = 0
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        count += Recipe.objects.filter(
+            pk__gte=start, pk__lt=start + BATCH_SIZE
+        ).update(popularity=popularity, trending=trending)
+    return count
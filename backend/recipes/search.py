@@ -0,0 +1,282 @@
+"""
+Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+В PostgreSQL у рецепта есть столбец search_vector (tsvector с весами:
+название A, ингредиенты B, описание C) с GIN-индексом. Он пересчитывается
+после коммита транзакции, изменившей рецепт или ингредиент (см.
+recipes/signals.py), результаты ранжируются ts_rank.
+
+На остальных базах (SQLite при разработке) используется инвертированный
+индекс в памяти процесса. Он строится при первом поиске и обновляется по
+тем же сигналам, а изменения из других процессов и фоновых задач
+дочитывает из журнала изменений каталога (recipes/sync.py). Скрытые
+рецепты в него не входят. Найденные рецепты упорядочиваются по
+релевантности в Python, см. Ranked.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+
+from recipes import sync
+from recipes.models import Recipe, RecipeIngredient
+
+CONFIG = 'russian'
+# Веса полей для индекса в памяти, в порядке весов A, B, C tsvector.
+WEIGHTS = {'name': 3, 'ingredients': 2, 'text': 1}
+# Изменений журнала, после которых индекс дешевле построить заново.
+REBUILD_CHANGES = 10000
+# Больше любого символа слова: граница диапазона слов с префиксом.
+PREFIX_END = '\U0010ffff'
+
+UPDATE_SQL = """
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector(%(config)s::regconfig, r.name), 'A')
+        || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_recipeingredient AS ri
+            JOIN recipes_ingredient AS i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = r.id
+        ), '')), 'B')
+        || setweight(to_tsvector(%(config)s::regconfig, r.text), 'C')
+"""
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower().replace('ё', 'е'))
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vectors(recipe_ids=None):
+    """Пересчитывает search_vector рецептов, по умолчанию всех."""
+    params = {'config': CONFIG}
+    sql = UPDATE_SQL
+    if recipe_ids is not None:
+        sql += ' WHERE r.id = ANY(%(ids)s)'
+        params['ids'] = list(recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class InvertedIndex:
+    """Инвертированный индекс рецептов в памяти процесса."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.words = []
+        # Версия индекса, см. sync.snapshot().
+        self.position = None
+        self.applied = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(recipe_ids=None):
+        """Веса слов видимых рецептов: {recipe_id: {слово: вес}}."""
+        recipes = Recipe.objects.values_list('pk', 'name', 'text')
+        ingredients = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        )
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+
+        documents = {}
+        for pk, name, text in recipes:
+            weights = documents[pk] = defaultdict(int)
+            for word in tokenize(name):
+                weights[word] += WEIGHTS['name']
+            for word in tokenize(text):
+                weights[word] += WEIGHTS['text']
+        for pk, name in ingredients:
+            if pk in documents:
+                for word in tokenize(name):
+                    documents[pk][word] += WEIGHTS['ingredients']
+        return documents
+
+    def _apply(self, recipe_ids, documents):
+        for pk in recipe_ids:
+            for word in self.documents.pop(pk, ()):
+                postings = self.postings[word]
+                postings.pop(pk, None)
+                if not postings:
+                    del self.postings[word]
+        for pk, weights in documents.items():
+            self.documents[pk] = list(weights)
+            for word, weight in weights.items():
+                self.postings[word][pk] = weight
+        self.words = sorted(self.postings)
+
+    def rebuild(self):
+        position, applied = sync.snapshot()
+        documents = self.load()
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            self._apply((), documents)
+            self.position = position
+            self.applied = applied
+
+    def catch_up(self):
+        """Применяет новые записи журнала или перестраивает индекс."""
+        if self.position is None:
+            self.rebuild()
+            return
+        recipe_ids, position, applied = sync.follow(
+            Recipe, self.position, self.applied, REBUILD_CHANGES
+        )
+        if recipe_ids is None:
+            self.rebuild()
+            return
+        documents = self.load(recipe_ids) if recipe_ids else {}
+        with self.lock:
+            if recipe_ids:
+                self._apply(recipe_ids, documents)
+            self.position = position
+            self.applied = applied
+
+    def refresh(self, recipe_ids=None):
+        """
+        Сразу учитывает изменение рецептов в текущем процессе, не дожидаясь
+        записей журнала. Без конкретных рецептов индекс будет перестроен
+        при следующем поиске.
+        """
+        if recipe_ids is None:
+            with self.lock:
+                self.position = None
+            return
+        with self.lock:
+            if self.position is None:
+                return
+        documents = self.load(recipe_ids)
+        with self.lock:
+            self._apply(recipe_ids, documents)
+
+    def search(self, words):
+        """Идентификаторы рецептов, содержащих все слова как префиксы."""
+        self.catch_up()
+        with self.lock:
+            scores = None
+            for word in words:
+                word_scores = {}
+                start = bisect.bisect_left(self.words, word)
+                end = bisect.bisect_left(self.words, word + PREFIX_END, start)
+                for position in range(start, end):
+                    token = self.words[position]
+                    for pk, weight in self.postings[token].items():
+                        word_scores[pk] = max(word_scores.get(pk, 0), weight)
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {
+                        pk: score + word_scores[pk]
+                        for pk, score in scores.items() if pk in word_scores
+                    }
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+index = InvertedIndex()
+
+
+def reindex(recipe_ids=None):
+    """Обновляет поисковый индекс рецептов, по умолчанию всех."""
+    if is_postgresql():
+        update_search_vectors(recipe_ids)
+    else:
+        index.refresh(recipe_ids)
+
+
+class Ranked:
+    """
+    Строки values() рецептов в порядке ranked как последовательность для
+    Paginator. Срез загружает только свои строки и упорядочивает их в
+    Python, как RecipeViewSet.list_ids().
+    """
+
+    def __init__(self, queryset, ranked):
+        self.queryset = queryset
+        self.ranked = ranked
+        self._ids = None
+
+    @property
+    def ids(self):
+        """Идентификаторы из ranked, которые есть в queryset."""
+        if self._ids is None:
+            found = set(
+                self.queryset.order_by().values_list('pk', flat=True)
+            )
+            self._ids = [pk for pk in self.ranked if pk in found]
+        return self._ids
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        ids = self.ids[item]
+        if not ids:
+            return []
+        rows = {row['id']: row for row in self.queryset.filter(pk__in=ids)}
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def ranking(term):
+    """
+    Идентификаторы рецептов по релевантности из индекса в памяти, не
+    больше SEARCH_FALLBACK_LIMIT. None, если ищет PostgreSQL или в
+    запросе нет слов.
+    """
+    words = tokenize(term)
+    if not words or is_postgresql():
+        return None
+    return index.search(words)[:settings.SEARCH_FALLBACK_LIMIT]
+
+
+def search_recipes(queryset, term, ranked=None):
+    """
+    Рецепты queryset, подходящие под поисковый запрос.
+
+    Каждое слово запроса ищется как префикс слова рецепта, нужны все
+    слова. В PostgreSQL рецепты упорядочиваются по релевантности. Индекс
+    в памяти только отбирает SEARCH_FALLBACK_LIMIT лучших совпадений
+    (ranked, если ranking() уже вызван), а по релевантности их
+    упорядочивает Ranked.
+    """
+    words = tokenize(term)
+    if not words:
+        return queryset
+
+    if is_postgresql():
+        query = SearchQuery(
+            ' & '.join(f'{word}:*' for word in words),
+            config=CONFIG,
+            search_type='raw',
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', *Recipe._meta.ordering)
+
+    if ranked is None:
+        ranked = ranking(term)
+    if not ranked:
+        return queryset.none()
+    return queryset.filter(pk__in=ranked)
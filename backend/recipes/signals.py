@@ -0,0 +1,206 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from jobs import deletion
+from jobs.queue import enqueue_merged
+from recipes import scores, search, storage, sync
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.tasks import update_similar
+
+User = get_user_model()
+# Поля пользователя в представлении автора рецепта.
+AUTHOR_FIELDS = frozenset(('username', 'email', 'first_name', 'last_name'))
+
+
+def merge_similar(pending, payload):
+    """Аргументы ожидающей задачи update_similar вместе с новыми."""
+    return {
+        name: sorted({*pending.get(name, ()), *payload[name]})
+        for name in ('recipe_ids', 'neighbours_of')
+    }
+
+
+def reindex_on_commit(recipe_ids, ingredients_changed=True,
+                      neighbours_of=()):
+    """
+    Индексы обновляются после коммита: рецепт сохраняется раньше, чем его
+    ингредиенты, в той же транзакции. Похожие рецепты пересчитываются
+    фоновой задачей: это сотни миллисекунд на большом каталоге, поэтому
+    изменения за SIMILAR_UPDATE_DELAY собираются в одну задачу.
+    """
+    if not recipe_ids:
+        return
+    transaction.on_commit(lambda: search.reindex(recipe_ids))
+    if ingredients_changed:
+        neighbours_of = list(neighbours_of)
+        transaction.on_commit(lambda: enqueue_merged(
+            update_similar, merge_similar,
+            delay=settings.SIMILAR_UPDATE_DELAY,
+            recipe_ids=list(recipe_ids), neighbours_of=neighbours_of,
+        ))
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_recipe(sender, instance, **kwargs):
+    reindex_on_commit([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_neighbours(sender, instance, **kwargs):
+    """Связи с похожими рецептами удаляются каскадом до post_delete."""
+    instance._neighbours_of = list(
+        SimilarRecipe.objects.filter(similar=instance)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def reindex_deleted_recipe(sender, instance, **kwargs):
+    reindex_on_commit(
+        [instance.pk],
+        neighbours_of=getattr(instance, '_neighbours_of', ()),
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    """Переименование ингредиента меняет поиск по всем его рецептам."""
+    if created:
+        return
+    reindex_on_commit(list(
+        RecipeIngredient.objects.filter(ingredient=instance)
+        .values_list('recipe_id', flat=True)
+    ), ingredients_changed=False)
+
+
+@receiver(pre_save, sender=Recipe)
+def score_published_recipe(sender, instance, **kwargs):
+    if instance._state.adding:
+        scores.published(instance)
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=ShoppingCart)
+def score_added_recipe(sender, instance, created, **kwargs):
+    if created:
+        scores.added(sender, instance.recipe_id, instance.created)
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingCart)
+def score_removed_recipe(sender, instance, **kwargs):
+    scores.removed(sender, instance.recipe_id, instance.created)
+
+
+def release_images_on_commit(names):
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: storage.release(names))
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_image', None)
+    if loaded != instance.image.name:
+        release_images_on_commit([loaded])
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    release_images_on_commit([instance.image.name])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def record_saved(sender, instance, **kwargs):
+    sync.record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_deleted(sender, instance, **kwargs):
+    sync.record(sender, [instance.pk], deleted=True)
+
+
+def embedding_recipes(instance):
+    """Рецепты, в представление которых входит тег или ингредиент."""
+    if isinstance(instance, Tag):
+        related = Recipe.tags.through.objects.filter(tag=instance)
+    else:
+        related = RecipeIngredient.objects.filter(ingredient=instance)
+    return related.values_list('recipe_id', flat=True)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def record_embedding_recipes(sender, instance, created, **kwargs):
+    """Рецепты содержат название тега и ингредиента, а не только id."""
+    if not created:
+        sync.record(Recipe, embedding_recipes(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def record_unlinked_recipes(sender, instance, **kwargs):
+    """Связи с рецептами удаляются каскадом, без сигналов рецепта."""
+    sync.record(Recipe, embedding_recipes(instance))
+
+
+@receiver(post_save, sender=User)
+def record_author_recipes(sender, instance, created, update_fields=None,
+                          **kwargs):
+    """
+    Рецепты содержат имя и почту автора. Сохранение только других полей,
+    например last_login при входе, рецепты не меняет.
+    """
+    if created or (update_fields is not None
+                   and AUTHOR_FIELDS.isdisjoint(update_fields)):
+        return
+    sync.record(Recipe, Recipe.objects.filter(
+        author=instance
+    ).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=User)
+def record_orphaned_recipes(sender, instance, **kwargs):
+    """Автор рецептов удалённого пользователя обнуляется без сигналов."""
+    sync.record(Recipe, Recipe.objects.filter(
+        author=instance
+    ).values_list('pk', flat=True))
+
+
+@receiver(deletion.scheduled, sender=Recipe)
+def hide_recipe(sender, instance, **kwargs):
+    """Скрытый рецепт пропадает из индексов и похожих до удаления."""
+    sync.record(Recipe, [instance.pk], deleted=True)
+    reindex_on_commit([instance.pk], neighbours_of=list(
+        SimilarRecipe.objects.filter(similar=instance)
+        .values_list('recipe_id', flat=True)
+    ))
+
+
+@receiver(deletion.scheduled, sender=User)
+def hide_user(sender, instance, **kwargs):
+    """
+    Вход закрывается сразу, имя и почта освобождаются для регистрации.
+    Временные имя и почта не проходят валидаторы, и занять их нельзя.
+    """
+    User.all_objects.filter(pk=instance.pk).update(
+        is_active=False,
+        username=f'deleted:{instance.pk}',
+        email=f'deleted-{instance.pk}@invalid',
+    )
+    record_orphaned_recipes(sender, instance)
+
+
+@receiver(deletion.nulled, sender=Recipe)
+def record_nulled_recipes(sender, ids, **kwargs):
+    sync.record(Recipe, ids)
@@ -0,0 +1,374 @@
+"""
+Похожие рецепты по ингредиентам и тегам.
+
+Рецепт представлен разреженным вектором (scipy.sparse CSR): по столбцу на
+ингредиент и на тег, вес признака - его IDF, log((1 + N) / (1 + df)) + 1,
+у тегов дополнительно умноженный на SIMILAR_TAG_WEIGHT. Векторы
+нормированы, поэтому косинусная близость - это скалярное произведение.
+Близости считаются произведением блока строк на транспонированную матрицу
+блоками по SIMILAR_CHUNK_CELLS ячеек, для каждой строки остаются
+SIMILAR_RECIPES_COUNT лучших соседей. Они хранятся в таблице SimilarRecipe,
+откуда выдаются одним запросом по индексу.
+
+Полный пересчёт - команда build_similar_recipes и периодическая задача
+rebuild_similar: он же сохраняет df признаков и N в таблицу
+SimilarFeature. После изменения рецептов (см. recipes/signals.py) update()
+не читает каталог целиком: df признаков изменённых рецептов
+пересчитываются по индексу, а векторы строятся только для затронутых
+рецептов и их кандидатов в соседи - до SIMILAR_UPDATE_CANDIDATES рецептов
+с наибольшей суммой IDF общих ингредиентов. Заново считаются списки
+изменённых рецептов и рецептов, у которых они были среди соседей; в
+остальные списки изменённый рецепт вставляется, если он ближе худшего
+соседа. Соседи ищутся только среди кандидатов, N и df признаков, которые
+рецепт потерял, обновляются полным пересчётом, поэтому списки со временем
+немного расходятся с ним.
+"""
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, FloatField, Min, Sum, Value, When
+
+from recipes.models import (Recipe, RecipeIngredient, SimilarFeature,
+                            SimilarRecipe)
+
+BATCH_SIZE = 5000
+# Признаки рецепта: вид, модель связи с рецептом и её поле признака.
+FEATURES = (
+    (SimilarFeature.Kind.INGREDIENT, RecipeIngredient, 'ingredient_id'),
+    (SimilarFeature.Kind.TAG, Recipe.tags.through, 'tag_id'),
+)
+
+
+class Vectors:
+    """Нормированные векторы рецептов, строки по возрастанию id."""
+
+    def __init__(self, recipe_ids, matrix):
+        self.recipe_ids = recipe_ids
+        self.matrix = matrix.tocsr()
+        self.transposed = matrix.T.tocsr()
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def rows(self, recipe_ids):
+        """Номера строк рецептов, которые есть в матрице."""
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        rows = np.searchsorted(self.recipe_ids, recipe_ids)
+        rows = rows[rows < len(self.recipe_ids)]
+        return rows[np.isin(self.recipe_ids[rows], recipe_ids)]
+
+    def scores(self, rows):
+        """
+        Плотная матрица близостей строк rows со всеми рецептами. Блок
+        строк разворачивается в плотный заранее: произведение плотной
+        матрицы на разреженную быстрее разреженного, почти плотного из-за
+        тегов результата.
+        """
+        return self.matrix[rows].toarray() @ self.transposed
+
+
+def _pairs(pairs, recipe_ids):
+    """
+    Пары (строка рецепта, признак) из пар (id рецепта, признак). Пары
+    рецептов не из recipe_ids (удаляемых или созданных после выборки
+    recipe_ids) отбрасываются.
+    """
+    pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+    rows = np.minimum(
+        np.searchsorted(recipe_ids, pairs[:, 0]), max(len(recipe_ids) - 1, 0)
+    )
+    present = (
+        recipe_ids[rows] == pairs[:, 0] if len(recipe_ids)
+        else np.zeros(len(pairs), dtype=bool)
+    )
+    return rows[present], pairs[present, 1]
+
+
+def _feature_pairs(model, field, recipe_ids=None):
+    """
+    Пары (id рецепта, признак) всего каталога или, запросами по
+    BATCH_SIZE рецептов, только рецептов recipe_ids.
+    """
+    queryset = model.objects.values_list('recipe_id', field).order_by()
+    if recipe_ids is None:
+        return queryset.iterator(chunk_size=10000)
+    return chain.from_iterable(
+        queryset.filter(recipe_id__in=recipe_ids[start:start + BATCH_SIZE])
+        for start in range(0, len(recipe_ids), BATCH_SIZE)
+    )
+
+
+def _frequencies(kind, feature_ids):
+    """df признаков feature_ids из SimilarFeature, 0 для неизвестных."""
+    stored = dict(SimilarFeature.objects.filter(
+        kind=kind, feature_id__in=feature_ids.tolist()
+    ).values_list('feature_id', 'recipes'))
+    return np.fromiter((stored.get(pk, 0) for pk in feature_ids.tolist()),
+                       np.int64, len(feature_ids))
+
+
+def _save_features(feature_ids, frequencies, total):
+    """Заменяет таблицу SimilarFeature df признаков и числом рецептов."""
+    features = [SimilarFeature(
+        kind=SimilarFeature.Kind.CATALOGUE, feature_id=0, recipes=total
+    )]
+    for (kind, _, _), ids, counts in zip(FEATURES, feature_ids, frequencies):
+        features.extend(
+            SimilarFeature(kind=kind, feature_id=pk, recipes=count)
+            for pk, count in zip(ids.tolist(), counts.tolist())
+        )
+    SimilarFeature.objects.all().delete()
+    SimilarFeature.objects.bulk_create(features, batch_size=BATCH_SIZE)
+
+
+def load(recipe_ids=None):
+    """
+    Векторы рецептов recipe_ids или, без них, всех рецептов. Полная
+    загрузка считает df признаков по каталогу и сохраняет их в
+    SimilarFeature, загрузка части каталога берёт df оттуда.
+    """
+    # scipy нужен только при пересчёте: воркеры API не загружают его при
+    # старте вместе с сигналами рецептов.
+    from scipy import sparse
+
+    partial = recipe_ids is not None
+    queryset = Recipe.objects.order_by('pk')
+    if partial:
+        queryset = queryset.filter(pk__in=list(recipe_ids))
+    recipe_ids = np.fromiter(
+        queryset.values_list('pk', flat=True), dtype=np.int64
+    )
+
+    rows, columns, feature_ids, frequencies = [], [], [], []
+    offset = 0
+    for kind, model, field in FEATURES:
+        feature_rows, features = _pairs(_feature_pairs(
+            model, field, recipe_ids.tolist() if partial else None
+        ), recipe_ids)
+        ids, feature_columns = np.unique(features, return_inverse=True)
+        rows.append(feature_rows)
+        columns.append(feature_columns.reshape(-1) + offset)
+        feature_ids.append(ids)
+        frequencies.append(
+            _frequencies(kind, ids) if partial
+            else np.bincount(feature_columns.reshape(-1), minlength=len(ids))
+        )
+        offset += len(ids)
+    if partial:
+        total = SimilarFeature.objects.filter(
+            kind=SimilarFeature.Kind.CATALOGUE
+        ).values_list('recipes', flat=True).first() or len(recipe_ids)
+    else:
+        total = len(recipe_ids)
+        _save_features(feature_ids, frequencies, total)
+
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    weights = np.log((1 + total) / (1 + np.concatenate(frequencies))) + 1
+    weights[len(feature_ids[0]):] *= settings.SIMILAR_TAG_WEIGHT
+
+    matrix = sparse.csr_matrix(
+        (weights[columns].astype(np.float32), (rows, columns)),
+        shape=(len(recipe_ids), offset),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return Vectors(
+        recipe_ids, (sparse.diags(1 / norms) @ matrix).astype(np.float32)
+    )
+
+
+def neighbours(vectors, rows):
+    """
+    Лучшие соседи строк rows: по одному списку [(recipe_id, score), ...]
+    на строку, блоками по SIMILAR_CHUNK_CELLS близостей.
+    """
+    count = min(settings.SIMILAR_RECIPES_COUNT, len(vectors) - 1)
+    if count <= 0:
+        yield from ([] for _ in rows)
+        return
+    chunk = max(1, settings.SIMILAR_CHUNK_CELLS // len(vectors))
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        scores = vectors.scores(part)
+        scores[np.arange(len(part)), part] = 0
+        top = np.argpartition(scores, -count, axis=1)[:, -count:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for columns, values in zip(top, top_scores):
+            yield [
+                (recipe_id, score)
+                for recipe_id, score in zip(
+                    vectors.recipe_ids[columns].tolist(), values.tolist()
+                )
+                if score > 0
+            ]
+
+
+def _save(vectors, rows):
+    """
+    Вставка соседей через executemany в обход ORM: при полном пересчёте
+    строк в SIMILAR_RECIPES_COUNT раз больше, чем рецептов.
+    """
+    meta = SimilarRecipe._meta
+    sql = 'INSERT INTO {} ({}) VALUES (%s, %s, %s)'.format(
+        connection.ops.quote_name(meta.db_table),
+        ', '.join(connection.ops.quote_name(meta.get_field(name).column)
+                  for name in ('recipe', 'similar', 'score')),
+    )
+    batch = []
+    with connection.cursor() as cursor:
+        for row, similar in zip(rows, neighbours(vectors, rows)):
+            recipe_id = int(vectors.recipe_ids[row])
+            batch.extend(
+                (recipe_id, similar_id, score)
+                for similar_id, score in similar
+            )
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересчитывает соседей всех рецептов."""
+    vectors = load()
+    SimilarRecipe.objects.all().delete()
+    _save(vectors, np.arange(len(vectors)))
+    return len(vectors)
+
+
+def count_features(recipe_ids):
+    """Пересчитывает df признаков рецептов recipe_ids в SimilarFeature."""
+    for kind, model, field in FEATURES:
+        feature_ids = set(model.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list(field, flat=True))
+        counts = dict.fromkeys(feature_ids, 0)
+        counts.update(model.objects.filter(
+            **{f'{field}__in': feature_ids}, recipe__deleting=False
+        ).values_list(field).annotate(count=Count('pk')).order_by())
+        SimilarFeature.objects.bulk_create(
+            [SimilarFeature(kind=kind, feature_id=pk, recipes=count)
+             for pk, count in counts.items()],
+            update_conflicts=True,
+            unique_fields=('kind', 'feature_id'),
+            update_fields=('recipes',),
+        )
+
+
+def candidates(recipe_id):
+    """
+    До SIMILAR_UPDATE_CANDIDATES рецептов с наибольшей суммой IDF общих с
+    recipe_id ингредиентов. Если их меньше, список дополняется рецептами с
+    общими тегами.
+    """
+    limit = settings.SIMILAR_UPDATE_CANDIDATES
+    ingredient_ids = list(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True))
+    total = SimilarFeature.objects.filter(
+        kind=SimilarFeature.Kind.CATALOGUE
+    ).values_list('recipes', flat=True).first() or 0
+    frequencies = _frequencies(
+        SimilarFeature.Kind.INGREDIENT, np.array(ingredient_ids, np.int64)
+    )
+    weights = np.log((1 + total) / (1 + frequencies)) + 1
+    found = list(
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=ingredient_ids, recipe__deleting=False
+        ).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+            weight=Sum(Case(
+                *(When(ingredient_id=pk, then=Value(weight))
+                  for pk, weight in zip(ingredient_ids, weights.tolist())),
+                output_field=FloatField(),
+            ))
+        ).order_by('-weight').values_list('recipe_id', flat=True)[:limit]
+    ) if ingredient_ids else []
+    if len(found) < limit:
+        found += Recipe.tags.through.objects.filter(
+            tag_id__in=Recipe.tags.through.objects.filter(
+                recipe_id=recipe_id
+            ).values('tag_id'),
+            recipe__deleting=False,
+        ).exclude(recipe_id__in=[recipe_id, *found]).values_list(
+            'recipe_id', flat=True
+        ).distinct()[:limit - len(found)]
+    return found
+
+
+def _insert(vectors, row, excluded):
+    """
+    Вставляет рецепт строки row в списки соседей, где он ближе худшего
+    соседа или список неполон, и обрезает их до SIMILAR_RECIPES_COUNT.
+    Рецепты excluded пропускаются: их списки посчитаны заново.
+    """
+    recipe_id = int(vectors.recipe_ids[row])
+    scores = vectors.scores([row])[0]
+    scores[row] = 0
+    best = np.flatnonzero(scores > 0)
+    scores_by_id = {
+        pk: score for pk, score in zip(
+            vectors.recipe_ids[best].tolist(), scores[best].tolist()
+        ) if pk not in excluded
+    }
+    full = {
+        item['recipe_id']: item['worst'] for item in SimilarRecipe.objects
+        .filter(recipe_id__in=scores_by_id).values('recipe_id')
+        .annotate(worst=Min('score'), total=Count('pk')).order_by()
+        if item['total'] >= settings.SIMILAR_RECIPES_COUNT
+    }
+    scores_by_id = {
+        pk: score for pk, score in scores_by_id.items()
+        if pk not in full or score > full[pk]
+    }
+    SimilarRecipe.objects.bulk_create([
+        SimilarRecipe(recipe_id=pk, similar_id=recipe_id, score=score)
+        for pk, score in scores_by_id.items()
+    ], batch_size=BATCH_SIZE)
+    lists = defaultdict(list)
+    for pk, list_id in SimilarRecipe.objects.filter(
+        recipe_id__in=scores_by_id.keys() & full.keys()
+    ).order_by('recipe_id', '-score').values_list('pk', 'recipe_id'):
+        lists[list_id].append(pk)
+    SimilarRecipe.objects.filter(pk__in=[
+        pk for pks in lists.values()
+        for pk in pks[settings.SIMILAR_RECIPES_COUNT:]
+    ]).delete()
+
+
+@transaction.atomic
+def update(recipe_ids, neighbours_of=()):
+    """
+    Пересчитывает соседей после изменения рецептов recipe_ids, в том числе
+    удалённых и скрытых. neighbours_of - рецепты, у которых удалённые
+    рецепты были среди соседей: их связи к этому моменту уже удалены
+    каскадом.
+    """
+    count_features(recipe_ids)
+    changed = set(Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('pk', flat=True))
+    recomputed = set(neighbours_of) | set(recipe_ids)
+    recomputed.update(SimilarRecipe.objects.filter(
+        similar_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    visible = set(Recipe.objects.filter(
+        pk__in=recomputed
+    ).values_list('pk', flat=True))
+
+    loaded = set(visible)
+    for recipe_id in visible:
+        loaded.update(candidates(recipe_id))
+    vectors = load(loaded)
+
+    SimilarRecipe.objects.filter(recipe_id__in=recomputed).delete()
+    _save(vectors, vectors.rows(sorted(visible)))
+    for row in vectors.rows(sorted(changed)):
+        _insert(vectors, row, recomputed)
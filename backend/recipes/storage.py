@@ -0,0 +1,122 @@
+"""
+Хранилище картинок рецептов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого с исходным расширением в
+каталоге upload_to: images/<хеш>.png. Фронтенд присылает картинку в base64
+при каждом редактировании рецепта, и повторная загрузка того же файла не
+пишет его заново, а возвращает имя существующего. Содержимое файла под
+данным именем не меняется, поэтому nginx отдаёт /media/ с заголовком
+Cache-Control: immutable (см. infra/nginx.conf).
+
+Один файл может принадлежать нескольким рецептам, число ссылок на него -
+число рецептов с этим именем в поле image. После замены картинки или
+удаления рецепта файл без ссылок удаляется (см. recipes/signals.py), а
+файлы, оставшиеся без ссылок по другим причинам, собирает команда
+collect_images. Файлы моложе IMAGE_COLLECT_GRACE_HOURS не удаляются:
+картинка могла быть сохранена в ещё не завершённой транзакции, а повторная
+загрузка того же содержимого обновляет время изменения файла.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+BATCH_SIZE = 1000
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы с именами по хешу содержимого, без повторной записи."""
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def _save(self, name, content):
+        """
+        Файл пишется во временный и публикуется жёсткой ссылкой: под
+        итоговым именем не бывает недописанного файла, а одновременная
+        загрузка того же содержимого не создаёт копию с суффиксом.
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        try:
+            # Временный файл создаётся с правами 0600.
+            os.chmod(file.name, self.file_permissions_mode or 0o644)
+            os.link(file.name, full_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(file.name)
+        return name
+
+
+def _referenced(names):
+    return set(
+        Recipe.objects.filter(image__in=names)
+        .values_list('image', flat=True).distinct()
+    )
+
+
+def release(names, now=None):
+    """
+    Удаляет файлы names, на которые не ссылается ни один рецепт и которые
+    старше IMAGE_COLLECT_GRACE_HOURS. Возвращает число удалённых файлов.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    expired = (now or timezone.now()) - timedelta(
+        hours=settings.IMAGE_COLLECT_GRACE_HOURS
+    )
+    names = sorted({name for name in names if name})
+    deleted = 0
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start:start + BATCH_SIZE]
+        for name in set(batch) - _referenced(batch):
+            try:
+                if storage.get_modified_time(name) >= expired:
+                    continue
+            except FileNotFoundError:
+                continue
+            storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def collect(now=None):
+    """Удаляет все файлы картинок без ссылок, возвращает их число."""
+    storage = Recipe._meta.get_field('image').storage
+    directory = Recipe._meta.get_field('image').upload_to
+    if not storage.exists(directory):
+        return 0
+    _, files = storage.listdir(directory)
+    return release(
+        (posixpath.join(directory, name) for name in files), now=now
+    )
@@ -0,0 +1,139 @@
+"""
+Журнал изменений каталога для инкрементальной синхронизации /api/sync/.
+
+Каждое сохранение и удаление рецепта, тега или ингредиента дописывает в
+таблицу Change строку (модель, объект, удалён ли). Её номер - монотонная
+последовательность изменений: клиент хранит номер последнего полученного
+изменения в курсоре и запрашивает только то, что появилось после него.
+Удаления остаются в журнале как надгробия, поэтому клиент узнаёт и о них.
+
+Номер выдаётся при вставке, а видна строка после коммита, и транзакция с
+меньшим номером может закоммититься позже большей. Чтобы клиент не
+перескочил такое изменение, строки пишутся после коммита данных отдельным
+коротким INSERT, а отдаются только строки старше SYNC_SETTLE_SECONDS.
+
+Запись после коммита теряется, если процесс упал между коммитом и INSERT,
+а bulk_create() сигналов не вызывает. compact() восстанавливает такие
+изменения по столбцам updated_at (queryset.update() полей каталога должен
+обновлять updated_at сам) и удаляет записи, заменённые более поздними
+изменениями того же объекта: клиент с любым курсором всё равно получит
+последнее состояние объекта.
+
+Тот же журнал - версия индексов рецептов в памяти процесса (recipes/
+cookable.py, recipes/search.py): процесс запоминает номер учтённой записи
+(snapshot()) и перед запросом дочитывает записи после него (follow()).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, ExpressionWrapper, Max,
+                              OuterRef, Q)
+from django.db.models.functions import Now
+
+from recipes.models import Change, Ingredient, Recipe, Tag
+
+MODELS = {'tag': Tag, 'ingredient': Ingredient, 'recipe': Recipe}
+NAMES = {model: name for name, model in MODELS.items()}
+BATCH_SIZE = 1000
+
+
+def record(model, ids, deleted=False):
+    """Записывает изменение объектов ids модели model после коммита."""
+    ids = list(ids)
+    if not ids:
+        return
+    transaction.on_commit(lambda: Change.objects.bulk_create(
+        [Change(model=NAMES[model], object_id=pk, deleted=deleted)
+         for pk in ids],
+        batch_size=BATCH_SIZE,
+    ))
+
+
+def changes(after, limit):
+    """
+    До limit записей журнала после номера after. Возвращает
+    ({имя модели: {id: удалён ли}}, номер последней записи, есть ли ещё);
+    несколько изменений одного объекта сводятся к последнему.
+    """
+    rows = list(
+        Change.objects.filter(pk__gt=after, created__lte=_settled())
+        .order_by('pk')
+        .values_list('pk', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    objects = {name: {} for name in MODELS}
+    for _, model, object_id, deleted in rows:
+        objects[model].pop(object_id, None)
+        objects[model][object_id] = deleted
+    return objects, rows[-1][0] if rows else after, has_more
+
+
+def _settled():
+    return Now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+
+def snapshot():
+    """
+    Версия для индекса, который строится целиком: (номер, применённые).
+    Вызывается до загрузки данных: запись видна после коммита данных,
+    поэтому всё, что прочитано до загрузки, в ней учтено. Номер не
+    сдвигается дальше записей моложе SYNC_SETTLE_SECONDS, которые могли
+    опередить незакоммиченные, а сами они считаются применёнными.
+    """
+    position = Change.objects.filter(created__lte=_settled()).aggregate(
+        position=Max('pk')
+    )['position'] or 0
+    return position, set(
+        Change.objects.filter(pk__gt=position).values_list('pk', flat=True)
+    )
+
+
+def follow(model, position, applied, limit):
+    """
+    Объекты модели model, изменённые после версии (position, applied),
+    и новая версия: (ids, номер, применённые). Если изменений больше
+    limit, ids равен None: индекс дешевле построить заново.
+    """
+    rows = list(
+        Change.objects.filter(pk__gt=position, model=NAMES[model])
+        .order_by('pk')
+        .annotate(settled=ExpressionWrapper(
+            Q(created__lte=_settled()), output_field=BooleanField()
+        ))
+        .values_list('pk', 'object_id', 'settled')[:limit + 1]
+    )
+    if len(rows) > limit:
+        return None, position, applied
+    ids = sorted({
+        object_id for pk, object_id, _ in rows if pk not in applied
+    })
+    for pk, _, settled in rows:
+        if not settled:
+            break
+        position = pk
+    return ids, position, {pk for pk, _, _ in rows if pk > position}
+
+
+def compact():
+    """
+    Удаляет заменённые записи и дописывает изменения объектов, которые
+    сохранены позже своей последней записи. Возвращает (удалено, добавлено).
+    """
+    deleted, _ = Change.objects.filter(Exists(Change.objects.filter(
+        model=OuterRef('model'), object_id=OuterRef('object_id'),
+        pk__gt=OuterRef('pk'),
+    ))).delete()
+    added = 0
+    for name, model in MODELS.items():
+        ids = model.objects.filter(~Exists(Change.objects.filter(
+            model=name, object_id=OuterRef('pk'),
+            created__gte=OuterRef('updated_at'),
+        ))).order_by('pk').values_list('pk', flat=True)
+        created = Change.objects.bulk_create(
+            (Change(model=name, object_id=pk) for pk in ids),
+            batch_size=BATCH_SIZE,
+        )
+        added += len(created)
+    return deleted, added
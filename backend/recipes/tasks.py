@@ -0,0 +1,20 @@
+from jobs.queue import task
+from recipes import scores, similar
+
+
+@task
+def update_similar(recipe_ids, neighbours_of=()):
+    """Пересчёт похожих рецептов после изменения, см. recipes/signals.py."""
+    similar.update(recipe_ids, neighbours_of)
+
+
+@task
+def rebuild_similar():
+    """Периодический полный пересчёт похожих рецептов, см. JOBS_PERIODIC."""
+    return similar.rebuild()
+
+
+@task
+def update_scores():
+    """Периодический пересчёт популярности и тренда, см. JOBS_PERIODIC."""
+    return scores.rebuild()
@@ -3,6 +3,7 @@ from itertools import chain
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
+from jobs.admin import BackgroundDeleteMixin
 from users.models import FoodgramUser, Subscription
 
 admin.site.unregister(Group)
@@ -31,7 +32,7 @@ class SubscriptionInline(admin.TabularInline):
 
 
 @admin.register(FoodgramUser)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
     """Админка для пользователей Foodgram."""
     inlines = (SubscriptionInline,)
     exclude = ('groups', 'user_permissions')
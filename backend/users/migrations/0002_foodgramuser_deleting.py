@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:11
+
+import django.contrib.auth.models
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='deleting',
+            field=models.BooleanField(db_default=False, default=False, editable=False, verbose_name='Удаляется'),
+        ),
+        migrations.AlterModelManagers(
+            name='foodgramuser',
+            managers=[
+                ('objects', users.models.FoodgramUserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
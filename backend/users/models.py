@@ -1,4 +1,4 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -6,6 +6,13 @@ from foodgram.constants import (FIRST_NAME_LENGTH, LAST_NAME_LENGTH,
                                 PASSWORD_LENGTH)
 
 
+class FoodgramUserManager(UserManager):
+    """Пользователи без помеченных на удаление, см. jobs/deletion.py."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting=False)
+
+
 class FoodgramUser(AbstractUser):
     """Пользователи Фудграм."""
     password = models.CharField(_('password'), max_length=PASSWORD_LENGTH)
@@ -16,6 +23,13 @@ class FoodgramUser(AbstractUser):
     last_name = models.CharField(
         _('last name'), max_length=LAST_NAME_LENGTH
     )
+    # Пользователь скрыт и удаляется фоновой задачей, см. jobs/deletion.py.
+    deleting = models.BooleanField(
+        'Удаляется', default=False, db_default=False, editable=False
+    )
+
+    objects = FoodgramUserManager()
+    all_objects = UserManager()
 
     class Meta:
         verbose_name = 'пользователя'